@@ -0,0 +1,152 @@
+"""
+Cache coder benchmark of a 10k-row /users/referals_info response.
+
+    python -m benchmarks.cache_coder --rows 10000 --repeat 20
+
+For every variant, from the TrustedJSONResponse the endpoint returns:
+
+- store: encoding the response to the value written to Redis;
+- hit: from the value read from Redis to the body bytes sent;
+- size: bytes stored in Redis, and the peak memory traced during a hit.
+
+json is fastapi-cache's JsonCoder, a hit parses the body and FastAPI
+validates the dict against UserListResponse and encodes it again, the
+path the cached endpoints took before ResponseCoder. The response-*
+variants are ResponseCoder with the given compression, a hit only
+decompresses. The value-* variants store the payload as plain data with
+the two serializers of ResponseCoder, the way a non-response value is
+cached, parsing it back included.
+
+Every variant has to send the same body.
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+import tracemalloc
+from collections.abc import Callable
+
+from fastapi.responses import ORJSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+from fastapi_cache.coder import JsonCoder
+
+from benchmarks.serialization import make_rows, make_users
+from src.schemas.user_schema import UserDB, UserListResponse
+from src.utils import cache
+from src.utils.cache import PrecompressedJSONResponse, ResponseCoder, identity_body
+from src.utils.serialization import TrustedJSONResponse, validate_rows
+
+
+def json_variant() -> tuple[Callable, Callable]:
+    field = create_model_field(
+        name="Response_referals_info", type_=UserListResponse, mode="serialization"
+    )
+
+    def hit(value: bytes) -> bytes:
+        content = asyncio.run(
+            serialize_response(
+                field=field,
+                response_content=JsonCoder.decode_as_type(
+                    value, type_=UserListResponse
+                ),
+                is_coroutine=True,
+            )
+        )
+        return ORJSONResponse(content).body
+
+    return JsonCoder.encode, hit
+
+
+def response_variant(compression: int, threshold: int) -> tuple[Callable, Callable]:
+    coder = type(
+        "BenchmarkCoder",
+        (ResponseCoder,),
+        {"compression": compression, "threshold": threshold},
+    )
+
+    def hit(value: bytes) -> bytes:
+        response = coder.decode_as_type(value, type_=UserListResponse)
+        # The body a client accepting no Content-Encoding is sent
+        if isinstance(response, PrecompressedJSONResponse):
+            return identity_body(response.variants)
+        return response.body
+
+    return coder.encode, hit
+
+
+def value_variant(
+    serializer: int, model: UserListResponse
+) -> tuple[Callable, Callable]:
+    coder = type(
+        "BenchmarkCoder",
+        (ResponseCoder,),
+        {"serializer": serializer, "compression": cache.NONE},
+    )
+
+    def store(response: TrustedJSONResponse) -> bytes:
+        return coder.encode(model.model_dump(mode="json"))
+
+    def hit(value: bytes) -> bytes:
+        return TrustedJSONResponse(coder.decode(value)).body
+
+    return store, hit
+
+
+def timed(run: Callable[[], bytes], repeat: int) -> float:
+    run()
+    timings = []
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - started_at)
+    return statistics.median(timings) * 1000
+
+
+def traced_peak(run: Callable[[], bytes]) -> float:
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 2**20
+
+
+def main(args: argparse.Namespace) -> None:
+    payload = validate_rows(UserDB, make_rows(make_users(args.rows)))
+    model = UserListResponse(payload=payload)
+    response = TrustedJSONResponse(model)
+    threshold = ResponseCoder.threshold
+    variants = {"json": json_variant()}
+    for name, compression in cache.COMPRESSIONS.items():
+        if compression == cache.NONE or compression in cache.CODECS:
+            variants[f"response-{name}"] = response_variant(compression, threshold)
+        else:
+            print(f"response-{name} skipped, not installed")
+    variants["value-orjson"] = value_variant(cache.ORJSON, model)
+    if cache.msgpack is not None:
+        variants["value-msgpack"] = value_variant(cache.MSGPACK, model)
+    else:
+        print("value-msgpack skipped, not installed")
+
+    print(f"{args.rows} rows, {len(response.body) / 2**20:.2f} MiB body")
+    baseline = None
+    for name, (store, hit) in variants.items():
+        value = store(response)
+        assert hit(value) == response.body, f"{name} sends a different body"
+        store_ms = timed(lambda: store(response), args.repeat)
+        hit_ms = timed(lambda: hit(value), args.repeat)
+        baseline = baseline or hit_ms
+        print(
+            f"{name:<16}store {store_ms:7.2f} ms  "
+            f"hit {hit_ms:7.2f} ms  x{baseline / hit_ms:<6.1f}"
+            f"size {len(value) / 2**20:6.2f} MiB  "
+            f"hit peak {traced_peak(lambda: hit(value)):6.2f} MiB"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Response cache coder benchmark")
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    main(parser.parse_args())
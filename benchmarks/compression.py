@@ -0,0 +1,106 @@
+"""
+Response compression benchmark of a 10k-row /users/referals_info body.
+
+    python -m benchmarks.compression --rows 10000 --repeat 20
+
+For every installed Content-Encoding at the configured level:
+
+- compress: compressing the whole body, what the CompressionMiddleware
+  does for a response without a stored variant;
+- size: the compressed body and its ratio to the JSON body;
+- stream: the same body sent in 64 KiB chunks, every chunk flushed;
+- decompress: what the client pays.
+
+The last section compares sending a cached hit: decompressing the
+stored value and compressing the body again against sending the stored
+variant as it is, compression.cached_encodings.
+"""
+
+import argparse
+import statistics
+import time
+from collections.abc import Callable
+
+from benchmarks.serialization import make_rows, make_users
+from src.schemas.user_schema import UserDB, UserListResponse
+from src.utils import compression
+from src.utils.cache import ResponseCoder, identity_body
+from src.utils.serialization import TrustedJSONResponse, validate_rows
+
+CHUNK_SIZE = 64 * 1024
+
+
+def timed(run: Callable[[], bytes], repeat: int) -> float:
+    run()
+    timings = []
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - started_at)
+    return statistics.median(timings) * 1000
+
+
+def stream(encoding: str, body: bytes) -> bytes:
+    compressor = compression.StreamCompressor(encoding)
+    chunks = [
+        compressor.compress(body[offset : offset + CHUNK_SIZE])
+        for offset in range(0, len(body), CHUNK_SIZE)
+    ]
+    return b"".join(chunks) + compressor.finish()
+
+
+def main(args: argparse.Namespace) -> None:
+    payload = validate_rows(UserDB, make_rows(make_users(args.rows)))
+    body = TrustedJSONResponse(UserListResponse(payload=payload)).body
+    print(f"{args.rows} rows, {len(body) / 2**20:.2f} MiB body")
+
+    for encoding in compression.ENCODINGS:
+        compressed = compression.compress(encoding, body)
+        streamed = stream(encoding, body)
+        assert compression.decompress(encoding, compressed) == body
+        assert compression.decompress(encoding, streamed) == body
+        compress_ms = timed(lambda: compression.compress(encoding, body), args.repeat)
+        stream_ms = timed(lambda: stream(encoding, body), args.repeat)
+        decompress_ms = timed(
+            lambda: compression.decompress(encoding, compressed), args.repeat
+        )
+        print(
+            f"{encoding:<6}compress {compress_ms:7.2f} ms  "
+            f"size {len(compressed) / 2**10:7.1f} KiB  "
+            f"x{len(body) / len(compressed):<5.1f} "
+            f"stream {stream_ms:7.2f} ms  {len(streamed) / 2**10:7.1f} KiB  "
+            f"decompress {decompress_ms:6.2f} ms"
+        )
+
+    print("cached hit")
+    response = TrustedJSONResponse(UserListResponse(payload=payload))
+    stored = ResponseCoder.encode(response)
+    for encoding in compression.ENCODINGS:
+        coder = type(
+            "BenchmarkCoder", (ResponseCoder,), {"cached_encodings": (encoding,)}
+        )
+        stored_variants = coder.encode(response)
+
+        def recompress() -> bytes:
+            hit = ResponseCoder.decode_as_type(stored, type_=None)
+            return compression.compress(encoding, identity_body(hit.variants))
+
+        def precompressed() -> bytes:
+            return coder.decode_as_type(stored_variants, type_=None).variants[encoding]
+
+        assert compression.decompress(encoding, precompressed()) == body
+        recompress_ms = timed(recompress, args.repeat)
+        precompressed_ms = timed(precompressed, args.repeat)
+        print(
+            f"{encoding:<6}recompress {recompress_ms:7.2f} ms  "
+            f"precompressed {precompressed_ms:6.3f} ms  "
+            f"stored {len(stored) / 2**10:6.1f} KiB -> "
+            f"{len(stored_variants) / 2**10:6.1f} KiB"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Response compression benchmark")
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    main(parser.parse_args())
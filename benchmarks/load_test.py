@@ -0,0 +1,522 @@
+"""
+Load test of the API hot paths: login, registration, registration by
+referal code, code activation and the cached reads.
+
+    python -m benchmarks.load_test --users 10000 --concurrency 32 --duration 15 \\
+        --output results.json --baseline benchmarks/baseline.json
+
+The --database is dropped, recreated, migrated with alembic and seeded with
+synthetic users, referral chains and codes. The app is started with uvicorn
+in a subprocess against it, with fakeredis (or --redis-url), a local SMTP
+sink and a mock EmailHunter API, and the rate limits lifted. Like the app
+itself it needs the JWT keys in certs/.
+
+Every workload runs for --duration seconds at --concurrency. The report
+holds RPS, p50/p95/p99 latency and the DB queries per request read from
+the Server-Timing header. With --baseline the results are compared against
+a stored report and the exit code is 1 on a regression; --update-baseline
+writes the results there instead.
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from collections import Counter
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from urllib.parse import urlparse
+
+import asyncpg
+import bcrypt
+import httpx
+
+from benchmarks.mock_services import SmtpSink, start_email_hunter, start_fake_redis
+
+ROOT = Path(__file__).resolve().parent.parent
+PASSWORD = "benchmark-password"
+EMAIL_DOMAIN = "bench.example.com"
+FIRST_CODE = 1000
+MAX_CODES = 9000
+UNLIMITED = "1000000000"
+
+
+def user_email(user_id: int) -> str:
+    return f"user{user_id}@{EMAIL_DOMAIN}"
+
+
+@dataclass
+class LoadContext:
+    users: int
+    codes: list[tuple[int, int]]
+    active_code: tuple[int, int]
+    tokens: list[str] = field(default_factory=list)
+    owner_tokens: dict[int, str] = field(default_factory=dict)
+    new_users: itertools.count = field(default_factory=itertools.count)
+
+    def random_user(self, rng: random.Random) -> int:
+        return rng.randint(1, self.users)
+
+    def new_user(self) -> dict:
+        n = next(self.new_users)
+        return {
+            "email": f"new{n}-{os.getpid()}@{EMAIL_DOMAIN}",
+            "first_name": "Load",
+            "last_name": "Test",
+            "password": PASSWORD,
+        }
+
+    def bearer(self, rng: random.Random) -> dict:
+        return {"Authorization": f"Bearer {rng.choice(self.tokens)}"}
+
+
+@dataclass
+class Workload:
+    request: Callable[[httpx.AsyncClient, LoadContext, random.Random], Awaitable]
+    expected: frozenset[int]
+
+
+async def login(client, ctx, rng):
+    return await client.post(
+        "/api/auth/jwt/login",
+        data={"username": user_email(ctx.random_user(rng)), "password": PASSWORD},
+    )
+
+
+async def register(client, ctx, rng):
+    return await client.post("/api/users/register", json=ctx.new_user())
+
+
+async def end_registration(client, ctx, rng):
+    code, _ = rng.choice(ctx.codes)
+    return await client.post(
+        "/api/users/end_registration",
+        params={"referal_code": code},
+        json=ctx.new_user(),
+    )
+
+
+async def activate_code(client, ctx, rng):
+    # The seeded active code blocks every other activation, so these
+    # answer 409 after the full lookup path
+    code, owner = rng.choice(ctx.codes[: len(ctx.owner_tokens)])
+    return await client.put(
+        "/api/referal_codes/activate_rc",
+        params={"referal_code": code},
+        headers={"Authorization": f"Bearer {ctx.owner_tokens[owner]}"},
+    )
+
+
+async def user_info(client, ctx, rng):
+    return await client.get(
+        "/api/users/user_info",
+        params={"email": user_email(ctx.random_user(rng))},
+        headers=ctx.bearer(rng),
+    )
+
+
+async def referals_info(client, ctx, rng):
+    return await client.get(
+        "/api/users/referals_info",
+        params={"referer_id": ctx.random_user(rng)},
+        headers=ctx.bearer(rng),
+    )
+
+
+async def referal_code_email(client, ctx, rng):
+    _, owner = ctx.active_code
+    return await client.get(
+        "/api/users/get_rc_by_email",
+        params={
+            "referer_email": user_email(owner),
+            "user_email": ctx.new_user()["email"],
+        },
+    )
+
+
+async def email_exists(client, ctx, rng):
+    return await client.get(
+        "/api/users/email_exists",
+        params={"email": user_email(ctx.random_user(rng))},
+        headers=ctx.bearer(rng),
+    )
+
+
+WORKLOADS = {
+    "login": Workload(login, frozenset({200})),
+    "register": Workload(register, frozenset({201})),
+    "end_registration": Workload(end_registration, frozenset({201})),
+    "activate_code": Workload(activate_code, frozenset({200, 409})),
+    "user_info": Workload(user_info, frozenset({200})),
+    "referals_info": Workload(referals_info, frozenset({200})),
+    "referal_code_email": Workload(referal_code_email, frozenset({200})),
+    "email_exists": Workload(email_exists, frozenset({200})),
+}
+
+
+async def create_database(admin_dsn: str, database: str) -> None:
+    conn = await asyncpg.connect(admin_dsn)
+    try:
+        await conn.execute(f'DROP DATABASE IF EXISTS "{database}" WITH (FORCE)')
+        await conn.execute(f'CREATE DATABASE "{database}"')
+    finally:
+        await conn.close()
+
+
+async def seed(dsn: str, args: argparse.Namespace) -> LoadContext:
+    """
+    Users refer each other in chains: the first tenth registered on their
+    own, every later user was invited by a random earlier one. Only one
+    code may be active at a time, it is the first one
+    """
+    rng = random.Random(args.seed)
+    password = bcrypt.hashpw(PASSWORD.encode(), bcrypt.gensalt())
+    now = datetime.utcnow()
+    roots = max(1, args.users // 10)
+    users = [
+        (
+            user_id,
+            f"First{user_id}",
+            f"Last{user_id}",
+            user_email(user_id),
+            now,
+            now,
+            password,
+            True,
+            0 if user_id <= roots else rng.randint(1, user_id - 1),
+        )
+        for user_id in range(1, args.users + 1)
+    ]
+    exp_date = date.today() + timedelta(days=30)
+    owners = rng.sample(
+        range(1, args.users + 1), min(args.codes, MAX_CODES, args.users)
+    )
+    codes = [
+        (code_id, FIRST_CODE + code_id - 1, exp_date, code_id == 1, owner)
+        for code_id, owner in enumerate(owners, start=1)
+    ]
+
+    conn = await asyncpg.connect(dsn)
+    try:
+        await conn.copy_records_to_table(
+            "user_table",
+            records=users,
+            columns=[
+                "id",
+                "first_name",
+                "last_name",
+                "email",
+                "registered_at",
+                "updated_at",
+                "password",
+                "is_active",
+                "referer_by",
+            ],
+        )
+        await conn.copy_records_to_table(
+            "referal_code_table",
+            records=codes,
+            columns=["id", "code", "exp_date", "is_active", "user_id"],
+        )
+        for table in ("user_table", "referal_code_table"):
+            await conn.execute(
+                f"SELECT setval('{table}_id_seq', (SELECT max(id) FROM {table}))"
+            )
+            await conn.execute(f"ANALYZE {table}")
+    finally:
+        await conn.close()
+    return LoadContext(
+        users=args.users,
+        codes=[(code[1], code[4]) for code in codes],
+        active_code=(codes[0][1], codes[0][4]),
+    )
+
+
+def free_port(host: str) -> int:
+    with socket.socket() as sock:
+        sock.bind((host, 0))
+        return sock.getsockname()[1]
+
+
+def app_environment(
+    args: argparse.Namespace, redis_url: str, smtp: SmtpSink, hunter
+) -> dict:
+    redis = urlparse(redis_url)
+    env = {
+        **os.environ,
+        "DB_NAME": args.database,
+        "REDIS_HOST": redis.hostname,
+        "REDIS_PORT": str(redis.port),
+        "SMTP_HOST": smtp.host,
+        "SMTP_PORT": str(smtp.port),
+        "SMTP_SSL": "false",
+        "EMAIL_HUNTER_URL": f"http://{hunter.server_address[0]}:{hunter.server_address[1]}/v1/",
+        "PYTHONPATH": os.pathsep.join([str(ROOT), str(ROOT / "src")]),
+    }
+    for scope in ("LOGIN_IP", "LOGIN_ACCOUNT", "EMAIL_IP", "EMAIL_RECIPIENT"):
+        # Nested settings are replaced as a whole, so both fields are needed
+        env[f"RATE_LIMITS__{scope}__TIMES"] = UNLIMITED
+        env[f"RATE_LIMITS__{scope}__SECONDS"] = "1"
+    return env
+
+
+async def start_app(
+    args: argparse.Namespace, env: dict
+) -> tuple[subprocess.Popen, str]:
+    port = free_port(args.host)
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "src.main:app",
+            "--host",
+            args.host,
+            "--port",
+            str(port),
+            "--workers",
+            str(args.workers),
+            "--no-access-log",
+            "--log-level",
+            "warning",
+        ],
+        cwd=ROOT,
+        env=env,
+    )
+    base_url = f"http://{args.host}:{port}"
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        deadline = time.monotonic() + 60
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError("The app exited during startup")
+            try:
+                if (await client.get("/api/readyz")).status_code == 200:
+                    return process, base_url
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.5)
+    process.terminate()
+    raise RuntimeError("The app did not become healthy in 60 seconds")
+
+
+async def issue_tokens(client: httpx.AsyncClient, ctx: LoadContext, count: int) -> None:
+    async def token_for(user_id: int) -> str:
+        response = await client.post(
+            "/api/auth/jwt/login",
+            data={"username": user_email(user_id), "password": PASSWORD},
+        )
+        response.raise_for_status()
+        return response.json()["access_token"]
+
+    ctx.tokens = [await token_for(user_id) for user_id in range(1, count + 1)]
+    for _, owner in ctx.codes[:count]:
+        ctx.owner_tokens[owner] = await token_for(owner)
+
+
+def parse_queries(server_timing: str | None) -> int | None:
+    if not server_timing:
+        return None
+    for metric in server_timing.split(","):
+        name, _, params = metric.strip().partition(";")
+        if name == "db-queries":
+            return int(params.partition('desc="')[2].rstrip('"'))
+    return None
+
+
+async def run_workload(
+    client: httpx.AsyncClient,
+    workload: Workload,
+    ctx: LoadContext,
+    concurrency: int,
+    duration: float,
+    seed: int,
+) -> dict:
+    latencies: list[float] = []
+    queries: list[int] = []
+    statuses: Counter[str] = Counter()
+    deadline = time.perf_counter() + duration
+
+    async def worker(worker_seed: int) -> None:
+        rng = random.Random(worker_seed)
+        while time.perf_counter() < deadline:
+            started_at = time.perf_counter()
+            try:
+                response = await workload.request(client, ctx, rng)
+            except httpx.HTTPError as ex:
+                statuses[type(ex).__name__] += 1
+                continue
+            latencies.append(time.perf_counter() - started_at)
+            statuses[str(response.status_code)] += 1
+            if (
+                count := parse_queries(response.headers.get("server-timing"))
+            ) is not None:
+                queries.append(count)
+
+    started_at = time.perf_counter()
+    await asyncio.gather(*(worker(seed + i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - started_at
+    return summarize(latencies, queries, statuses, workload.expected, elapsed)
+
+
+def summarize(
+    latencies: list[float],
+    queries: list[int],
+    statuses: Counter[str],
+    expected: frozenset[int],
+    elapsed: float,
+) -> dict:
+    requests = sum(statuses.values())
+    errors = sum(
+        n for status, n in statuses.items() if status not in map(str, expected)
+    )
+    if len(latencies) >= 2:
+        cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+        p50, p95, p99 = cuts[49], cuts[94], cuts[98]
+    else:
+        p50 = p95 = p99 = latencies[0] if latencies else 0.0
+    return {
+        "requests": requests,
+        "errors": errors,
+        "rps": round(requests / elapsed, 1),
+        "p50_ms": round(p50 * 1000, 2),
+        "p95_ms": round(p95 * 1000, 2),
+        "p99_ms": round(p99 * 1000, 2),
+        "queries_per_request": (
+            round(statistics.fmean(queries), 2) if queries else None
+        ),
+        "statuses": dict(sorted(statuses.items())),
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """
+    A workload regresses when its RPS drops or its p95 grows by more
+    than tolerance, or when it issues more DB queries per request
+    """
+    regressions = []
+    for name, current in results["workloads"].items():
+        previous = baseline.get("workloads", {}).get(name)
+        if previous is None:
+            continue
+        if current["rps"] < previous["rps"] * (1 - tolerance):
+            regressions.append(f"{name}: rps {previous['rps']} -> {current['rps']}")
+        if current["p95_ms"] > previous["p95_ms"] * (1 + tolerance):
+            regressions.append(
+                f"{name}: p95 {previous['p95_ms']} ms -> {current['p95_ms']} ms"
+            )
+        if (current["queries_per_request"] or 0) > (
+            previous["queries_per_request"] or 0
+        ):
+            regressions.append(
+                f"{name}: queries per request {previous['queries_per_request']} "
+                f"-> {current['queries_per_request']}"
+            )
+    return regressions
+
+
+async def main(args: argparse.Namespace) -> int:
+    from src.config import settings
+
+    admin_dsn = args.admin_dsn or (
+        f"postgresql://{settings.DB_USER}:{settings.DB_PASS}"
+        f"@{settings.DB_HOST}:{settings.DB_PORT}/postgres"
+    )
+    dsn = admin_dsn.rsplit("/", 1)[0] + f"/{args.database}"
+    await create_database(admin_dsn, args.database)
+
+    smtp = SmtpSink(args.host).start()
+    hunter = start_email_hunter(args.host)
+    redis_url = args.redis_url
+    if redis_url is None:
+        fake_redis = start_fake_redis(args.host)
+        redis_url = "redis://{}:{}".format(*fake_redis.server_address)
+
+    env = app_environment(args, redis_url, smtp, hunter)
+    subprocess.run(
+        [sys.executable, "-m", "alembic", "upgrade", "head"],
+        cwd=ROOT,
+        env=env,
+        check=True,
+    )
+    ctx = await seed(dsn, args)
+    process, base_url = await start_app(args, env)
+    limits = httpx.Limits(max_connections=args.concurrency)
+    results = {
+        "meta": {
+            "users": args.users,
+            "codes": len(ctx.codes),
+            "concurrency": args.concurrency,
+            "duration_seconds": args.duration,
+            "workers": args.workers,
+        },
+        "workloads": {},
+    }
+    try:
+        async with httpx.AsyncClient(
+            base_url=base_url, limits=limits, timeout=args.timeout
+        ) as client:
+            await issue_tokens(client, ctx, min(args.concurrency, len(ctx.codes)))
+            for name in args.workloads:
+                workload = WORKLOADS[name]
+                if args.warmup:
+                    await run_workload(
+                        client, workload, ctx, args.concurrency, args.warmup, args.seed
+                    )
+                results["workloads"][name] = await run_workload(
+                    client, workload, ctx, args.concurrency, args.duration, args.seed
+                )
+                print(name, json.dumps(results["workloads"][name]), file=sys.stderr)
+    finally:
+        process.terminate()
+        process.wait()
+    results["meta"]["emails_sent"] = smtp.messages
+
+    exit_code = 0
+    if args.baseline and args.update_baseline:
+        args.baseline.write_text(json.dumps(results, indent=2) + "\n")
+    elif args.baseline and args.baseline.exists():
+        regressions = compare(
+            results, json.loads(args.baseline.read_text()), args.tolerance
+        )
+        results["regressions"] = regressions
+        exit_code = 1 if regressions else 0
+
+    report = json.dumps(results, indent=2)
+    if args.output:
+        args.output.write_text(report + "\n")
+    else:
+        print(report)
+    return exit_code
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="API load test")
+    parser.add_argument("--admin-dsn", default=None)
+    parser.add_argument("--database", default="referal_load_test")
+    parser.add_argument("--redis-url", default=None)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--codes", type=int, default=1_000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=15.0)
+    parser.add_argument("--warmup", type=float, default=2.0)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument(
+        "--workloads", nargs="+", choices=list(WORKLOADS), default=list(WORKLOADS)
+    )
+    parser.add_argument("--output", type=Path, default=None)
+    parser.add_argument("--baseline", type=Path, default=None)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    sys.exit(asyncio.run(main(parser.parse_args())))
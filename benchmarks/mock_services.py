@@ -0,0 +1,115 @@
+"""
+Local stand-ins for the external services the API talks to, so that the
+load test never leaves the machine: an SMTP sink accepting AUTH LOGIN/PLAIN,
+a mock EmailHunter API and an in-process fakeredis TCP server.
+
+Every service runs in a daemon thread and binds to an ephemeral port.
+fakeredis is not a project dependency, install fakeredis[lua] to use it
+(the rate limiter runs a Lua script) or pass a real Redis to the load test.
+"""
+
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class SmtpSink:
+    """
+    Minimal SMTP server that accepts any login and discards the messages
+    """
+
+    def __init__(self, host: str = "127.0.0.1") -> None:
+        self.host = host
+        self.port = 0
+        self.messages = 0
+        self.logins = 0
+        self.loop = asyncio.new_event_loop()
+        self.started = threading.Event()
+
+    def start(self) -> "SmtpSink":
+        threading.Thread(target=self._run, daemon=True).start()
+        self.started.wait()
+        return self
+
+    def _run(self) -> None:
+        asyncio.set_event_loop(self.loop)
+        server = self.loop.run_until_complete(
+            asyncio.start_server(self._handle, self.host, 0)
+        )
+        self.port = server.sockets[0].getsockname()[1]
+        self.started.set()
+        self.loop.run_forever()
+
+    async def _handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        async def reply(line: str) -> None:
+            writer.write(f"{line}\r\n".encode())
+            await writer.drain()
+
+        await reply("220 sink ESMTP")
+        try:
+            while line := await reader.readline():
+                command = line.decode(errors="replace").strip().upper()
+                if command.startswith(("EHLO", "HELO")):
+                    await reply("250-sink")
+                    await reply("250 AUTH LOGIN PLAIN")
+                elif command.startswith("AUTH LOGIN"):
+                    self.logins += 1
+                    await reply("334 VXNlcm5hbWU6")
+                    await reader.readline()
+                    await reply("334 UGFzc3dvcmQ6")
+                    await reader.readline()
+                    await reply("235 Authentication successful")
+                elif command.startswith("AUTH"):
+                    self.logins += 1
+                    await reply("235 Authentication successful")
+                elif command == "DATA":
+                    await reply("354 End data with <CR><LF>.<CR><LF>")
+                    while await reader.readline() not in (b".\r\n", b""):
+                        pass
+                    self.messages += 1
+                    await reply("250 OK")
+                elif command == "QUIT":
+                    await reply("221 Bye")
+                    break
+                else:
+                    await reply("250 OK")
+        finally:
+            writer.close()
+
+
+class EmailHunterHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        if url.path.endswith("/exist"):
+            body = {"exist": True, "sources": [], "email": query.get("email", [""])[0]}
+        else:
+            body = {"emails": []}
+        payload = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+
+def start_email_hunter(host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer((host, 0), EmailHunterHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def start_fake_redis(host: str = "127.0.0.1"):
+    from fakeredis import TcpFakeServer
+
+    server = TcpFakeServer((host, 0), server_type="redis")
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,194 @@
+"""
+Benchmark of the referal_code_table hot-path lookups on a plain heap
+versus the monthly partitioned table with the exp_date >= today predicate.
+
+    python -m benchmarks.referal_code_partitioning --rows 10000000
+
+Both tables are created in throwaway schemas of the configured database
+and filled server-side with generate_series, so seeding 10M rows takes
+a couple of minutes rather than hours.
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from datetime import date
+
+import asyncpg
+
+PLAIN_SCHEMA = "bench_rc_plain"
+PARTITIONED_SCHEMA = "bench_rc_partitioned"
+
+COLUMNS = """
+    id integer NOT NULL,
+    code integer NOT NULL,
+    exp_date date NOT NULL,
+    is_active boolean NOT NULL,
+    user_id integer NOT NULL
+"""
+
+# Codes expire evenly over the last months_back months and the next
+# months_ahead months, so most of the rows are expired like in production
+SEED_QUERY = """
+INSERT INTO {schema}.referal_code_table
+SELECT
+    i,
+    1000 + (i % 9000),
+    current_date - ($2 * 30) + (i % (($2 + $3) * 30)),
+    i % 50 = 0,
+    1 + (i % $4)
+FROM generate_series(1, $1) AS i
+"""
+
+HOT_QUERIES = {
+    "code_lookup": (
+        "SELECT * FROM {schema}.referal_code_table WHERE code = $1{live}",
+        lambda rng: (1000 + rng % 9000,),
+    ),
+    "active_code_by_user": (
+        "SELECT * FROM {schema}.referal_code_table "
+        "WHERE is_active = true AND user_id = $1{live}",
+        lambda rng: (1 + rng % 100000,),
+    ),
+}
+
+
+async def create_plain(conn: asyncpg.Connection) -> None:
+    await conn.execute(f"DROP SCHEMA IF EXISTS {PLAIN_SCHEMA} CASCADE")
+    await conn.execute(f"CREATE SCHEMA {PLAIN_SCHEMA}")
+    await conn.execute(
+        f"CREATE TABLE {PLAIN_SCHEMA}.referal_code_table ({COLUMNS}, PRIMARY KEY (id))"
+    )
+
+
+async def create_partitioned(
+    conn: asyncpg.Connection, months_back: int, months_ahead: int
+) -> None:
+    await conn.execute(f"DROP SCHEMA IF EXISTS {PARTITIONED_SCHEMA} CASCADE")
+    await conn.execute(f"CREATE SCHEMA {PARTITIONED_SCHEMA}")
+    await conn.execute(
+        f"CREATE TABLE {PARTITIONED_SCHEMA}.referal_code_table "
+        f"({COLUMNS}, PRIMARY KEY (id, exp_date)) PARTITION BY RANGE (exp_date)"
+    )
+    await conn.execute(
+        f"CREATE TABLE {PARTITIONED_SCHEMA}.referal_code_table_default "
+        f"PARTITION OF {PARTITIONED_SCHEMA}.referal_code_table DEFAULT"
+    )
+    await conn.execute(
+        f"""
+        DO $$
+        DECLARE
+            month_start date;
+        BEGIN
+            FOR month_start IN
+                SELECT generate_series(
+                    date_trunc('month', current_date) - interval '{months_back + 1} months',
+                    date_trunc('month', current_date) + interval '{months_ahead + 1} months',
+                    interval '1 month'
+                )::date
+            LOOP
+                EXECUTE format(
+                    'CREATE TABLE {PARTITIONED_SCHEMA}.%I PARTITION OF '
+                    '{PARTITIONED_SCHEMA}.referal_code_table FOR VALUES FROM (%L) TO (%L)',
+                    'referal_code_table_p' || to_char(month_start, 'YYYYMM'),
+                    month_start,
+                    (month_start + interval '1 month')::date
+                );
+            END LOOP;
+        END $$;
+        """
+    )
+
+
+async def seed(
+    conn: asyncpg.Connection, schema: str, args: argparse.Namespace
+) -> float:
+    started = time.perf_counter()
+    await conn.execute(
+        SEED_QUERY.format(schema=schema),
+        args.rows,
+        args.months_back,
+        args.months_ahead,
+        args.users,
+    )
+    if args.with_indexes:
+        await conn.execute(f"CREATE INDEX ON {schema}.referal_code_table (code)")
+        await conn.execute(
+            f"CREATE INDEX ON {schema}.referal_code_table (user_id, is_active)"
+        )
+    await conn.execute(f"ANALYZE {schema}.referal_code_table")
+    return time.perf_counter() - started
+
+
+async def measure(
+    conn: asyncpg.Connection, schema: str, live: bool, iterations: int
+) -> dict:
+    predicate = " AND exp_date >= $2" if live else ""
+    report = {}
+    for name, (query, make_params) in HOT_QUERIES.items():
+        sql = query.format(schema=schema, live=predicate)
+        timings, partitions = [], 0
+        for i in range(iterations):
+            params = make_params(i * 7919)
+            if live:
+                params = (*params, date.today())
+            raw_plan = await conn.fetchval(
+                f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}", *params
+            )
+            (plan,) = json.loads(raw_plan)
+            timings.append(plan["Execution Time"])
+            partitions = count_scanned_relations(plan["Plan"])
+        report[name] = {
+            "p50_ms": round(statistics.median(timings), 3),
+            "max_ms": round(max(timings), 3),
+            "relations_scanned": partitions,
+        }
+    return report
+
+
+def count_scanned_relations(plan: dict) -> int:
+    scanned = 1 if "Relation Name" in plan else 0
+    return scanned + sum(count_scanned_relations(p) for p in plan.get("Plans", []))
+
+
+async def main(args: argparse.Namespace) -> None:
+    if args.dsn is None:
+        from src.config import settings
+
+        args.dsn = settings.DB_URL.replace("postgresql+asyncpg", "postgresql")
+    conn = await asyncpg.connect(args.dsn)
+    try:
+        await conn.execute("SET max_parallel_workers_per_gather = 0")
+        await create_plain(conn)
+        await create_partitioned(conn, args.months_back, args.months_ahead)
+        results = {"rows": args.rows, "with_indexes": args.with_indexes}
+        for label, schema, live in (
+            ("before", PLAIN_SCHEMA, False),
+            ("after", PARTITIONED_SCHEMA, True),
+        ):
+            seconds = await seed(conn, schema, args)
+            results[label] = {
+                "seed_seconds": round(seconds, 1),
+                "queries": await measure(conn, schema, live, args.iterations),
+            }
+        print(json.dumps(results, indent=2))
+    finally:
+        if not args.keep:
+            await conn.execute(f"DROP SCHEMA IF EXISTS {PLAIN_SCHEMA} CASCADE")
+            await conn.execute(f"DROP SCHEMA IF EXISTS {PARTITIONED_SCHEMA} CASCADE")
+        await conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Referal code partitioning benchmark")
+    parser.add_argument("--dsn", default=None)
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--months-back", type=int, default=36)
+    parser.add_argument("--months-ahead", type=int, default=3)
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--with-indexes", action="store_true")
+    parser.add_argument("--keep", action="store_true")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,146 @@
+"""
+Serialization benchmark of a 10k-row /users/referals_info response.
+
+    python -m benchmarks.serialization --rows 10000 --repeat 20
+
+Compares the time from loaded data to response body bytes of:
+
+- fastapi: UserDB(**user.__dict__) per ORM entity, then FastAPI validating
+  the UserListResponse against the response model and ORJSONResponse
+  encoding it, the path the endpoints took before TrustedJSONResponse;
+- trusted-orm: to_pydantic_schema per ORM entity and TrustedJSONResponse;
+- trusted-rows: Core rows validated by a cached TypeAdapter and
+  TrustedJSONResponse.
+
+Every variant has to produce the same bytes. The rows are namedtuples,
+which expose the columns as attributes like SQLAlchemy rows do.
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+import tracemalloc
+from collections import namedtuple
+from collections.abc import Callable
+from datetime import datetime, timedelta
+
+import bcrypt
+from fastapi.responses import ORJSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+
+from src.models import User
+from src.schemas.user_schema import UserDB, UserListResponse
+from src.utils.serialization import TrustedJSONResponse, schema_columns, validate_rows
+
+
+def make_users(count: int) -> list[User]:
+    password = bcrypt.hashpw(b"password", bcrypt.gensalt(4))
+    started_at = datetime(2024, 1, 1)
+    users = []
+    for user_id in range(1, count + 1):
+        registered_at = started_at + timedelta(minutes=user_id)
+        users.append(
+            User(
+                id=user_id,
+                first_name=f"First{user_id}",
+                last_name=f"Last{user_id}",
+                email=f"user{user_id}@example.com",
+                registered_at=registered_at,
+                updated_at=registered_at,
+                password=password,
+                is_active=True,
+                referer_by=1,
+            )
+        )
+    return users
+
+
+def make_rows(users: list[User]) -> list[tuple]:
+    names = [column.key for column in schema_columns(User, UserDB)]
+    Row = namedtuple("Row", names)
+    return [Row(*(getattr(user, name) for name in names)) for user in users]
+
+
+def fastapi_variant(users: list[User]) -> Callable[[], bytes]:
+    field = create_model_field(
+        name="Response_referals_info", type_=UserListResponse, mode="serialization"
+    )
+
+    def run() -> bytes:
+        payload = [UserDB(**user.__dict__) for user in users]
+        content = asyncio.run(
+            serialize_response(
+                field=field,
+                response_content=UserListResponse(payload=payload),
+                is_coroutine=True,
+            )
+        )
+        return ORJSONResponse(content).body
+
+    return run
+
+
+def trusted_orm_variant(users: list[User]) -> Callable[[], bytes]:
+    def run() -> bytes:
+        payload = [user.to_pydantic_schema() for user in users]
+        return TrustedJSONResponse(UserListResponse(payload=payload)).body
+
+    return run
+
+
+def trusted_rows_variant(rows: list[tuple]) -> Callable[[], bytes]:
+    def run() -> bytes:
+        payload = validate_rows(UserDB, rows)
+        return TrustedJSONResponse(UserListResponse(payload=payload)).body
+
+    return run
+
+
+def measure(run: Callable[[], bytes], repeat: int) -> dict:
+    run()
+    timings = []
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - started_at)
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "median_ms": statistics.median(timings) * 1000,
+        "min_ms": min(timings) * 1000,
+        "peak_mib": peak / 2**20,
+    }
+
+
+def main(args: argparse.Namespace) -> None:
+    users = make_users(args.rows)
+    rows = make_rows(users)
+    variants = {
+        "fastapi": fastapi_variant(users),
+        "trusted-orm": trusted_orm_variant(users),
+        "trusted-rows": trusted_rows_variant(rows),
+    }
+    bodies = {name: run() for name, run in variants.items()}
+    assert len(set(bodies.values())) == 1, "the variants render different bodies"
+    print(f"{args.rows} rows, {len(bodies['fastapi']) / 2**20:.1f} MiB body")
+    baseline = None
+    for name, run in variants.items():
+        result = measure(run, args.repeat)
+        baseline = baseline or result["median_ms"]
+        print(
+            f"{name:<14}median {result['median_ms']:8.1f} ms  "
+            f"min {result['min_ms']:8.1f} ms  "
+            f"peak {result['peak_mib']:6.1f} MiB  "
+            f"x{baseline / result['median_ms']:.1f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Response serialization benchmark")
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    main(parser.parse_args())
@@ -0,0 +1,116 @@
+"""
+Per-call overhead of UserRepository.get_by_query_one_or_none(email=...)
+with a statement built for every call versus the cached statement shapes.
+
+    python -m benchmarks.statement_cache --calls 20000 --queries 2000
+
+- build: Python time to get an executable statement and its compiled
+  cache key, which is all that differs between the variants before
+  SQLAlchemy looks the compiled SQL up, no database needed;
+- query: the whole repository call against the DB_* database in a single
+  session, followed by the prepared statement cache stats.
+
+The emails are random so that the lookups miss the identity map.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+from collections.abc import Callable, Sequence
+
+from sqlalchemy import Result, select, text
+
+from src.database.db import async_engine, async_session_maker
+from src.database.prepared_statements import prepared_statement_stats
+from src.models import User
+from src.repositories import UserRepository
+from src.utils.statements import (
+    filter_params,
+    select_statement,
+    shape,
+    shape_cache_info,
+)
+
+
+class PerCallUserRepository(UserRepository):
+    """
+    get_by_query_one_or_none as it was before the statement shapes
+    """
+
+    async def get_by_query_one_or_none(self, **kwargs) -> User | None:
+        query = select(self.model).filter_by(**kwargs)
+        result: Result = await self.session.execute(query)
+        return result.unique().scalar_one_or_none()
+
+
+def per_call_build(email: str) -> None:
+    query = select(User).filter_by(email=email)
+    query._generate_cache_key()
+
+
+def cached_build(email: str) -> None:
+    kwargs = {"email": email}
+    query = select_statement(User, *shape(kwargs))
+    filter_params(kwargs)
+    query._generate_cache_key()
+
+
+def measure_build(build: Callable[[str], None], emails: Sequence[str]) -> float:
+    started_at = time.perf_counter()
+    for email in emails:
+        build(email)
+    return (time.perf_counter() - started_at) / len(emails) * 1e6
+
+
+async def measure_queries(
+    repository_class: type[UserRepository], emails: Sequence[str]
+) -> float:
+    async with async_session_maker() as session:
+        repository = repository_class(session)
+        # Prepares the statement on the connection before the clock starts
+        await repository.get_by_query_one_or_none(email=emails[0])
+        timings = []
+        for email in emails:
+            started_at = time.perf_counter()
+            await repository.get_by_query_one_or_none(email=email)
+            timings.append(time.perf_counter() - started_at)
+    return statistics.median(timings) * 1e6
+
+
+async def main(args: argparse.Namespace) -> None:
+    rng = random.Random(args.seed)
+    emails = [f"bench-{rng.getrandbits(48):x}@example.com" for _ in range(args.calls)]
+
+    results = {"build_us": {}, "query_us": {}}
+    for name, build in (("per-call", per_call_build), ("cached", cached_build)):
+        measure_build(build, emails[:1000])
+        results["build_us"][name] = round(measure_build(build, emails), 2)
+
+    if args.queries:
+        async with async_engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+        variants = (("per-call", PerCallUserRepository), ("cached", UserRepository))
+        for name, repository_class in variants:
+            results["query_us"][name] = round(
+                await measure_queries(repository_class, emails[: args.queries]), 1
+            )
+        results["prepared_statements"] = prepared_statement_stats.to_dict()
+        await async_engine.dispose()
+
+    results["shape_cache"] = {
+        name: info._asdict() for name, info in shape_cache_info().items()
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Statement shape cache benchmark")
+    parser.add_argument("--calls", type=int, default=20_000)
+    parser.add_argument(
+        "--queries", type=int, default=2_000, help="0 skips the database part"
+    )
+    parser.add_argument("--seed", type=int, default=42)
+    asyncio.run(main(parser.parse_args()))
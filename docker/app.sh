@@ -1,5 +1,4 @@
 #!/bin/bash
 
-alembic upgrade head
-cd src
-gunicorn main:app --workers 4 --worker-class uvicorn.workers.UvicornWorker --bind=0.0.0.0:8000
\ No newline at end of file
+# Migrations run once per deploy in the migrate service, see docker/migrate.sh
+exec python -m src serve
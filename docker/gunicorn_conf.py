@@ -0,0 +1,46 @@
+import os
+import shutil
+
+from src.config import BASE_DIR, settings
+
+# Must be set before prometheus_client is imported,
+# which is why it is only imported in the hooks
+multiproc_dir = os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/prometheus")
+# preload_app imports the app, and creates the metrics, before on_starting
+os.makedirs(multiproc_dir, exist_ok=True)
+
+wsgi_app = "main:app"
+chdir = str(BASE_DIR / "src")
+bind = f"{settings.server.host}:{settings.server.port}"
+workers = settings.WORKERS
+worker_class = "src.utils.server.ServerWorker"
+preload_app = settings.server.preload
+keepalive = settings.server.keepalive_seconds
+backlog = settings.server.backlog
+max_requests = settings.server.max_requests
+max_requests_jitter = settings.server.max_requests_jitter
+graceful_timeout = settings.server.graceful_timeout_seconds
+timeout = settings.server.timeout_seconds
+
+
+def on_starting(server):
+    # Also drops the values the master wrote while preloading the app
+    shutil.rmtree(multiproc_dir, ignore_errors=True)
+    os.makedirs(multiproc_dir)
+
+
+def post_fork(server, worker):
+    from src.database.db import async_engine
+    from src.utils.metrics import DB_POOL_SIZE
+
+    # With preload_app the engine was created in the master,
+    # its connections must not be shared with the workers
+    async_engine.sync_engine.dispose(close=False)
+    # Metric values written by the master are not inherited by the workers
+    DB_POOL_SIZE.set(async_engine.pool.size())
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,193 @@
+"""Partition referal_code_table by exp_date
+
+Revision ID: b3c1d9e4f2a7
+Revises: 7425dd106fb8
+Create Date: 2026-10-19 10:12:41.204317
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'b3c1d9e4f2a7'
+down_revision: Union[str, None] = '7425dd106fb8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Creates the monthly partition containing month_start. Rows of that month which
+# already landed in the default partition are moved into the new partition first,
+# otherwise ATTACH PARTITION refuses to run.
+CREATE_PARTITION_FUNCTION = """
+CREATE OR REPLACE FUNCTION referal_code_create_partition(month_start date)
+RETURNS void
+LANGUAGE plpgsql AS $$
+DECLARE
+    lower_bound date := date_trunc('month', month_start)::date;
+    upper_bound date := (date_trunc('month', month_start) + interval '1 month')::date;
+    partition_name text := 'referal_code_table_p' || to_char(lower_bound, 'YYYYMM');
+BEGIN
+    IF to_regclass(partition_name) IS NOT NULL THEN
+        RETURN;
+    END IF;
+    EXECUTE format(
+        'CREATE TABLE %I (LIKE referal_code_table INCLUDING DEFAULTS)',
+        partition_name
+    );
+    EXECUTE format(
+        'WITH moved AS (DELETE FROM referal_code_table_default '
+        'WHERE exp_date >= %L AND exp_date < %L RETURNING *) '
+        'INSERT INTO %I SELECT * FROM moved',
+        lower_bound, upper_bound, partition_name
+    );
+    EXECUTE format(
+        'ALTER TABLE referal_code_table ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+        partition_name, lower_bound, upper_bound
+    );
+END;
+$$;
+"""
+
+# Makes sure partitions exist for the current month and months_ahead months after it
+ENSURE_PARTITIONS_FUNCTION = """
+CREATE OR REPLACE FUNCTION referal_code_ensure_partitions(months_ahead integer)
+RETURNS void
+LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('referal_code_table_partitions'));
+    PERFORM referal_code_create_partition(
+        (date_trunc('month', current_date) + make_interval(months => m))::date
+    )
+    FROM generate_series(0, months_ahead) AS m;
+END;
+$$;
+"""
+
+# Detaches and drops partitions whose codes expired more than retention_months ago
+DROP_PARTITIONS_FUNCTION = """
+CREATE OR REPLACE FUNCTION referal_code_drop_partitions(retention_months integer)
+RETURNS integer
+LANGUAGE plpgsql AS $$
+DECLARE
+    cutoff date := (
+        date_trunc('month', current_date) - make_interval(months => retention_months)
+    )::date;
+    expired record;
+    dropped integer := 0;
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('referal_code_table_partitions'));
+    FOR expired IN
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'referal_code_table'::regclass
+          AND c.relname ~ '^referal_code_table_p[0-9]{6}$'
+          AND to_date(right(c.relname, 6), 'YYYYMM') < cutoff
+    LOOP
+        EXECUTE format(
+            'ALTER TABLE referal_code_table DETACH PARTITION %I', expired.relname
+        );
+        EXECUTE format('DROP TABLE %I', expired.relname);
+        dropped := dropped + 1;
+    END LOOP;
+    DELETE FROM referal_code_table_default WHERE exp_date < cutoff;
+    RETURN dropped;
+END;
+$$;
+"""
+
+REFERAL_CODE_FUNCTIONS = (
+    "referal_code_drop_partitions(integer)",
+    "referal_code_ensure_partitions(integer)",
+    "referal_code_create_partition(date)",
+)
+
+
+def upgrade() -> None:
+    op.execute("ALTER TABLE referal_code_table RENAME TO referal_code_table_legacy")
+    op.execute(
+        "ALTER INDEX referal_code_table_pkey RENAME TO referal_code_table_legacy_pkey"
+    )
+    op.execute(
+        "ALTER SEQUENCE referal_code_table_id_seq "
+        "RENAME TO referal_code_table_legacy_id_seq"
+    )
+    op.execute(
+        "ALTER TABLE referal_code_table_legacy RENAME CONSTRAINT "
+        "referal_code_table_user_id_fkey TO referal_code_table_legacy_user_id_fkey"
+    )
+
+    op.create_table('referal_code_table',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('code', sa.Integer(), nullable=False),
+    sa.Column('exp_date', sa.Date(), nullable=False),
+    sa.Column('is_active', sa.Boolean(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user_table.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id', 'exp_date'),
+    postgresql_partition_by='RANGE (exp_date)'
+    )
+    op.execute(
+        "CREATE TABLE referal_code_table_default "
+        "PARTITION OF referal_code_table DEFAULT"
+    )
+    op.execute(CREATE_PARTITION_FUNCTION)
+    op.execute(ENSURE_PARTITIONS_FUNCTION)
+    op.execute(DROP_PARTITIONS_FUNCTION)
+
+    op.execute(
+        "SELECT referal_code_create_partition(month_start) FROM ("
+        "SELECT DISTINCT date_trunc('month', exp_date)::date AS month_start "
+        "FROM referal_code_table_legacy) AS months"
+    )
+    op.execute("SELECT referal_code_ensure_partitions(3)")
+    op.execute(
+        "INSERT INTO referal_code_table (id, code, exp_date, is_active, user_id) "
+        "SELECT id, code, exp_date, is_active, user_id FROM referal_code_table_legacy"
+    )
+    op.execute(
+        "SELECT setval('referal_code_table_id_seq', "
+        "COALESCE((SELECT max(id) FROM referal_code_table), 0) + 1, false)"
+    )
+    op.drop_table('referal_code_table_legacy')
+
+
+def downgrade() -> None:
+    op.execute("ALTER TABLE referal_code_table RENAME TO referal_code_table_partitioned")
+    op.execute(
+        "ALTER INDEX referal_code_table_pkey "
+        "RENAME TO referal_code_table_partitioned_pkey"
+    )
+    op.execute(
+        "ALTER SEQUENCE referal_code_table_id_seq "
+        "RENAME TO referal_code_table_partitioned_id_seq"
+    )
+    op.execute(
+        "ALTER TABLE referal_code_table_partitioned RENAME CONSTRAINT "
+        "referal_code_table_user_id_fkey "
+        "TO referal_code_table_partitioned_user_id_fkey"
+    )
+
+    op.create_table('referal_code_table',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('code', sa.Integer(), nullable=False),
+    sa.Column('exp_date', sa.Date(), nullable=False),
+    sa.Column('is_active', sa.Boolean(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user_table.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.execute(
+        "INSERT INTO referal_code_table (id, code, exp_date, is_active, user_id) "
+        "SELECT id, code, exp_date, is_active, user_id "
+        "FROM referal_code_table_partitioned"
+    )
+    op.execute(
+        "SELECT setval('referal_code_table_id_seq', "
+        "COALESCE((SELECT max(id) FROM referal_code_table), 0) + 1, false)"
+    )
+    op.drop_table('referal_code_table_partitioned')
+    for function in REFERAL_CODE_FUNCTIONS:
+        op.execute(f"DROP FUNCTION {function}")
@@ -0,0 +1,65 @@
+"""Add indexes for the repository lookups
+
+Revision ID: d4a8f3b6c2e1
+Revises: b3c1d9e4f2a7
+Create Date: 2026-10-19 14:37:05.518204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4a8f3b6c2e1'
+down_revision: Union[str, None] = 'b3c1d9e4f2a7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Indexes on a partitioned table can not be built concurrently,
+    # they are created on every partition while the parent is locked
+    op.create_index(
+        'ix_referal_code_table_code', 'referal_code_table', ['code'], unique=False
+    )
+    op.create_index(
+        'ix_referal_code_table_user_id_is_active',
+        'referal_code_table',
+        ['user_id', 'is_active'],
+        unique=False,
+    )
+    op.create_index(
+        'ix_referal_code_table_active_exp_date',
+        'referal_code_table',
+        ['exp_date'],
+        unique=False,
+        postgresql_where=sa.text('is_active'),
+    )
+    # user_table keeps serving writes while its index is built
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_user_table_referer_by',
+            'user_table',
+            ['referer_by'],
+            unique=False,
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_user_table_referer_by',
+            table_name='user_table',
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+    op.drop_index(
+        'ix_referal_code_table_active_exp_date', table_name='referal_code_table'
+    )
+    op.drop_index(
+        'ix_referal_code_table_user_id_is_active', table_name='referal_code_table'
+    )
+    op.drop_index('ix_referal_code_table_code', table_name='referal_code_table')
@@ -0,0 +1,56 @@
+"""Index the referals of a referer by updated_at
+
+Revision ID: e7b2c5a9d1f3
+Revises: d4a8f3b6c2e1
+Create Date: 2026-10-19 16:58:12.304117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7b2c5a9d1f3'
+down_revision: Union[str, None] = 'd4a8f3b6c2e1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # The version of a referals list, their count and last updated_at,
+    # is read from this index alone. It serves the referer_by lookups too,
+    # so it replaces the index on referer_by
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_user_table_referer_by_updated_at',
+            'user_table',
+            ['referer_by', 'updated_at'],
+            unique=False,
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.drop_index(
+            'ix_user_table_referer_by',
+            table_name='user_table',
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_user_table_referer_by',
+            'user_table',
+            ['referer_by'],
+            unique=False,
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.drop_index(
+            'ix_user_table_referer_by_updated_at',
+            table_name='user_table',
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
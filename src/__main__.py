@@ -1,18 +1,92 @@
+"""
+Entry point of the app:
+
+    python -m src run       development server with auto reload
+    python -m src serve     gunicorn with the settings of docker/gunicorn_conf.py
+    python -m src migrate   apply the alembic migrations and exit
+"""
+
+import argparse
+import os
+import sys
+
 import uvicorn
 from loguru import logger
 
-if __name__ == "__main__":
+from src.config import BASE_DIR, settings
+
+
+def configure_logging(level: str) -> None:
+    """
+    Log to stderr and a rotated JSON file. enqueue=True hands the records
+    to a background thread so the event loop never waits for the disk
+    """
+    logger.remove()
+    logger.add(sys.stderr, level=level, enqueue=True)
     logger.add(
-        "logs/logs.json",
+        BASE_DIR / "logs" / "logs.json",
         format="{time} {level} {message}",
-        level="DEBUG",
+        level=level,
         rotation="10 MB",
         compression="zip",
         serialize=True,
+        enqueue=True,
     )
 
-    logger.debug("Error")
-    logger.info("Information message")
-    logger.warning("Warning")
 
-    uvicorn.run(app="src.main:app", port=8000, reload=True)
+def run(args: argparse.Namespace) -> None:
+    configure_logging(args.log_level)
+    uvicorn.run(
+        app="src.main:app",
+        app_dir=str(BASE_DIR / "src"),
+        host=args.host,
+        port=args.port,
+        reload=True,
+        reload_dirs=[str(BASE_DIR / "src")],
+        log_level=args.log_level.lower(),
+    )
+
+
+def serve(args: argparse.Namespace) -> None:
+    # Gunicorn replaces this process, so it receives the container signals
+    pythonpath = [str(BASE_DIR), os.environ.get("PYTHONPATH", "")]
+    os.environ["PYTHONPATH"] = os.pathsep.join(filter(None, pythonpath))
+    os.execvp(
+        "gunicorn",
+        ["gunicorn", "--config", str(BASE_DIR / "docker" / "gunicorn_conf.py")],
+    )
+
+
+def migrate(args: argparse.Namespace) -> None:
+    from alembic import command
+    from alembic.config import Config
+
+    configure_logging(args.log_level)
+    config = Config(str(BASE_DIR / "alembic.ini"))
+    config.set_main_option("script_location", str(BASE_DIR / "migrations"))
+    logger.info(f"Migrating {settings.DB_NAME} to {args.revision}")
+    command.upgrade(config, args.revision)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m src")
+    parser.add_argument("--log-level", default="INFO")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="development server")
+    run_parser.add_argument("--host", default="127.0.0.1")
+    run_parser.add_argument("--port", type=int, default=settings.server.port)
+    run_parser.set_defaults(handler=run)
+
+    serve_parser = commands.add_parser("serve", help="production server")
+    serve_parser.set_defaults(handler=serve)
+
+    migrate_parser = commands.add_parser("migrate", help="apply migrations")
+    migrate_parser.add_argument("revision", nargs="?", default="head")
+    migrate_parser.set_defaults(handler=migrate)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    args.handler(args)
@@ -1,13 +1,16 @@
-import asyncio
+from fastapi import APIRouter, Header, HTTPException, Query, status
+from starlette.responses import JSONResponse, Response
 
-from fastapi import APIRouter, Depends, HTTPException
-from loguru import logger
-from sqlalchemy import text
-from sqlalchemy.ext.asyncio import AsyncSession
-from starlette.responses import JSONResponse
-
-from src.database.db import get_async_session
-from src.metadata import ERROR_MAPS
+from src.config import settings
+from src.utils.health import health_prober
+from src.utils.lifecycle import lifecycle_state
+from src.utils.metrics import render_metrics
+from src.utils.profiling import (
+    WORKER_PROFILE_PATH,
+    is_authorised,
+    profile_worker,
+    profiler_lock,
+)
 
 __all__ = ["router"]
 
@@ -15,16 +18,70 @@ __all__ = ["router"]
 router = APIRouter()
 
 
-@router.get("/healthz", tags=["healthz"])
-async def health_check(session: AsyncSession = Depends(get_async_session)):
-    async def check_service(service: str):
-        try:
-            if service == "postgres":
-                await session.execute(text("SELECT 1"))
-        except Exception as ex:
-            logger.error(f"Health check failed with error: {ex}")
-            raise HTTPException(status_code=400, detail=ERROR_MAPS.get(service))
+@router.get("/livez", tags=["healthz"])
+async def liveness_check():
+    """
+    The worker's event loop responds, no dependency is checked
+    """
+    return JSONResponse(status_code=200, content={"status": "ok"})
+
 
-    await asyncio.gather(*[check_service("postgres")])
+@router.get("/readyz", tags=["healthz"])
+async def readiness_check():
+    """
+    Startup is done and the last background probe found the critical
+    dependencies healthy. Reports the latency of every dependency
+    """
+    report = health_prober.report
+    ready = lifecycle_state.ready and report.healthy
+    return JSONResponse(
+        status_code=(
+            status.HTTP_200_OK if ready else status.HTTP_503_SERVICE_UNAVAILABLE
+        ),
+        content={"ready": ready, **report.to_dict()},
+    )
 
+
+@router.get("/healthz", tags=["healthz"])
+async def health_check():
+    if not lifecycle_state.ready:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="The service is starting or shutting down",
+        )
+    report = health_prober.report
+    if not report.healthy:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=report.errors
+        )
     return JSONResponse(status_code=200, content={})
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics():
+    content, media_type = render_metrics()
+    return Response(content=content, media_type=media_type)
+
+
+@router.post(WORKER_PROFILE_PATH, include_in_schema=False)
+async def profile_worker_for(
+    seconds: int = Query(10, ge=1, le=settings.profiling.max_worker_seconds),
+    token: str | None = Header(None, alias=settings.profiling.header),
+):
+    """
+    Profile the worker serving this request for the given number of seconds
+    """
+    if not settings.profiling.enabled:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+    if not is_authorised(token):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN)
+    if profiler_lock.locked():
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="The worker is already being profiled",
+        )
+    async with profiler_lock:
+        profile_id, report, media_type = await profile_worker(seconds)
+    return Response(
+        content=report, media_type=media_type, headers={"X-Profile-Id": profile_id}
+    )
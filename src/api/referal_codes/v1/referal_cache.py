@@ -0,0 +1,57 @@
+from datetime import date, datetime, time, timedelta
+
+from loguru import logger
+from redis.exceptions import RedisError
+
+from src.config import settings
+from src.database.redis import local_cache, redis_client
+from src.schemas.referal_code_schema import CachedReferalCode
+
+
+def _referal_code_key(code: int) -> str:
+    return f"{settings.rc_cache.prefix}:{code}"
+
+
+async def get_cached_referal_code(code: int) -> CachedReferalCode | None:
+    """
+    Resolve referal code from the cache, expired or unknown codes are misses
+    """
+    try:
+        cached = await local_cache.get(_referal_code_key(code))
+    except RedisError as ex:
+        logger.warning(f"Referal code cache read failed with error: {ex}")
+        return None
+    if cached is None:
+        return None
+    referal_code = CachedReferalCode.model_validate_json(cached)
+    if referal_code.exp_date < date.today():
+        return None
+    return referal_code
+
+
+async def cache_referal_code(code: int, referal_code: CachedReferalCode) -> None:
+    """
+    Cache referal code until the end of its expiration date
+    """
+    expires_at = datetime.combine(referal_code.exp_date + timedelta(days=1), time.min)
+    ttl = min(
+        int((expires_at - datetime.now()).total_seconds()),
+        settings.rc_cache.ttl_seconds,
+    )
+    if ttl <= 0:
+        return
+    local_cache.invalidate(_referal_code_key(code))
+    try:
+        await redis_client.set(
+            _referal_code_key(code), referal_code.model_dump_json(), ex=ttl
+        )
+    except RedisError as ex:
+        logger.warning(f"Referal code cache write failed with error: {ex}")
+
+
+async def invalidate_referal_code(code: int) -> None:
+    local_cache.invalidate(_referal_code_key(code))
+    try:
+        await redis_client.delete(_referal_code_key(code))
+    except RedisError as ex:
+        logger.warning(f"Referal code cache invalidation failed with error: {ex}")
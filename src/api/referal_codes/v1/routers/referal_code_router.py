@@ -10,6 +10,7 @@ from src.schemas.referal_code_schema import (
     ReferalCodeResponse,
 )
 from src.schemas.user_schema import UserAuthSchema
+from src.utils.serialization import TrustedJSONResponse
 
 router = APIRouter(prefix="/referal_codes", tags=["Referal codes"])
 
@@ -27,7 +28,10 @@ async def add_referal_code(
         code: ReferalCodeDB = await service.create_referal_code_by_referer(
             user_id=auth_user.id, referal_code_data=referal_code_data.model_dump()
         )
-        return ReferalCodeCreateResponse(payload=code)
+        return TrustedJSONResponse(
+            ReferalCodeCreateResponse(payload=code),
+            status_code=status.HTTP_201_CREATED,
+        )
 
 
 @router.put("/activate_rc", status_code=status.HTTP_200_OK)
@@ -43,7 +47,7 @@ async def activate_referal_code(
         active_code: ReferalCodeDB = await service.activate_referal_code(
             referal_code=referal_code, user_id=auth_user.id
         )
-        return ReferalCodeResponse(payload=active_code)
+        return TrustedJSONResponse(ReferalCodeResponse(payload=active_code))
 
 
 @router.delete("/delete_rc", status_code=status.HTTP_204_NO_CONTENT)
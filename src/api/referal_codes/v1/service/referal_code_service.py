@@ -2,17 +2,43 @@ from datetime import datetime, timedelta
 
 from fastapi import HTTPException, status
 
+from src.api.referal_codes.v1.referal_cache import (
+    cache_referal_code,
+    invalidate_referal_code,
+)
 from src.models import ReferalCodeModel
-from src.schemas.referal_code_schema import ReferalCodeDB
+from src.schemas.referal_code_schema import CachedReferalCode, ReferalCodeDB
 from src.utils.service import BaseService
 from src.utils.unit_of_work import transaction_mode
 
 
 class ReferalCodeService(BaseService):
 
-    @transaction_mode
     async def create_referal_code_by_referer(
         self, user_id: int, referal_code_data: dict
+    ) -> ReferalCodeDB:
+        new_ref_code = await self._create_referal_code(
+            user_id=user_id, referal_code_data=referal_code_data
+        )
+        await self._cache_referal_code(ref_code=new_ref_code, user_id=user_id)
+        return new_ref_code
+
+    async def activate_referal_code(
+        self, referal_code: int, user_id: int
+    ) -> ReferalCodeDB:
+        active_code = await self._activate_referal_code(
+            referal_code=referal_code, user_id=user_id
+        )
+        await self._cache_referal_code(ref_code=active_code, user_id=user_id)
+        return active_code
+
+    async def delete_referal_code(self, referal_code: int, user_id: int) -> None:
+        await self._delete_referal_code(referal_code=referal_code, user_id=user_id)
+        await invalidate_referal_code(code=referal_code)
+
+    @transaction_mode
+    async def _create_referal_code(
+        self, user_id: int, referal_code_data: dict
     ) -> ReferalCodeDB:
         code = referal_code_data["code"]
         ref_code: ReferalCodeModel | None = (
@@ -21,8 +47,7 @@ class ReferalCodeService(BaseService):
         self._check_referal_code_already_exists(code=ref_code)
         exp_date = datetime.now().date() + timedelta(days=referal_code_data["days"])
         if referal_code_data["is_active"] == True:
-            active_ref_code = await self.uow.referal_code.get_one_active_code()
-            if not active_ref_code:
+            if not await self.uow.referal_code.has_active_code(user_id=user_id):
                 new_ref_code: ReferalCodeModel = (
                     await self.uow.referal_code.add_one_and_get_obj(
                         code=code, exp_date=exp_date, is_active=True, user_id=user_id
@@ -43,15 +68,14 @@ class ReferalCodeService(BaseService):
             return new_ref_code.to_pydantic_schema()
 
     @transaction_mode
-    async def activate_referal_code(
+    async def _activate_referal_code(
         self, referal_code: int, user_id: int
     ) -> ReferalCodeDB:
         ref_code: ReferalCodeModel | None = (
             await self.uow.referal_code.get_by_query_one_or_none(code=referal_code)
         )
         self._check_referal_code_exists(code=ref_code)
-        active_ref_code = await self.uow.referal_code.get_one_active_code()
-        if len(active_ref_code) == 0:
+        if not await self.uow.referal_code.has_active_code(user_id=user_id):
             if ref_code.exp_date >= datetime.now().date():
                 if ref_code.user_id == user_id:
                     update_ref_code: ReferalCodeModel = (
@@ -74,7 +98,7 @@ class ReferalCodeService(BaseService):
             )
 
     @transaction_mode
-    async def delete_referal_code(self, referal_code: int, user_id: int) -> None:
+    async def _delete_referal_code(self, referal_code: int, user_id: int) -> None:
         ref_code: ReferalCodeModel | None = (
             await self.uow.referal_code.get_by_query_one_or_none(code=referal_code)
         )
@@ -86,6 +110,17 @@ class ReferalCodeService(BaseService):
         else:
             self._checking_the_codes_ownership()
 
+    @staticmethod
+    async def _cache_referal_code(ref_code: ReferalCodeDB, user_id: int) -> None:
+        await cache_referal_code(
+            code=ref_code.code,
+            referal_code=CachedReferalCode(
+                user_id=user_id,
+                exp_date=ref_code.exp_date,
+                is_active=ref_code.is_active,
+            ),
+        )
+
     @staticmethod
     def _check_referal_code_already_exists(code: ReferalCodeModel | None) -> None:
         if code:
@@ -1,19 +1,43 @@
+import functools
 from datetime import datetime, timedelta
+from typing import Any
 
 import bcrypt
 import jwt
 
 from src.config import settings
+from src.utils.metrics import JWT_DURATION, PASSWORD_HASH_DURATION
+from src.utils.tracing import span
+
+
+@functools.cache
+def jwt_signing_key() -> Any:
+    """
+    Private key parsed once, parsing and validating the PEM
+    costs more than signing with it
+    """
+    return jwt.get_algorithm_by_name(settings.auth_jwt.algorithm).prepare_key(
+        settings.auth_jwt.private_key_path.read_text()
+    )
+
+
+@functools.cache
+def jwt_verification_key() -> Any:
+    return jwt.get_algorithm_by_name(settings.auth_jwt.algorithm).prepare_key(
+        settings.auth_jwt.public_key_path.read_text()
+    )
 
 
 def encode_jwt(
     payload: dict,
-    private_key: str = settings.auth_jwt.private_key_path.read_text(),
+    private_key: Any = None,
     algorithm: str = settings.auth_jwt.algorithm,
     expire_minutes: int = settings.auth_jwt.access_token_expire_minutes,
     expire_timedelta: timedelta | None = None,
 ) -> str:
     """Encode JWT"""
+    if private_key is None:
+        private_key = jwt_signing_key()
     to_encode = payload.copy()
     now = datetime.utcnow()
     if expire_timedelta:
@@ -21,17 +45,21 @@ def encode_jwt(
     else:
         expire = now + timedelta(minutes=expire_minutes)
     to_encode.update(exp=expire, iat=now)
-    encoded = jwt.encode(to_encode, private_key, algorithm=algorithm)
+    with span("jwt.sign"), JWT_DURATION.labels("sign").time():
+        encoded = jwt.encode(to_encode, private_key, algorithm=algorithm)
     return encoded
 
 
 def decode_jwt(
     token: str | bytes,
-    public_key: str = settings.auth_jwt.public_key_path.read_text(),
+    public_key: Any = None,
     algorithm: str = settings.auth_jwt.algorithm,
 ) -> dict:
     """Decode JWT"""
-    decoded = jwt.decode(token, public_key, algorithms=[algorithm])
+    if public_key is None:
+        public_key = jwt_verification_key()
+    with span("jwt.verify"), JWT_DURATION.labels("verify").time():
+        decoded = jwt.decode(token, public_key, algorithms=[algorithm])
     return decoded
 
 
@@ -39,7 +67,8 @@ async def hash_password(password: str) -> bytes:
     """Hash password"""
     pwd_bytes = password.encode("utf-8")
     salt = bcrypt.gensalt()
-    hashed_password = bcrypt.hashpw(password=pwd_bytes, salt=salt)
+    with span("bcrypt.hash"), PASSWORD_HASH_DURATION.labels("hash").time():
+        hashed_password = bcrypt.hashpw(password=pwd_bytes, salt=salt)
     return hashed_password
 
 
@@ -47,4 +76,7 @@ async def validate_password(password: str, hashed_password: bytes) -> bool:
     """Check valid password"""
     password_byte_enc = password.encode("utf-8")
     hashed_password = hashed_password
-    return bcrypt.checkpw(password=password_byte_enc, hashed_password=hashed_password)
+    with span("bcrypt.check"), PASSWORD_HASH_DURATION.labels("check").time():
+        return bcrypt.checkpw(
+            password=password_byte_enc, hashed_password=hashed_password
+        )
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Form
 from fastapi.security import HTTPBearer
 from pydantic import EmailStr
 
@@ -8,14 +8,31 @@ from src.api.users.v1.auth.validate import (
     get_current_auth_user_for_refresh,
     validate_auth_user,
 )
+from src.config import settings
 from src.schemas.user_schema import Token, UserAuthSchema
+from src.utils.rate_limiter import client_ip, rate_limit
 
 http_bearer = HTTPBearer(auto_error=False)
 
 router = APIRouter(prefix="/jwt", tags=["JWT"], dependencies=[Depends(http_bearer)])
 
 
-@router.post("/login", response_model=Token)
+def login_username(username: str = Form()) -> str:
+    return username
+
+
+@router.post(
+    "/login",
+    response_model=Token,
+    dependencies=[
+        Depends(rate_limit("login_ip", settings.rate_limits.login_ip, client_ip)),
+        Depends(
+            rate_limit(
+                "login_account", settings.rate_limits.login_account, login_username
+            )
+        ),
+    ],
+)
 async def auth_user_issue_jwt(
     user: UserAuthSchema = Depends(validate_auth_user),
 ) -> Token:
@@ -1,13 +1,17 @@
 from collections.abc import Sequence
 
-from fastapi import APIRouter, BackgroundTasks, Depends, status
-from fastapi_cache.decorator import cache
+from fastapi import APIRouter, BackgroundTasks, Depends, Response, status
 from pydantic import EmailStr
 
 from src.api.users.v1.auth.validate import get_current_active_auth_user
 from src.api.users.v1.service.user_service import UserService
+from src.config import settings
 from src.schemas.user_schema import (
     CreateUserRequest,
+    InviteRequest,
+    InviteResponse,
+    InviteStatus,
+    RecipientStatus,
     UpdateUserRequest,
     UserAuthSchema,
     UserCreateResponse,
@@ -15,6 +19,10 @@ from src.schemas.user_schema import (
     UserListResponse,
     UserResponse,
 )
+from src.utils.cache import cache_response
+from src.utils.conditional import conditional_get
+from src.utils.rate_limiter import client_ip, rate_limit
+from src.utils.serialization import TrustedJSONResponse
 
 router = APIRouter(prefix="/users", tags=["Users"])
 
@@ -27,10 +35,29 @@ async def register_user(
     Register new user
     """
     user: UserDB = await service.register_user(user_data=user_data.model_dump())
-    return UserCreateResponse(payload=user)
+    return TrustedJSONResponse(
+        UserCreateResponse(payload=user), status_code=status.HTTP_201_CREATED
+    )
+
 
+def recipient_email(user_email: EmailStr) -> str:
+    return user_email
 
-@router.get("/get_rc_by_email", status_code=status.HTTP_200_OK)
+
+@router.get(
+    "/get_rc_by_email",
+    status_code=status.HTTP_200_OK,
+    dependencies=[
+        Depends(rate_limit("email_ip", settings.rate_limits.email_ip, client_ip)),
+        Depends(
+            rate_limit(
+                "email_recipient",
+                settings.rate_limits.email_recipient,
+                recipient_email,
+            )
+        ),
+    ],
+)
 async def get_referal_code_by_email(
     referer_email: EmailStr,
     user_email: EmailStr,
@@ -40,17 +67,52 @@ async def get_referal_code_by_email(
     """
     Receiving referal code by email
     """
-    await service.get_referal_code_by_email(
+    invite_status: InviteStatus = await service.get_referal_code_by_email(
         referer_email=referer_email,
         user_email=user_email,
         background_tasks=background_tasks,
     )
+    if invite_status == InviteStatus.ALREADY_SENT:
+        # Nothing is sent again within the cooldown, retries included
+        return {
+            "status_code": status.HTTP_200_OK,
+            "status": invite_status,
+            "detail": f"A message with an referal_code was already sent to email {user_email}",
+        }
     return {
         "status_code": status.HTTP_200_OK,
+        "status": invite_status,
         "detail": f"A message with an referal_code has been sent to email {user_email}",
     }
 
 
+@router.post(
+    "/invite",
+    status_code=status.HTTP_202_ACCEPTED,
+    dependencies=[
+        Depends(rate_limit("email_ip", settings.rate_limits.email_ip, client_ip)),
+    ],
+)
+async def invite_by_email(
+    invite: InviteRequest,
+    background_tasks: BackgroundTasks,
+    service: UserService = Depends(UserService),
+) -> InviteResponse:
+    """
+    Send the referal code to a batch of recipients, returns the status
+    of every recipient in the order given
+    """
+    statuses: list[RecipientStatus] = await service.invite_by_email(
+        referer_email=invite.referer_email,
+        recipients=invite.recipients,
+        background_tasks=background_tasks,
+    )
+    return TrustedJSONResponse(
+        InviteResponse(status=status.HTTP_202_ACCEPTED, payload=statuses),
+        status_code=status.HTTP_202_ACCEPTED,
+    )
+
+
 @router.post("/end_registration", status_code=status.HTTP_201_CREATED)
 async def end_registration_by_referal_code(
     referal_code: int,
@@ -63,13 +125,36 @@ async def end_registration_by_referal_code(
     user: UserDB = await service.end_registration_by_referal_code(
         referal_code=referal_code, user_data=user_data.model_dump()
     )
-    return UserCreateResponse(payload=user)
+    return TrustedJSONResponse(
+        UserCreateResponse(payload=user), status_code=status.HTTP_201_CREATED
+    )
+
+
+async def user_info_version(
+    email: EmailStr,
+    service: UserService = Depends(UserService),
+    auth_user: UserAuthSchema = Depends(get_current_active_auth_user),
+) -> str | None:
+    return await service.get_user_version(email=email)
+
+
+async def referals_info_version(
+    referer_id: int,
+    service: UserService = Depends(UserService),
+    auth_user: UserAuthSchema = Depends(get_current_active_auth_user),
+) -> str | None:
+    return await service.get_referals_version(referer_id=referer_id)
 
 
-@router.get("/user_info", status_code=status.HTTP_200_OK)
-@cache(expire=3600)
+@router.get(
+    "/user_info",
+    status_code=status.HTTP_200_OK,
+    dependencies=[Depends(conditional_get(user_info_version))],
+)
+@cache_response()
 async def get_user_info_by_email(
     email: EmailStr,
+    response: Response,
     service: UserService = Depends(UserService),
     auth_user: UserAuthSchema = Depends(get_current_active_auth_user),
 ) -> UserResponse:
@@ -78,13 +163,18 @@ async def get_user_info_by_email(
     """
     if auth_user:
         user: UserDB = await service.get_user_info(email=email)
-        return UserResponse(payload=user)
+        return TrustedJSONResponse(UserResponse(payload=user), sub_response=response)
 
 
-@router.get("/referals_info", status_code=status.HTTP_200_OK)
-@cache(expire=3600)
+@router.get(
+    "/referals_info",
+    status_code=status.HTTP_200_OK,
+    dependencies=[Depends(conditional_get(referals_info_version))],
+)
+@cache_response()
 async def get_referals_info_by_referer_id(
     referer_id: int,
+    response: Response,
     service: UserService = Depends(UserService),
     auth_user: UserAuthSchema = Depends(get_current_active_auth_user),
 ) -> UserListResponse:
@@ -93,7 +183,9 @@ async def get_referals_info_by_referer_id(
     """
     if auth_user:
         users: Sequence[UserDB] = await service.get_referals_info(referer_id=referer_id)
-        return UserListResponse(payload=users)
+        return TrustedJSONResponse(
+            UserListResponse(payload=users), sub_response=response
+        )
 
 
 @router.put("/update_user_info", status_code=status.HTTP_200_OK)
@@ -110,13 +202,14 @@ async def update_user_info(
         user: UserDB = await service.update_user_info(
             email=email, user_data=user_data.model_dump()
         )
-        return UserResponse(payload=user)
+        return TrustedJSONResponse(UserResponse(payload=user))
 
 
 @router.get("/email_exists", status_code=status.HTTP_200_OK)
-@cache(expire=3600)
+@cache_response()
 async def get_email_exists_by_emailhunter(
     email: EmailStr,
+    response: Response,
     service: UserService = Depends(UserService),
     auth_user: UserAuthSchema = Depends(get_current_active_auth_user),
 ) -> UserResponse:
@@ -125,7 +218,7 @@ async def get_email_exists_by_emailhunter(
     """
     if auth_user:
         user: UserDB = await service.email_exists_by_emailhunter(email=email)
-        return UserResponse(payload=user)
+        return TrustedJSONResponse(UserResponse(payload=user), sub_response=response)
     # Error : Unfortunately, it isn't possible to sign up using a webmail address. Please use a professional email address instead (for example youraddress@yourcompany.com).
 
 
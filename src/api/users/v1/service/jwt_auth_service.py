@@ -1,6 +1,8 @@
 from fastapi import HTTPException, status
 from pydantic import EmailStr
+from sqlalchemy import Row
 
+from src.models import User
 from src.schemas.user_schema import UserAuthSchema
 from src.utils.service import BaseService
 from src.utils.unit_of_work import transaction_mode
@@ -13,7 +15,9 @@ class JWTAuthService(BaseService):
         username: EmailStr,
     ) -> UserAuthSchema:
         """Get user by email"""
-        user = await self.uow.user.get_by_query_one_or_none(email=username)
+        user: Row | None = await self.uow.user.get_columns_by_query_one_or_none(
+            (User.id, User.email, User.password, User.is_active), email=username
+        )
         if user:
             return UserAuthSchema(
                 id=user.id,
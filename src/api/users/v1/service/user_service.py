@@ -2,22 +2,36 @@ from collections.abc import Sequence
 
 from email_hunter import EmailHunterClient
 from fastapi import BackgroundTasks, HTTPException, status
-from pydantic import EmailStr
+from pydantic import EmailStr, ValidationError
+from sqlalchemy import Row
 
+from src.api.referal_codes.v1.referal_cache import (
+    cache_referal_code,
+    get_cached_referal_code,
+)
 from src.api.referal_codes.v1.referal_utils import validate_referal_code
 from src.api.users.v1.auth import utils as auth_utils
 from src.config import settings
 from src.models import ReferalCodeModel, User
-from src.schemas.user_schema import UserDB
+from src.schemas.referal_code_schema import CachedReferalCode
+from src.schemas.user_schema import InviteStatus, RecipientStatus, UserDB, UserId
+from src.utils.conditional import weak_etag
+from src.utils.quota import DailyQuota
+from src.utils.serialization import type_adapter, validate_row, validate_rows
 from src.utils.service import BaseService
 from src.utils.unit_of_work import transaction_mode
-from src.workers.email_task import get_referal_code_report
+from src.workers.dedup import SendKey, send_deduplicator
+from src.workers.email_task import get_referal_code_report, get_referal_code_reports
 
 # import clearbit
 
 client = EmailHunterClient(settings.EMAIL_HUNTER_API_KEY)
+client.base_url = settings.EMAIL_HUNTER_URL
 # clearbit.key = settings.CLEARBIT_API_KEY
 
+END_REGISTRATION_HREF = "http://127.0.0.1:8000/api/users/end_registration"
+invite_quota = DailyQuota(settings.invites.prefix, settings.invites.daily_quota)
+
 
 class UserService(BaseService):
 
@@ -34,74 +48,179 @@ class UserService(BaseService):
         )
         return new_user.to_pydantic_schema()
 
-    @transaction_mode
     async def get_referal_code_by_email(
         self,
         referer_email: EmailStr,
         user_email: EmailStr,
         background_tasks: BackgroundTasks,
-    ) -> None:
-        referer: User | None = await self.uow.user.get_by_query_one_or_none(
-            email=referer_email
+    ) -> InviteStatus:
+        active_ref_code: ReferalCodeModel = await self._get_active_referal_code(
+            referer_email=referer_email
         )
-        self._check_user_exists(user=referer)
-        active_ref_code: ReferalCodeModel | None = (
-            await self.uow.referal_code.get_by_query_one_or_none(
-                is_active=True, user_id=referer.id
-            )
+        send_key = SendKey(user_email, active_ref_code.user_id, active_ref_code.code)
+        [claimed] = await send_deduplicator.claim([send_key])
+        if not claimed:
+            return InviteStatus.ALREADY_SENT
+        get_referal_code_report(
+            background_tasks=background_tasks,
+            email_to=user_email,
+            username=user_email,
+            referal_code=active_ref_code.code,
+            send_key=send_key,
+            href=END_REGISTRATION_HREF,
+            href_name="End registration",
         )
-        if active_ref_code:
-            get_referal_code_report(
+        return InviteStatus.QUEUED
+
+    async def invite_by_email(
+        self,
+        referer_email: EmailStr,
+        recipients: Sequence[str],
+        background_tasks: BackgroundTasks,
+    ) -> list[RecipientStatus]:
+        """
+        Send the active referal code of the referer to every valid and
+        distinct recipient who did not get it within the cooldown, as many
+        as the daily quota of the referer still allows, all of them in
+        a single background task
+        """
+        statuses, valid = self._screen_recipients(recipients)
+        active_ref_code: ReferalCodeModel = await self._get_active_referal_code(
+            referer_email=referer_email
+        )
+        keys = [
+            SendKey(email, active_ref_code.user_id, active_ref_code.code)
+            for _, email in valid
+        ]
+        claims = await send_deduplicator.claim(keys)
+        for (position, _), claimed in zip(valid, claims):
+            if not claimed:
+                statuses[position] = InviteStatus.ALREADY_SENT
+        valid = [recipient for recipient, claimed in zip(valid, claims) if claimed]
+        keys = [key for key, claimed in zip(keys, claims) if claimed]
+
+        granted = await invite_quota.take(active_ref_code.user_id, len(valid))
+        for position, _ in valid[granted:]:
+            statuses[position] = InviteStatus.QUOTA_EXCEEDED
+        await send_deduplicator.release(keys[granted:])
+        if granted:
+            get_referal_code_reports(
                 background_tasks=background_tasks,
-                email_to=user_email,
-                username=user_email,
+                send_keys=keys[:granted],
                 referal_code=active_ref_code.code,
-                href="http://127.0.0.1:8000/api/users/end_registration",
+                href=END_REGISTRATION_HREF,
                 href_name="End registration",
             )
-        else:
+        return [
+            RecipientStatus(email=recipient, status=status)
+            for recipient, status in zip(recipients, statuses)
+        ]
+
+    @transaction_mode
+    async def _get_active_referal_code(
+        self, referer_email: EmailStr
+    ) -> ReferalCodeModel:
+        referer: Row | None = await self.uow.user.get_columns_by_query_one_or_none(
+            UserId, email=referer_email
+        )
+        self._check_user_exists(user=referer)
+        active_ref_code: ReferalCodeModel | None = (
+            await self.uow.referal_code.get_live_by_query_one_or_none(
+                is_active=True, user_id=referer.id
+            )
+        )
+        if not active_ref_code:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"The user {referer_email} does not have any active referal codes",
             )
+        return active_ref_code
 
-    @transaction_mode
     async def end_registration_by_referal_code(
         self, referal_code: int, user_data: dict
     ) -> UserDB:
         validate_rc = validate_referal_code(code=referal_code)
         if validate_rc:
-            ref_code: ReferalCodeModel | None = (
-                await self.uow.referal_code.get_by_query_one_or_none(code=referal_code)
+            user_data["password"] = await auth_utils.hash_password(
+                user_data["password"]
             )
-            self._check_referal_code_exists(code=ref_code)
-            user: User | None = await self.uow.user.get_by_query_one_or_none(
-                email=user_data["email"]
+            cached_code: CachedReferalCode | None = await get_cached_referal_code(
+                code=referal_code
             )
-            self._check_user_already_exists(user=user)
-            password = await auth_utils.hash_password(user_data["password"])
-            user_data.pop("password")
-            new_user: User = await self.uow.user.add_one_and_get_obj(
-                password=password, referer_by=ref_code.user_id, **user_data
+            if cached_code:
+                new_user: User | None = await self._add_referal(
+                    referer_id=cached_code.user_id, user_data=user_data
+                )
+                self._check_user_created(user=new_user)
+                return new_user.to_pydantic_schema()
+
+            referal: Row | None = await self._add_referal_by_referal_code(
+                referal_code=referal_code, user_data=user_data
+            )
+            self._check_referal_code_exists(code=referal)
+            await cache_referal_code(
+                code=referal_code,
+                referal_code=CachedReferalCode(
+                    user_id=referal.referer_id,
+                    exp_date=referal.code_exp_date,
+                    is_active=referal.code_is_active,
+                ),
             )
-            return new_user.to_pydantic_schema()
+            self._check_user_created(user=referal.id)
+            return UserDB(**referal._mapping)
+
+    @transaction_mode
+    async def _add_referal(self, referer_id: int, user_data: dict) -> User | None:
+        return await self.uow.user.add_one_or_none(referer_by=referer_id, **user_data)
+
+    @transaction_mode
+    async def _add_referal_by_referal_code(
+        self, referal_code: int, user_data: dict
+    ) -> Row | None:
+        return await self.uow.user.add_one_by_referal_code(
+            referal_code=referal_code, **user_data
+        )
 
     @transaction_mode
     async def get_user_info(self, email: EmailStr) -> UserDB:
-        user: User | None = await self.uow.user.get_by_query_one_or_none(email=email)
+        user: Row | None = await self.uow.user.get_columns_by_query_one_or_none(
+            UserDB, email=email
+        )
         self._check_user_exists(user=user)
-        return user.to_pydantic_schema()
+        return validate_row(UserDB, user)
 
     @transaction_mode
     async def get_referals_info(self, referer_id: int) -> Sequence[UserDB]:
-        referer: User | None = await self.uow.user.get_by_query_one_or_none(
-            id=referer_id
+        referer: Row | None = await self.uow.user.get_columns_by_query_one_or_none(
+            UserId, id=referer_id
         )
         self._check_user_exists(user=referer)
-        referals: Sequence[User] = await self.uow.user.get_all_referals_by_referer(
-            referer_id=referer.id
+        referals: Sequence[Row] = await self.uow.user.get_columns_by_query_all(
+            UserDB, referer_by=referer.id
         )
-        return [referal.to_pydantic_schema() for referal in referals]
+        return validate_rows(UserDB, referals)
+
+    @transaction_mode
+    async def get_user_version(self, email: EmailStr) -> str | None:
+        """
+        ETag of the user info, None when the user is not found
+        """
+        user: Row | None = await self.uow.user.get_columns_by_query_one_or_none(
+            (User.id, User.updated_at), email=email
+        )
+        if user is None:
+            return None
+        return weak_etag("user", user.id, user.updated_at)
+
+    @transaction_mode
+    async def get_referals_version(self, referer_id: int) -> str | None:
+        """
+        ETag of the referals of the referer, None when there are none
+        """
+        version: Row = await self.uow.user.get_referals_version(referer_id=referer_id)
+        if not version.count:
+            return None
+        return weak_etag("referals", referer_id, version.count, version.updated_at)
 
     @transaction_mode
     async def update_user_info(self, email: EmailStr, user_data: dict) -> UserDB:
@@ -140,7 +259,32 @@ class UserService(BaseService):
     #     )
 
     @staticmethod
-    def _check_user_exists(user: User | None) -> None:
+    def _screen_recipients(
+        recipients: Sequence[str],
+    ) -> tuple[list[InviteStatus], list[tuple[int, str]]]:
+        """
+        Status of every recipient, queued until the quota is applied,
+        and the position and address of the valid distinct ones
+        """
+        statuses: list[InviteStatus] = []
+        valid: list[tuple[int, str]] = []
+        seen: set[str] = set()
+        for position, recipient in enumerate(recipients):
+            try:
+                email = type_adapter(EmailStr).validate_python(recipient)
+            except ValidationError:
+                statuses.append(InviteStatus.INVALID)
+                continue
+            if email.lower() in seen:
+                statuses.append(InviteStatus.DUPLICATE)
+                continue
+            seen.add(email.lower())
+            valid.append((position, email))
+            statuses.append(InviteStatus.QUEUED)
+        return statuses, valid
+
+    @staticmethod
+    def _check_user_exists(user: User | Row | None) -> None:
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
@@ -153,6 +297,13 @@ class UserService(BaseService):
                 status_code=status.HTTP_409_CONFLICT, detail="User already exists"
             )
 
+    @staticmethod
+    def _check_user_created(user: User | int | None) -> None:
+        if not user:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT, detail="User already exists"
+            )
+
     @staticmethod
     def _check_correct_referal_code(code: int | None) -> None:
         if not code:
@@ -161,7 +312,7 @@ class UserService(BaseService):
             )
 
     @staticmethod
-    def _check_referal_code_exists(code: ReferalCodeModel | None) -> None:
+    def _check_referal_code_exists(code: ReferalCodeModel | Row | None) -> None:
         if not code:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND, detail="Referal code not found"
@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 
 from dotenv import find_dotenv, load_dotenv
@@ -17,6 +18,254 @@ class AuthJWT(BaseModel):
     refresh_token_expire_days: int = 3
 
 
+class ReferalCodePartitions(BaseModel):
+    months_ahead: int = 3
+    retention_months: int = 1
+    maintenance_interval_seconds: int = 6 * 60 * 60
+
+
+class ReferalCodeCache(BaseModel):
+    prefix: str = "referal_code"
+    ttl_seconds: int = 24 * 60 * 60
+
+
+class ResponseCache(BaseModel):
+    prefix: str = "fastapi-cache"
+    expire_seconds: int = 60 * 60
+    # Values other than response bodies are stored as "orjson" or "msgpack",
+    # bodies are always kept as the JSON bytes sent to the client
+    serializer: str = "orjson"
+    # "zstd", "lz4", "zlib" or "none", values shorter than the threshold
+    # are stored uncompressed. lz4 levels from 3 up are its slower high
+    # compression mode
+    compression: str = "zstd"
+    compression_level: int = 3
+    compression_threshold_bytes: int = 4096
+
+
+class Compression(BaseModel):
+    enabled: bool = True
+    # Content-Encodings in the order of preference, the ones whose library
+    # is not installed are skipped
+    encodings: list[str] = ["br", "zstd", "gzip"]
+    levels: dict[str, int] = {"br": 4, "zstd": 3, "gzip": 6}
+    minimum_size_bytes: int = 1024
+    content_types: list[str] = [
+        "application/json",
+        "text/csv",
+        "text/html",
+        "text/plain",
+    ]
+    # Bodies and chunks from this size up are compressed in the thread pool
+    offload_size_bytes: int = 256 * 1024
+    # Encodings of the cached response bodies compressed when they are
+    # stored and sent without compressing them again on a hit. A body
+    # the response cache compresses with zstd already is a zstd encoding
+    cached_encodings: list[str] = []
+
+
+class Idempotency(BaseModel):
+    header: str = "Idempotency-Key"
+    prefix: str = "idempotency"
+    ttl_seconds: int = 24 * 60 * 60
+    lock_ttl_seconds: int = 60
+    wait_timeout_seconds: float = 10.0
+    poll_interval_seconds: float = 0.05
+    paths: list[str] = [
+        "/api/users/register",
+        "/api/users/end_registration",
+        "/api/referal_codes/create_referal_code",
+        "/api/users/invite",
+    ]
+
+
+class RateLimit(BaseModel):
+    times: int
+    seconds: int
+
+
+class RateLimits(BaseModel):
+    prefix: str = "rate_limit"
+    local_max_keys: int = 10_000
+    login_ip: RateLimit = RateLimit(times=20, seconds=60)
+    login_account: RateLimit = RateLimit(times=5, seconds=60)
+    email_ip: RateLimit = RateLimit(times=10, seconds=60)
+    email_recipient: RateLimit = RateLimit(times=3, seconds=60 * 60)
+
+
+class Invites(BaseModel):
+    prefix: str = "invites"
+    max_recipients: int = 500
+    # Invites one referer may send per UTC day, across every batch
+    daily_quota: int = 1000
+
+
+class Emails(BaseModel):
+    # The SMTP session is reused between sends until it stays idle that long
+    smtp_idle_timeout_seconds: float = 30.0
+    smtp_timeout_seconds: float = 10.0
+
+
+class EmailDedup(BaseModel):
+    prefix: str = "email_sent"
+    # The same referal code is not sent again to the same recipient
+    # on behalf of the same referer within the cooldown
+    cooldown_seconds: int = 60 * 60
+    # Bloom filter of the recent sends of the worker, asked before Redis
+    local_capacity: int = 100_000
+    local_error_rate: float = 0.001
+
+
+class AdmissionControl(BaseModel):
+    # initial_limit and max_limit are capped at the DB pool connections of
+    # a worker, requests admitted over them would only queue on a checkout
+    initial_limit: int = 64
+    min_limit: int = 4
+    max_limit: int = 256
+    target_db_latency_ms: float = 50.0
+    decrease_factor: float = 0.9
+    adjust_interval_seconds: float = 1.0
+    health_paths: list[str] = [
+        "/api/healthz",
+        "/api/livez",
+        "/api/readyz",
+        "/api/metrics",
+    ]
+    auth_prefix: str = "/api/auth"
+    # Priority class by route, the routes not listed are auth under
+    # auth_prefix and reads otherwise
+    route_priorities: dict[str, str] = {
+        "/api/users/register": "auth",
+        "/api/users/end_registration": "auth",
+        "/api/users/invite": "bulk",
+        "/api/admin/profile": "bulk",
+    }
+    # Share of the concurrency limit each priority class may occupy,
+    # the rest is kept for the classes above it
+    priority_shares: dict[str, float] = {"auth": 1.0, "reads": 0.8, "bulk": 0.5}
+    queue_timeouts_ms: dict[str, int] = {"auth": 2000, "reads": 1000, "bulk": 250}
+    route_limits: dict[str, int] = {
+        "/api/users/email_exists": 8,
+        "/api/users/get_rc_by_email": 16,
+        "/api/users/invite": 4,
+    }
+
+
+class DatabasePool(BaseModel):
+    # Connections all replicas of the app may open to Postgres (or PgBouncer),
+    # split evenly between the gunicorn workers of every replica
+    connection_budget: int = 80
+    replicas: int = 1
+    overflow_share: float = 0.25
+    timeout_seconds: float = 10.0
+    recycle_seconds: int = 30 * 60
+    # Disables asyncpg prepared statement caching for PgBouncer in transaction mode
+    pgbouncer: bool = False
+    # Prepared statements kept per connection, compiled SQL kept per engine
+    # and statement shapes (model, operation, keys) of the generic repository
+    # methods kept per worker
+    prepared_statement_cache_size: int = 256
+    compiled_cache_size: int = 1000
+    statement_shape_cache_size: int = 512
+
+
+class RedisPool(BaseModel):
+    # Connections of one worker, shared by the cache, rate limits and locks.
+    # A command waits up to pool_timeout_seconds for one when all are in use
+    max_connections: int = 64
+    pool_timeout_seconds: float = 2.0
+    socket_timeout_seconds: float = 2.0
+    connect_timeout_seconds: float = 2.0
+    retry_on_timeout: bool = True
+    health_check_interval_seconds: int = 30
+    # Commands sent in one round trip by the batch helpers
+    pipeline_chunk_size: int = 500
+    # In-process copies of read-mostly values, they may be stale
+    # for up to local_cache_ttl_seconds after a change on another worker
+    local_cache_enabled: bool = False
+    local_cache_ttl_seconds: float = 5.0
+    local_cache_max_keys: int = 10_000
+
+
+class Server(BaseModel):
+    host: str = "0.0.0.0"
+    port: int = 8000
+    loop: str = "uvloop"
+    http: str = "httptools"
+    # Import the app in the gunicorn master so the workers share its memory
+    preload: bool = True
+    # Keep it above the idle timeout of the load balancer in front of the app
+    keepalive_seconds: int = 5
+    backlog: int = 2048
+    # Workers are restarted after max_requests plus up to max_requests_jitter
+    # requests, the jitter keeps them from restarting all at once
+    max_requests: int = 10_000
+    max_requests_jitter: int = 1_000
+    # Time given to in-flight requests on shutdown before they are cancelled
+    graceful_timeout_seconds: int = 30
+    # A worker silent for this long is killed and replaced
+    timeout_seconds: int = 60
+
+
+class Lifecycle(BaseModel):
+    # Connections opened before the app reports ready, capped by the pool size
+    warmup_db_connections: int = 4
+    warmup_redis_connections: int = 4
+    warmup_timeout_seconds: float = 10.0
+    # Time the background tasks (email sends) get to finish on shutdown
+    drain_timeout_seconds: int = 5
+    # Time the tasks still running then get to stop at their next step,
+    # an email batch after the message being sent
+    stop_timeout_seconds: float = 10.0
+
+
+class HealthChecks(BaseModel):
+    # Dependencies are probed in the background, the endpoints serve the last result
+    interval_seconds: float = 5.0
+    timeout_seconds: float = 2.0
+    # Share of the pool (size and overflow) in use above which it is reported saturated
+    pool_saturation_threshold: float = 0.9
+    # Failing checks of these dependencies make the worker not ready
+    critical: list[str] = ["postgres", "redis"]
+
+
+class QueryAccounting(BaseModel):
+    slow_query_ms: float = 200.0
+    # The same statement executed this many times within one request
+    # is reported as a possible N+1
+    repeated_statement_threshold: int = 5
+    server_timing: bool = True
+
+
+class Tracing(BaseModel):
+    enabled: bool = False
+    service_name: str = "referal-api"
+    # otlp or file
+    exporter: str = "otlp"
+    otlp_endpoint: str = "http://localhost:4318/v1/traces"
+    file_path: Path = BASE_DIR / "logs" / "traces.jsonl"
+    head_sample_ratio: float = 1.0
+    tail_sampling: bool = False
+    tail_latency_threshold_ms: float = 500.0
+    tail_sample_ratio: float = 0.05
+    # How long the decision of a trace applies to its spans ending after
+    # the root, and how long spans wait for a root that does not end
+    tail_decision_ttl_seconds: float = 60.0
+
+
+class Profiling(BaseModel):
+    enabled: bool = False
+    # Requests carrying this token in the header are profiled,
+    # an empty token disables the header trigger
+    header: str = "X-Profile-Token"
+    token: str = ""
+    sample_rate: float = 0.0
+    # html or speedscope, cProfile reports are always pstats dumps
+    report_format: str = "html"
+    reports_dir: Path = BASE_DIR / "logs" / "profiles"
+    max_worker_seconds: int = 60
+
+
 class Settings(BaseSettings):
     MODE: str
 
@@ -33,17 +282,53 @@ class Settings(BaseSettings):
     SMTP_PASSWORD: str
     SMTP_HOST: str
     SMTP_PORT: str
+    SMTP_SSL: bool = True
 
     EMAIL_HUNTER_API_KEY: str
+    EMAIL_HUNTER_URL: str = "https://api.emailhunter.co/v1/"
     CLEARBIT_API_KEY: str
 
+    # Gunicorn workers per replica, one per available CPU when not set
+    WEB_CONCURRENCY: int | None = None
+
     auth_jwt: AuthJWT = AuthJWT()
+    rc_partitions: ReferalCodePartitions = ReferalCodePartitions()
+    rc_cache: ReferalCodeCache = ReferalCodeCache()
+    response_cache: ResponseCache = ResponseCache()
+    compression: Compression = Compression()
+    idempotency: Idempotency = Idempotency()
+    rate_limits: RateLimits = RateLimits()
+    invites: Invites = Invites()
+    emails: Emails = Emails()
+    email_dedup: EmailDedup = EmailDedup()
+    admission: AdmissionControl = AdmissionControl()
+    db_pool: DatabasePool = DatabasePool()
+    redis: RedisPool = RedisPool()
+    server: Server = Server()
+    lifecycle: Lifecycle = Lifecycle()
+    health: HealthChecks = HealthChecks()
+    query_accounting: QueryAccounting = QueryAccounting()
+    tracing: Tracing = Tracing()
+    profiling: Profiling = Profiling()
 
     @property
     def DB_URL(self):
         return f"postgresql+asyncpg://{self.DB_USER}:{self.DB_PASS}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}"
 
-    model_config = SettingsConfigDict(env_file=".env")
+    @property
+    def REDIS_URL(self):
+        return f"redis://{self.REDIS_HOST}:{self.REDIS_PORT}"
+
+    @property
+    def WORKERS(self) -> int:
+        if self.WEB_CONCURRENCY:
+            return self.WEB_CONCURRENCY
+        if hasattr(os, "sched_getaffinity"):
+            # CPUs the container is pinned to rather than those of the host
+            return len(os.sched_getaffinity(0))
+        return os.cpu_count() or 1
+
+    model_config = SettingsConfigDict(env_file=".env", env_nested_delimiter="__")
 
 
 settings = Settings()
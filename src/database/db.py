@@ -1,5 +1,8 @@
+import asyncio
+import contextlib
 from collections.abc import AsyncGenerator
 
+from sqlalchemy import text
 from sqlalchemy.ext.asyncio import (
     AsyncConnection,
     AsyncSession,
@@ -8,10 +11,15 @@ from sqlalchemy.ext.asyncio import (
 )
 
 from src.config import settings
+from src.database.pool import engine_options
+from src.database.prepared_statements import instrument_prepared_statements
+from src.database.query_stats import instrument_query_stats
 
 async_engine = create_async_engine(
-    url=settings.DB_URL, echo=False, future=True, pool_size=50, max_overflow=100
+    url=settings.DB_URL, echo=False, future=True, **engine_options()
 )
+instrument_query_stats(async_engine)
+instrument_prepared_statements(async_engine)
 
 
 async_session_maker = async_sessionmaker(
@@ -37,3 +45,18 @@ async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
     """
     async with async_session_maker() as session:
         yield session
+
+
+async def warm_up_pool(connections: int) -> None:
+    """
+    Open the pool connections up front so that the first requests
+    do not pay the connection setup
+    """
+    connections = min(connections, async_engine.pool.size())
+    async with contextlib.AsyncExitStack() as stack:
+
+        async def open_connection() -> None:
+            conn = await stack.enter_async_context(async_engine.connect())
+            await conn.execute(text("SELECT 1"))
+
+        await asyncio.gather(*(open_connection() for _ in range(connections)))
@@ -0,0 +1,37 @@
+import asyncio
+
+from loguru import logger
+from sqlalchemy import text
+
+from src.config import settings
+from src.database.db import async_engine
+
+
+async def maintain_referal_code_partitions() -> int:
+    """
+    Create the upcoming monthly partitions of referal_code_table
+    and drop the ones whose codes have expired
+    """
+    async with async_engine.begin() as conn:
+        await conn.execute(
+            text("SELECT referal_code_ensure_partitions(:months_ahead)"),
+            {"months_ahead": settings.rc_partitions.months_ahead},
+        )
+        dropped = await conn.execute(
+            text("SELECT referal_code_drop_partitions(:retention_months)"),
+            {"retention_months": settings.rc_partitions.retention_months},
+        )
+        return dropped.scalar_one()
+
+
+async def run_partition_maintenance() -> None:
+    """
+    Background loop running the partition maintenance on an interval
+    """
+    while True:
+        try:
+            dropped = await maintain_referal_code_partitions()
+            logger.info(f"Referal code partitions maintained, dropped: {dropped}")
+        except Exception as ex:
+            logger.error(f"Referal code partition maintenance failed with error: {ex}")
+        await asyncio.sleep(settings.rc_partitions.maintenance_interval_seconds)
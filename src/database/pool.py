@@ -0,0 +1,78 @@
+import time
+from uuid import uuid4
+
+from sqlalchemy.pool import AsyncAdaptedQueuePool, ConnectionPoolEntry
+
+from src.config import settings
+from src.utils.metrics import (
+    DB_POOL_CHECKED_OUT,
+    DB_POOL_CHECKOUT_WAIT,
+    DB_POOL_OVERFLOW,
+    DB_POOL_SIZE,
+)
+
+
+class TimedAsyncQueuePool(AsyncAdaptedQueuePool):
+    """
+    Queue pool exporting checkout wait time and pool occupancy
+    """
+
+    def _do_get(self) -> ConnectionPoolEntry:
+        started_at = time.perf_counter()
+        try:
+            record = super()._do_get()
+        finally:
+            wait = time.perf_counter() - started_at
+            DB_POOL_CHECKOUT_WAIT.observe(wait)
+            self._export_usage()
+        # Read back through Connection.info by the first query of the checkout
+        record.info["checkout_wait"] = wait
+        return record
+
+    def _do_return_conn(self, record: ConnectionPoolEntry) -> None:
+        super()._do_return_conn(record)
+        self._export_usage()
+
+    def _export_usage(self) -> None:
+        DB_POOL_CHECKED_OUT.set(self.checkedout())
+        DB_POOL_OVERFLOW.set(max(0, self.overflow()))
+
+
+def pool_limits() -> tuple[int, int]:
+    """
+    Split the cluster-wide connection budget between every gunicorn worker
+    of every replica, returns pool_size and max_overflow of one worker
+    """
+    workers = settings.WORKERS * settings.db_pool.replicas
+    per_worker = max(2, settings.db_pool.connection_budget // workers)
+    max_overflow = int(per_worker * settings.db_pool.overflow_share)
+    return per_worker - max_overflow, max_overflow
+
+
+def engine_options() -> dict:
+    pool_size, max_overflow = pool_limits()
+    DB_POOL_SIZE.set(pool_size)
+    options = {
+        "poolclass": TimedAsyncQueuePool,
+        "pool_size": pool_size,
+        "max_overflow": max_overflow,
+        "pool_timeout": settings.db_pool.timeout_seconds,
+        "pool_recycle": settings.db_pool.recycle_seconds,
+        "pool_pre_ping": True,
+        "query_cache_size": settings.db_pool.compiled_cache_size,
+        "connect_args": {
+            "prepared_statement_cache_size": (
+                settings.db_pool.prepared_statement_cache_size
+            ),
+        },
+    }
+    if settings.db_pool.pgbouncer:
+        # PgBouncer in transaction mode may run two statements of one session
+        # on different server connections, so named prepared statements
+        # must not be reused between them
+        options["connect_args"] = {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__",
+        }
+    return options
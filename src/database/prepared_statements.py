@@ -0,0 +1,84 @@
+import weakref
+from dataclasses import dataclass
+
+from sqlalchemy import event, util
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from src.utils.metrics import DB_PREPARED_STATEMENT_LOOKUPS, DB_PREPARED_STATEMENTS
+
+
+@dataclass
+class PreparedStatementStats:
+    hits: int = 0
+    misses: int = 0
+
+    @property
+    def statements(self) -> int:
+        return sum(len(cache) for cache in _caches)
+
+    @property
+    def capacity(self) -> int:
+        return sum(cache.capacity for cache in _caches)
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hit_rate, 4),
+            "statements": self.statements,
+            "capacity": self.capacity,
+        }
+
+
+prepared_statement_stats = PreparedStatementStats()
+_caches: weakref.WeakSet["CountingStatementCache"] = weakref.WeakSet()
+
+
+class CountingStatementCache(util.LRUCache):
+    """
+    Prepared statement cache of the asyncpg adapter of SQLAlchemy counting
+    its lookups, which the adapter does with an "in" check before reading
+    """
+
+    # Mappings are unhashable, the caches are tracked by identity
+    __hash__ = object.__hash__
+
+    def __contains__(self, operation: object) -> bool:
+        found = operation in self._data
+        if found:
+            prepared_statement_stats.hits += 1
+        else:
+            prepared_statement_stats.misses += 1
+        DB_PREPARED_STATEMENT_LOOKUPS.labels("hit" if found else "miss").inc()
+        return found
+
+    def __setitem__(self, operation: str, value: tuple) -> None:
+        super().__setitem__(operation, value)
+        DB_PREPARED_STATEMENTS.set(prepared_statement_stats.statements)
+
+
+def instrument_prepared_statements(engine: AsyncEngine) -> None:
+    event.listen(engine.sync_engine, "connect", _on_connect)
+    event.listen(engine.sync_engine, "close", _on_close)
+
+
+def _on_connect(dbapi_connection, connection_record) -> None:
+    # Left alone when prepared_statement_cache_size is 0 (PgBouncer)
+    cache = getattr(dbapi_connection, "_prepared_statement_cache", None)
+    if cache is None:
+        return
+    counting = CountingStatementCache(cache.capacity, cache.threshold)
+    dbapi_connection._prepared_statement_cache = counting
+    _caches.add(counting)
+
+
+def _on_close(dbapi_connection, connection_record) -> None:
+    cache = getattr(dbapi_connection, "_prepared_statement_cache", None)
+    if cache in _caches:
+        _caches.discard(cache)
+        DB_PREPARED_STATEMENTS.set(prepared_statement_stats.statements)
@@ -0,0 +1,103 @@
+import time
+from collections import Counter
+from collections.abc import Generator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+from loguru import logger
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from src.config import settings
+
+
+@dataclass
+class QueryStats:
+    label: str = ""
+    count: int = 0
+    rows: int = 0
+    duration: float = 0.0
+    statements: Counter[str] = field(default_factory=Counter)
+
+    def merge(self, other: "QueryStats") -> None:
+        self.count += other.count
+        self.rows += other.rows
+        self.duration += other.duration
+        self.statements.update(other.statements)
+
+
+current_query_stats: ContextVar[QueryStats | None] = ContextVar(
+    "current_query_stats", default=None
+)
+
+
+@contextmanager
+def track_queries(label: str = "") -> Generator[QueryStats, None, None]:
+    """
+    Collect the queries executed inside the block, they are also
+    added to the stats of the enclosing block if there is one
+    """
+    stats = QueryStats(label=label)
+    token = current_query_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        current_query_stats.reset(token)
+        parent = current_query_stats.get()
+        if parent is not None:
+            parent.merge(stats)
+
+
+@contextmanager
+def assert_max_queries(limit: int) -> Generator[QueryStats, None, None]:
+    """
+    Fail when the block executes more than limit queries, e.g.
+    with assert_max_queries(3):
+        await UserService().end_registration_by_referal_code(...)
+    """
+    with track_queries("assert_max_queries") as stats:
+        yield stats
+    if stats.count > limit:
+        statements = "\n".join(
+            f"{times} x {statement}" for statement, times in stats.statements.items()
+        )
+        raise AssertionError(
+            f"Expected at most {limit} queries, {stats.count} executed:\n{statements}"
+        )
+
+
+def instrument_query_stats(engine: AsyncEngine) -> None:
+    event.listen(engine.sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine.sync_engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context.query_started_at = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    duration = time.perf_counter() - context.query_started_at
+    if duration * 1000 >= settings.query_accounting.slow_query_ms:
+        logger.warning(f"Slow query took {duration * 1000:.1f} ms: {statement}")
+
+    stats = current_query_stats.get()
+    if stats is None:
+        return
+    stats.count += 1
+    stats.duration += duration
+    # asyncpg reports rowcount only for DML, rows of a SELECT are
+    # already buffered in the cursor when this event fires
+    if cursor.rowcount >= 0:
+        stats.rows += cursor.rowcount
+    else:
+        stats.rows += len(getattr(cursor, "_rows", ()))
+    stats.statements[statement] += 1
+    if (
+        stats.statements[statement]
+        == settings.query_accounting.repeated_statement_threshold
+    ):
+        logger.warning(
+            f"Possible N+1 in {stats.label or 'unknown context'}: statement executed "
+            f"{stats.statements[statement]} times: {statement}"
+        )
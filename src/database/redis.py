@@ -0,0 +1,138 @@
+import asyncio
+import time
+from collections.abc import Iterable, Iterator, Mapping, Sequence
+from itertools import islice
+from typing import TypeVar
+
+from fastapi_cache.backends.redis import RedisBackend
+from redis import asyncio as aioredis
+
+from src.config import settings
+from src.utils.tracing import span
+
+T = TypeVar("T")
+
+# The one pool of the worker. Values are returned as bytes, orjson,
+# pydantic and the fastapi-cache coders read them without a str copy
+redis_pool = aioredis.BlockingConnectionPool.from_url(
+    settings.REDIS_URL,
+    max_connections=settings.redis.max_connections,
+    timeout=settings.redis.pool_timeout_seconds,
+    socket_timeout=settings.redis.socket_timeout_seconds,
+    socket_connect_timeout=settings.redis.connect_timeout_seconds,
+    retry_on_timeout=settings.redis.retry_on_timeout,
+    health_check_interval=settings.redis.health_check_interval_seconds,
+    decode_responses=False,
+)
+redis_client = aioredis.Redis(connection_pool=redis_pool)
+
+
+async def warm_up_redis(connections: int) -> None:
+    """
+    Concurrent pings make the pool open a connection for each of them
+    """
+    await asyncio.gather(*(redis_client.ping() for _ in range(connections)))
+
+
+def _batches(items: Iterable[T]) -> Iterator[list[T]]:
+    iterator = iter(items)
+    while batch := list(islice(iterator, settings.redis.pipeline_chunk_size)):
+        yield batch
+
+
+async def get_many(keys: Sequence[str]) -> list[bytes | None]:
+    values = []
+    for batch in _batches(keys):
+        values.extend(await redis_client.mget(batch))
+    return values
+
+
+async def set_many(
+    items: Mapping[str, bytes | str | int],
+    ex: int | None = None,
+    nx: bool = False,
+) -> list[bool]:
+    """
+    SET every key in pipelined round trips, returns whether each was set
+    """
+    replies = []
+    for batch in _batches(items.items()):
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for key, value in batch:
+                pipe.set(key, value, ex=ex, nx=nx)
+            replies.extend(await pipe.execute())
+    return [bool(reply) for reply in replies]
+
+
+async def delete_many(keys: Iterable[str]) -> int:
+    deleted = 0
+    for batch in _batches(keys):
+        deleted += await redis_client.delete(*batch)
+    return deleted
+
+
+class LocalCache:
+    """
+    In-process copies of read-mostly Redis values, kept for
+    local_cache_ttl_seconds. Server-assisted invalidation (CLIENT TRACKING)
+    needs RESP3 push messages, which redis-py 4.6 does not speak, so a
+    change made on another worker is seen once the copy expires. Changes
+    made through this worker drop its copy right away
+    """
+
+    def __init__(self) -> None:
+        self.enabled = settings.redis.local_cache_enabled
+        self.ttl = settings.redis.local_cache_ttl_seconds
+        self.entries: dict[str, tuple[float, bytes]] = {}
+
+    async def get(self, key: str) -> bytes | None:
+        if not self.enabled:
+            return await redis_client.get(key)
+        now = time.monotonic()
+        entry = self.entries.get(key)
+        if entry is not None and entry[0] > now:
+            return entry[1]
+        value = await redis_client.get(key)
+        if value is None:
+            self.entries.pop(key, None)
+            return None
+        if len(self.entries) >= settings.redis.local_cache_max_keys:
+            self._evict(now)
+        self.entries[key] = (now + self.ttl, value)
+        return value
+
+    def invalidate(self, key: str) -> None:
+        self.entries.pop(key, None)
+
+    def _evict(self, now: float) -> None:
+        self.entries = {
+            key: entry for key, entry in self.entries.items() if entry[0] > now
+        }
+        # Still full of live copies, the oldest ones go first
+        while len(self.entries) >= settings.redis.local_cache_max_keys:
+            del self.entries[next(iter(self.entries))]
+
+
+local_cache = LocalCache()
+
+
+class TracedRedisBackend(RedisBackend):
+    """
+    fastapi-cache Redis backend reporting every cache call as a span
+    """
+
+    async def get_with_ttl(self, key: str):
+        with span("cache.get_with_ttl", key=key):
+            return await super().get_with_ttl(key)
+
+    async def get(self, key: str):
+        with span("cache.get", key=key):
+            return await super().get(key)
+
+    async def set(self, key: str, value, expire: int | None = None) -> None:
+        with span("cache.set", key=key):
+            return await super().set(key, value, expire)
+
+    async def clear(self, namespace: str | None = None, key: str | None = None) -> int:
+        with span("cache.clear"):
+            return await super().clear(namespace, key)
@@ -0,0 +1,269 @@
+"""
+Synthetic data for benchmarks, written with COPY instead of the services:
+
+    python -m src.generate_data --users 1000000 --codes 500000 --truncate
+
+Every user shares one bcrypt hash of --password. Referral chains are shaped
+by --shape: "power-law" picks referers by preferential attachment (users
+who already invited many people are the likeliest to invite the next one),
+"uniform" picks any earlier user and "flat" creates no referrals. A chain is
+never longer than --max-depth. Code expiry dates are relative to
+--reference-date, today by default. The same --seed and --reference-date
+generate the same rows, the password hash included.
+"""
+
+import argparse
+import asyncio
+import base64
+import random
+import time
+from collections.abc import Iterator
+from datetime import date, datetime, timedelta
+
+import asyncpg
+import bcrypt
+from loguru import logger
+
+from src.config import settings
+
+USER_COLUMNS = [
+    "id",
+    "first_name",
+    "last_name",
+    "email",
+    "registered_at",
+    "updated_at",
+    "password",
+    "is_active",
+    "referer_by",
+]
+CODE_COLUMNS = ["id", "code", "exp_date", "is_active", "user_id"]
+FIRST_CODE = 1000
+CODE_VALUES = 9000
+# bcrypt encodes its salt with its own base64 alphabet
+BCRYPT_BASE64 = bytes.maketrans(
+    b"ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/",
+    b"./ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789",
+)
+
+
+class ReferralTree:
+    """
+    Picks the referer of every new user, keeping track of chain depths
+    """
+
+    def __init__(
+        self, shape: str, root_share: float, max_depth: int, rng: random.Random
+    ) -> None:
+        self.shape = shape
+        self.root_share = root_share
+        self.max_depth = max_depth
+        self.rng = rng
+        self.depths: dict[int, int] = {}
+        # Every user once, plus once more per referral made
+        self.attachment_pool: list[int] = []
+
+    def add(self, user_id: int) -> int:
+        referer = self._pick_referer()
+        self.depths[user_id] = self.depths[referer] + 1 if referer else 0
+        if self.depths[user_id] < self.max_depth:
+            self.attachment_pool.append(user_id)
+            if referer and self.shape == "power-law":
+                self.attachment_pool.append(referer)
+        return referer
+
+    def _pick_referer(self) -> int:
+        if (
+            self.shape == "flat"
+            or not self.attachment_pool
+            or self.rng.random() < self.root_share
+        ):
+            return 0
+        # Users at max_depth never enter the pool
+        return self.rng.choice(self.attachment_pool)
+
+
+def seeded_salt(rng: random.Random) -> bytes:
+    """
+    bcrypt salt like bcrypt.gensalt() makes, from the seeded generator
+    instead of os.urandom
+    """
+    salt = base64.b64encode(rng.randbytes(16)).rstrip(b"=")
+    return b"$2b$12$" + salt.translate(BCRYPT_BASE64)
+
+
+def generate_users(
+    args: argparse.Namespace, first_id: int, password: bytes, rng: random.Random
+) -> Iterator[tuple]:
+    tree = ReferralTree(args.shape, args.root_share, args.max_depth, rng)
+    started_at = datetime.combine(args.start_date, datetime.min.time())
+    step = timedelta(days=args.days) / max(args.users, 1)
+    for user_id in range(first_id, first_id + args.users):
+        registered_at = started_at + step * (user_id - first_id)
+        yield (
+            user_id,
+            f"First{user_id}",
+            f"Last{user_id}",
+            f"user{user_id}@{args.email_domain}",
+            registered_at,
+            registered_at,
+            password,
+            rng.random() >= args.inactive_share,
+            tree.add(user_id),
+        )
+
+
+def generate_codes(
+    args: argparse.Namespace,
+    first_id: int,
+    first_user_id: int,
+    rng: random.Random,
+) -> Iterator[tuple]:
+    """
+    Codes expire evenly from --months-back months before the reference
+    date to --months-ahead months after it. Code values repeat every 9000
+    codes like reused codes do. A user has at most one live active code,
+    as the app keeps it
+    """
+    reference_date = args.reference_date
+    span = (args.months_back + args.months_ahead) * 30
+    active_users: set[int] = set()
+    for code_id in range(first_id, first_id + args.codes):
+        exp_date = (
+            reference_date
+            - timedelta(days=args.months_back * 30)
+            + timedelta(days=rng.randrange(span))
+        )
+        user_id = rng.randrange(first_user_id, first_user_id + args.users)
+        is_active = (
+            exp_date >= reference_date
+            and user_id not in active_users
+            and rng.random() < args.active_share
+        )
+        if is_active:
+            active_users.add(user_id)
+        yield (
+            code_id,
+            FIRST_CODE + (code_id - 1) % CODE_VALUES,
+            exp_date,
+            is_active,
+            user_id,
+        )
+
+
+def batched(rows: Iterator[tuple], size: int) -> Iterator[list[tuple]]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+async def copy_rows(
+    conn: asyncpg.Connection,
+    table: str,
+    columns: list[str],
+    rows: Iterator[tuple],
+    batch_size: int,
+) -> int:
+    copied = 0
+    for batch in batched(rows, batch_size):
+        await conn.copy_records_to_table(table, records=batch, columns=columns)
+        copied += len(batch)
+        logger.info(f"{table}: {copied} rows copied")
+    return copied
+
+
+async def generate(args: argparse.Namespace) -> None:
+    rng = random.Random(args.seed)
+    password = bcrypt.hashpw(args.password.encode(), seeded_salt(rng))
+    logger.info(f"Seed {args.seed}, reference date {args.reference_date}")
+    conn = await asyncpg.connect(
+        args.dsn or settings.DB_URL.replace("postgresql+asyncpg", "postgresql")
+    )
+    started_at = time.perf_counter()
+    try:
+        async with conn.transaction():
+            if args.truncate:
+                await conn.execute(
+                    "TRUNCATE user_table, referal_code_table RESTART IDENTITY CASCADE"
+                )
+            first_user_id = 1 + await conn.fetchval(
+                "SELECT coalesce(max(id), 0) FROM user_table"
+            )
+            first_code_id = 1 + await conn.fetchval(
+                "SELECT coalesce(max(id), 0) FROM referal_code_table"
+            )
+            # Monthly partitions for the whole exp_date range, otherwise
+            # the codes would all land in the default partition
+            await conn.execute(
+                "SELECT referal_code_create_partition(month_start::date) "
+                "FROM generate_series("
+                "date_trunc('month', $3::date) - make_interval(months => $1), "
+                "date_trunc('month', $3::date) + make_interval(months => $2), "
+                "interval '1 month') AS month_start",
+                args.months_back + 1,
+                args.months_ahead + 1,
+                args.reference_date,
+            )
+            await copy_rows(
+                conn,
+                "user_table",
+                USER_COLUMNS,
+                generate_users(args, first_user_id, password, rng),
+                args.batch_size,
+            )
+            await copy_rows(
+                conn,
+                "referal_code_table",
+                CODE_COLUMNS,
+                generate_codes(args, first_code_id, first_user_id, rng),
+                args.batch_size,
+            )
+            for table in ("user_table", "referal_code_table"):
+                await conn.execute(
+                    f"SELECT setval('{table}_id_seq', "
+                    f"(SELECT coalesce(max(id), 0) + 1 FROM {table}), false)"
+                )
+        await conn.execute("ANALYZE user_table")
+        await conn.execute("ANALYZE referal_code_table")
+    finally:
+        await conn.close()
+    logger.info(
+        f"Generated {args.users} users and {args.codes} referal codes "
+        f"in {time.perf_counter() - started_at:.1f} s"
+    )
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Synthetic data generator")
+    parser.add_argument("--dsn", default=None)
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--codes", type=int, default=500_000)
+    parser.add_argument(
+        "--shape", choices=["power-law", "uniform", "flat"], default="power-law"
+    )
+    parser.add_argument("--root-share", type=float, default=0.1)
+    parser.add_argument("--max-depth", type=int, default=8)
+    parser.add_argument("--inactive-share", type=float, default=0.02)
+    parser.add_argument("--active-share", type=float, default=0.0)
+    parser.add_argument("--months-back", type=int, default=12)
+    parser.add_argument("--months-ahead", type=int, default=3)
+    parser.add_argument("--start-date", type=date.fromisoformat, default="2024-01-01")
+    parser.add_argument(
+        "--reference-date", type=date.fromisoformat, default=date.today()
+    )
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--email-domain", default="example.com")
+    parser.add_argument("--password", default="password")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--batch-size", type=int, default=50_000)
+    parser.add_argument("--truncate", action="store_true")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    asyncio.run(generate(parse_args()))
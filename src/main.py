@@ -1,3 +1,5 @@
+import asyncio
+import contextlib
 import os
 from collections.abc import AsyncGenerator
 from contextlib import asynccontextmanager
@@ -6,30 +8,95 @@ from dotenv import find_dotenv, load_dotenv
 from fastapi import FastAPI
 from fastapi.responses import ORJSONResponse
 from fastapi_cache import FastAPICache
-from fastapi_cache.backends.redis import RedisBackend
 from loguru import logger
-from redis import asyncio as aioredis
+from starlette.concurrency import run_in_threadpool
 
 from metadata import DESCRIPTION, TAG_METADATA, TITLE, VERSION
 from src.api import router
 from src.api.referal_codes.v1.routers import rc_router
+from src.api.users.v1.auth.utils import jwt_signing_key, jwt_verification_key
 from src.api.users.v1.routers import auth_router, user_router
 from src.config import settings
+from src.database.db import async_engine, warm_up_pool
+from src.database.partitions import run_partition_maintenance
+from src.database.redis import TracedRedisBackend, redis_client, warm_up_redis
+from src.middlewares import (
+    AdmissionControlMiddleware,
+    CompressionMiddleware,
+    IdempotencyMiddleware,
+    ProfilingMiddleware,
+    PrometheusMiddleware,
+    ServerTimingMiddleware,
+    TracingMiddleware,
+)
+from src.utils.cache import ResponseCoder, request_key_builder
+from src.utils.health import health_prober
+from src.utils.lifecycle import background_work, lifecycle_state
+from src.utils.tracing import setup_tracing, shutdown_tracing
+from src.workers.email_task import warm_up_email_template
+from src.workers.smtp import smtp_batch_session, smtp_session
+
+
+async def warm_up() -> None:
+    """
+    Open the DB and Redis connections and load what the first requests
+    would otherwise load. A failure is logged, the health prober
+    reports the unavailable service
+    """
+    jwt_signing_key()
+    jwt_verification_key()
+    warm_up_email_template()
+    results = await asyncio.gather(
+        asyncio.wait_for(
+            warm_up_pool(settings.lifecycle.warmup_db_connections),
+            settings.lifecycle.warmup_timeout_seconds,
+        ),
+        asyncio.wait_for(
+            warm_up_redis(settings.lifecycle.warmup_redis_connections),
+            settings.lifecycle.warmup_timeout_seconds,
+        ),
+        return_exceptions=True,
+    )
+    for service, result in zip(("postgres", "redis"), results):
+        if isinstance(result, BaseException):
+            logger.error(f"Warm-up of {service} failed with error: {result!r}")
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI) -> AsyncGenerator:
+    setup_tracing()
     logger.info("Start redis cache")
-    redis = aioredis.from_url(
-        f"redis://{settings.REDIS_HOST}:{settings.REDIS_PORT}",
-        encoding="utf-8",
-        decode_responses=True,
+    FastAPICache.init(
+        TracedRedisBackend(redis_client),
+        prefix=settings.response_cache.prefix,
+        expire=settings.response_cache.expire_seconds,
+        coder=ResponseCoder,
+        key_builder=request_key_builder,
     )
-    FastAPICache.init(RedisBackend(redis), prefix="fastapi-cache")
+    await warm_up()
+    await health_prober.probe()
+    background_loops = [
+        asyncio.create_task(run_partition_maintenance()),
+        asyncio.create_task(health_prober.run()),
+    ]
+    lifecycle_state.started = True
 
     yield
-    await redis.close()
+    lifecycle_state.shutting_down = True
+    for task in background_loops:
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+    await background_work.drain(
+        settings.lifecycle.drain_timeout_seconds,
+        settings.lifecycle.stop_timeout_seconds,
+    )
+    await run_in_threadpool(smtp_session.close)
+    await run_in_threadpool(smtp_batch_session.close)
+    await async_engine.dispose()
+    await redis_client.close(close_connection_pool=True)
     logger.info("Shutdown redis cache")
+    shutdown_tracing()
 
 
 def create_fastapi_app():
@@ -56,6 +123,18 @@ def create_fastapi_app():
             docs_url=None,
             redoc_url=None,
         )
+    _app.add_middleware(IdempotencyMiddleware)
+    # Outside of the idempotency replays, they store the uncompressed body
+    if settings.compression.enabled:
+        _app.add_middleware(CompressionMiddleware)
+    if settings.profiling.enabled:
+        _app.add_middleware(ProfilingMiddleware)
+    if settings.query_accounting.server_timing:
+        _app.add_middleware(ServerTimingMiddleware)
+    _app.add_middleware(AdmissionControlMiddleware)
+    _app.add_middleware(PrometheusMiddleware)
+    if settings.tracing.enabled:
+        _app.add_middleware(TracingMiddleware)
     _app.include_router(router=router, prefix="/api")
     _app.include_router(router=user_router, prefix="/api")
     _app.include_router(router=rc_router, prefix="/api")
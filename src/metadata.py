@@ -27,4 +27,6 @@ VERSION = "0.0.1"
 ERROR_MAPS = {
     "postgres": "PostgreSQL connection failed",
     "redis": "Redis connection failed",
+    "smtp": "SMTP server is unreachable",
+    "pool": "Database connection pool is saturated",
 }
@@ -0,0 +1,17 @@
+__all__ = [
+    "AdmissionControlMiddleware",
+    "CompressionMiddleware",
+    "IdempotencyMiddleware",
+    "ProfilingMiddleware",
+    "PrometheusMiddleware",
+    "ServerTimingMiddleware",
+    "TracingMiddleware",
+]
+
+from src.middlewares.admission import AdmissionControlMiddleware
+from src.middlewares.compression import CompressionMiddleware
+from src.middlewares.idempotency import IdempotencyMiddleware
+from src.middlewares.metrics import PrometheusMiddleware
+from src.middlewares.profiling import ProfilingMiddleware
+from src.middlewares.server_timing import ServerTimingMiddleware
+from src.middlewares.tracing import TracingMiddleware
@@ -0,0 +1,237 @@
+import asyncio
+import bisect
+import itertools
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+
+from fastapi import status
+from sqlalchemy import event
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from src.config import settings
+from src.database.db import async_engine
+from src.database.pool import pool_limits
+from src.utils.metrics import (
+    ADMISSION_IN_FLIGHT,
+    ADMISSION_LIMIT,
+    ADMISSION_QUEUE_DEPTH,
+    ADMISSION_SHED,
+)
+
+HEALTH = "health"
+AUTH = "auth"
+READS = "reads"
+BULK = "bulk"
+
+PRIORITY_RANKS = {AUTH: 0, READS: 1, BULK: 2}
+
+
+class AdaptiveLimit:
+    """
+    AIMD concurrency limit driven by the observed DB query latency,
+    including the wait for a pool connection: grows by one every interval
+    while the latency is under the target and is multiplied by the
+    decrease factor when it goes above. It never goes over the pool
+    connections of the worker
+    """
+
+    def __init__(self) -> None:
+        self.max_limit = min(settings.admission.max_limit, sum(pool_limits()))
+        self.min_limit = min(settings.admission.min_limit, self.max_limit)
+        self.value = float(min(settings.admission.initial_limit, self.max_limit))
+        self.samples = 0
+        self.total_latency = 0.0
+        self.window_started_at = time.monotonic()
+        ADMISSION_LIMIT.set(self.value)
+
+    def __int__(self) -> int:
+        return int(self.value)
+
+    def observe(self, latency: float) -> bool:
+        """
+        Record a query latency, returns True when the limit has grown
+        """
+        self.samples += 1
+        self.total_latency += latency
+        now = time.monotonic()
+        if now - self.window_started_at < settings.admission.adjust_interval_seconds:
+            return False
+
+        average_ms = self.total_latency / self.samples * 1000
+        previous = int(self.value)
+        if average_ms > settings.admission.target_db_latency_ms:
+            self.value = max(
+                self.min_limit, self.value * settings.admission.decrease_factor
+            )
+        else:
+            self.value = min(self.max_limit, self.value + 1)
+        self.samples = 0
+        self.total_latency = 0.0
+        self.window_started_at = now
+        ADMISSION_LIMIT.set(self.value)
+        return int(self.value) > previous
+
+
+@dataclass(order=True)
+class Waiter:
+    rank: int
+    seq: int
+    priority: str = field(compare=False)
+    route: str = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+
+
+class AdmissionController:
+    def __init__(self) -> None:
+        self.limit = AdaptiveLimit()
+        self.in_flight = 0
+        self.route_in_flight: Counter[str] = Counter()
+        self.waiters: list[Waiter] = []
+        self.seq = itertools.count()
+
+    async def acquire(self, priority: str, route: str) -> bool:
+        if self._can_admit(priority, route) and not self._outranked(priority):
+            self._admit(priority, route)
+            return True
+
+        waiter = Waiter(
+            rank=PRIORITY_RANKS[priority],
+            seq=next(self.seq),
+            priority=priority,
+            route=route,
+            future=asyncio.get_running_loop().create_future(),
+        )
+        bisect.insort(self.waiters, waiter)
+        ADMISSION_QUEUE_DEPTH.labels(priority).inc()
+        timeout = settings.admission.queue_timeouts_ms[priority] / 1000
+        try:
+            done, _ = await asyncio.wait({waiter.future}, timeout=timeout)
+        except asyncio.CancelledError:
+            if waiter.future.done():
+                self.release(priority, route)
+            else:
+                self.waiters.remove(waiter)
+                ADMISSION_QUEUE_DEPTH.labels(priority).dec()
+            raise
+        if done:
+            return True
+
+        self.waiters.remove(waiter)
+        ADMISSION_QUEUE_DEPTH.labels(priority).dec()
+        ADMISSION_SHED.labels(priority).inc()
+        return False
+
+    def release(self, priority: str, route: str) -> None:
+        self.in_flight -= 1
+        self.route_in_flight[route] -= 1
+        ADMISSION_IN_FLIGHT.labels(priority).dec()
+        self.wake()
+
+    def wake(self) -> None:
+        for waiter in list(self.waiters):
+            if self.in_flight >= int(self.limit):
+                break
+            if self._can_admit(waiter.priority, waiter.route):
+                self.waiters.remove(waiter)
+                ADMISSION_QUEUE_DEPTH.labels(waiter.priority).dec()
+                self._admit(waiter.priority, waiter.route)
+                waiter.future.set_result(True)
+
+    def observe_db_latency(self, latency: float) -> None:
+        if self.limit.observe(latency):
+            self.wake()
+
+    def _can_admit(self, priority: str, route: str) -> bool:
+        share = settings.admission.priority_shares[priority]
+        priority_limit = max(1, int(int(self.limit) * share))
+        return self.in_flight < priority_limit and not self._route_full(route)
+
+    def _route_full(self, route: str) -> bool:
+        route_limit = settings.admission.route_limits.get(route)
+        return route_limit is not None and self.route_in_flight[route] >= route_limit
+
+    def _outranked(self, priority: str) -> bool:
+        # A waiter held back only by the cap of its own route would not take
+        # a free slot, it does not keep the requests of other routes waiting
+        rank = PRIORITY_RANKS[priority]
+        for waiter in self.waiters:
+            if waiter.rank > rank:
+                return False
+            if not self._route_full(waiter.route):
+                return True
+        return False
+
+    def _admit(self, priority: str, route: str) -> None:
+        self.in_flight += 1
+        self.route_in_flight[route] += 1
+        ADMISSION_IN_FLIGHT.labels(priority).inc()
+
+
+class AdmissionControlMiddleware:
+    """
+    Sheds load with an immediate 503 instead of letting every request
+    queue on the DB pool when Postgres slows down. Health checks are
+    never queued, the other requests are admitted by the priority class
+    of their route: auth > reads > bulk
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+        self.controller = AdmissionController()
+        self.health_paths = frozenset(settings.admission.health_paths)
+        event.listen(
+            async_engine.sync_engine, "before_cursor_execute", _start_query_timer
+        )
+        event.listen(
+            async_engine.sync_engine, "after_cursor_execute", self._observe_query
+        )
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        priority = self._classify(scope)
+        if priority == HEALTH:
+            await self.app(scope, receive, send)
+            return
+
+        route = scope["path"]
+        if not await self.controller.acquire(priority, route):
+            response = JSONResponse(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                content={"detail": "Service is overloaded, please retry later"},
+                headers={"Retry-After": "1"},
+            )
+            await response(scope, receive, send)
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(priority, route)
+
+    def _classify(self, scope: Scope) -> str:
+        path = scope["path"]
+        if path in self.health_paths:
+            return HEALTH
+        priority = settings.admission.route_priorities.get(path)
+        if priority is not None:
+            return priority
+        if path.startswith(settings.admission.auth_prefix):
+            return AUTH
+        return READS
+
+    def _observe_query(self, conn, cursor, statement, parameters, context, executemany):
+        started_at = conn.info["query_started_at"].pop()
+        # The wait for the connection counts once, with the first query
+        checkout_wait = conn.info.pop("checkout_wait", 0.0)
+        self.controller.observe_db_latency(
+            time.perf_counter() - started_at + checkout_wait
+        )
+
+
+def _start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started_at", []).append(time.perf_counter())
@@ -0,0 +1,106 @@
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.config import settings
+from src.utils.compression import StreamCompressor, compress_body, negotiate
+
+
+class CompressionMiddleware:
+    """
+    Compresses the response bodies of the allowed content types with the
+    Content-Encoding the client prefers. A body sent in one message is
+    compressed whole when it is at least minimum_size_bytes long, a
+    streamed body chunk by chunk. A response already encoded, such as a
+    cached one sent precompressed, is passed through
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+        self.content_types = frozenset(settings.compression.content_types)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        await self.app(
+            scope, receive, CompressingSend(send, encoding, self.content_types)
+        )
+
+
+class CompressingSend:
+    """
+    send of one response, holds its start message back until the first
+    body message tells whether and how the body is compressed
+    """
+
+    def __init__(self, send: Send, encoding: str, content_types: frozenset) -> None:
+        self.send = send
+        self.encoding = encoding
+        self.content_types = content_types
+        self.start: Message | None = None
+        self.compressor: StreamCompressor | None = None
+        self.passthrough = False
+
+    async def __call__(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            if self._compressible(message):
+                self.start = message
+            else:
+                self.passthrough = True
+                await self.send(message)
+            return
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.compressor is None:
+            if not more_body:
+                await self._send_whole(body)
+                return
+            # Streamed, the length of the compressed body is not known
+            self.compressor = StreamCompressor(self.encoding)
+            headers = self._encoded_headers()
+            del headers["Content-Length"]
+            await self.send(self.start)
+
+        chunk = await self.compressor.compress_chunk(body)
+        if not more_body:
+            chunk += self.compressor.finish()
+        await self.send(
+            {"type": "http.response.body", "body": chunk, "more_body": more_body}
+        )
+
+    async def _send_whole(self, body: bytes) -> None:
+        if len(body) >= settings.compression.minimum_size_bytes:
+            body = await compress_body(self.encoding, body)
+            self._encoded_headers()["Content-Length"] = str(len(body))
+        await self.send(self.start)
+        await self.send({"type": "http.response.body", "body": body})
+
+    def _compressible(self, message: Message) -> bool:
+        headers = Headers(raw=message["headers"])
+        media_type = headers.get("content-type", "").partition(";")[0].strip()
+        return (
+            "content-encoding" not in headers
+            and media_type in self.content_types
+            and message["status"] not in (204, 304)
+        )
+
+    def _encoded_headers(self) -> MutableHeaders:
+        headers = MutableHeaders(scope=self.start)
+        headers["Content-Encoding"] = self.encoding
+        vary = {name.strip().lower() for name in headers.get("vary", "").split(",")}
+        if "accept-encoding" not in vary:
+            headers.add_vary_header("Accept-Encoding")
+        # The encoded body is not the same bytes, only a weak ETag still holds
+        etag = headers.get("etag")
+        if etag and not etag.startswith("W/"):
+            headers["ETag"] = f"W/{etag}"
+        return headers
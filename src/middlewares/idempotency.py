@@ -0,0 +1,204 @@
+import asyncio
+import base64
+import hashlib
+
+import orjson
+from fastapi import status
+from loguru import logger
+from redis.exceptions import RedisError
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse, Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.config import settings
+from src.database.redis import redis_client
+
+
+class IdempotencyMiddleware:
+    """
+    Replays the first response of POST requests carrying an Idempotency-Key header.
+    The response is stored in Redis, duplicates arriving while the first request
+    is still processed wait for its result instead of running the endpoint again
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+        self.paths = frozenset(settings.idempotency.paths)
+        self.in_flight: dict[str, asyncio.Event] = {}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if (
+            scope["type"] != "http"
+            or scope["method"] != "POST"
+            or scope["path"] not in self.paths
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        idempotency_key = headers.get(settings.idempotency.header)
+        if not idempotency_key:
+            await self.app(scope, receive, send)
+            return
+
+        body = await self._read_body(receive)
+        key = self._storage_key(scope, headers, idempotency_key)
+        fingerprint = hashlib.sha256(scope["query_string"] + b"?" + body).hexdigest()
+        receive = self._replay_body(body, receive)
+
+        try:
+            response = await self._wait_for_response(key, fingerprint)
+        except RedisError as ex:
+            logger.warning(f"Idempotency storage failed with error: {ex}")
+            await self.app(scope, receive, send)
+            return
+
+        if response is None:
+            await self._process(key, fingerprint, scope, receive, send)
+        else:
+            await response(scope, receive, send)
+
+    async def _wait_for_response(self, key: str, fingerprint: str) -> Response | None:
+        """
+        Returns None when this request owns the key and has to be processed
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings.idempotency.wait_timeout_seconds
+        in_flight_record = orjson.dumps({"fingerprint": fingerprint, "status": None})
+        while True:
+            if await redis_client.set(
+                key,
+                in_flight_record,
+                nx=True,
+                ex=settings.idempotency.lock_ttl_seconds,
+            ):
+                return None
+
+            record = await redis_client.get(key)
+            if record is None:
+                continue
+            record = orjson.loads(record)
+            if record["fingerprint"] != fingerprint:
+                return JSONResponse(
+                    status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    content={
+                        "detail": "Idempotency-Key is already used for another request"
+                    },
+                )
+            if record["status"] is not None:
+                return Response(
+                    content=base64.b64decode(record["body"]),
+                    status_code=record["status"],
+                    headers={**dict(record["headers"]), "Idempotent-Replayed": "true"},
+                )
+
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return JSONResponse(
+                    status_code=status.HTTP_409_CONFLICT,
+                    content={
+                        "detail": "A request with this Idempotency-Key is in progress"
+                    },
+                    headers={"Retry-After": "1"},
+                )
+            await self._wait_in_flight(key, remaining)
+
+    async def _wait_in_flight(self, key: str, timeout: float) -> None:
+        # Duplicates handled by the same worker are woken up by the owner,
+        # the ones from other workers poll Redis
+        if event := self.in_flight.get(key):
+            try:
+                await asyncio.wait_for(event.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+        else:
+            await asyncio.sleep(
+                min(settings.idempotency.poll_interval_seconds, timeout)
+            )
+
+    async def _process(
+        self, key: str, fingerprint: str, scope: Scope, receive: Receive, send: Send
+    ) -> None:
+        event = self.in_flight[key] = asyncio.Event()
+        response_start: Message = {}
+        response_body: list[bytes] = []
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                response_start.update(message)
+            elif message["type"] == "http.response.body":
+                response_body.append(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except BaseException:
+            await self._release(key)
+            raise
+        else:
+            if response_start and response_start["status"] < 500:
+                await self._store(key, fingerprint, response_start, response_body)
+            else:
+                await self._release(key)
+        finally:
+            del self.in_flight[key]
+            event.set()
+
+    @staticmethod
+    async def _store(
+        key: str, fingerprint: str, response_start: Message, response_body: list[bytes]
+    ) -> None:
+        record = {
+            "fingerprint": fingerprint,
+            "status": response_start["status"],
+            "headers": [
+                (name.decode("latin-1"), value.decode("latin-1"))
+                for name, value in response_start.get("headers", [])
+            ],
+            "body": base64.b64encode(b"".join(response_body)).decode(),
+        }
+        try:
+            await redis_client.set(
+                key, orjson.dumps(record), ex=settings.idempotency.ttl_seconds
+            )
+        except RedisError as ex:
+            logger.warning(f"Idempotency storage failed with error: {ex}")
+
+    @staticmethod
+    async def _release(key: str) -> None:
+        try:
+            await redis_client.delete(key)
+        except RedisError as ex:
+            logger.warning(f"Idempotency storage failed with error: {ex}")
+
+    @staticmethod
+    def _storage_key(scope: Scope, headers: Headers, idempotency_key: str) -> str:
+        # Keys are scoped by the caller credentials, so different users
+        # can't read each other responses by reusing the same key
+        owner = hashlib.sha256(
+            f"{headers.get('authorization', '')}:{idempotency_key}".encode()
+        ).hexdigest()
+        return f"{settings.idempotency.prefix}:{scope['path']}:{owner}"
+
+    @staticmethod
+    async def _read_body(receive: Receive) -> bytes:
+        chunks = []
+        more_body = True
+        while more_body:
+            message = await receive()
+            chunks.append(message.get("body", b""))
+            more_body = message.get("more_body", False)
+        return b"".join(chunks)
+
+    @staticmethod
+    def _replay_body(body: bytes, receive: Receive) -> Receive:
+        body_sent = False
+
+        async def receive_wrapper() -> Message:
+            nonlocal body_sent
+            if body_sent:
+                return await receive()
+            body_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        return receive_wrapper
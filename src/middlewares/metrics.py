@@ -0,0 +1,48 @@
+import time
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.utils.metrics import CACHE_REQUESTS, HTTP_REQUEST_DURATION, HTTP_RESPONSES
+
+CACHE_HEADER = b"x-fastapi-cache"
+
+
+class PrometheusMiddleware:
+    """
+    Records latency and status of every request labelled by the route
+    template, so that path parameters do not blow up label cardinality
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        cache_result = None
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code, cache_result
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                for name, value in message.get("headers", ()):
+                    if name.lower() == CACHE_HEADER:
+                        cache_result = value.decode("latin-1").lower()
+            await send(message)
+
+        started_at = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            template = route.path if route is not None else "unmatched"
+            method = scope["method"]
+            HTTP_REQUEST_DURATION.labels(method, template).observe(
+                time.perf_counter() - started_at
+            )
+            HTTP_RESPONSES.labels(method, template, str(status_code)).inc()
+            if cache_result is not None:
+                CACHE_REQUESTS.labels(template, cache_result).inc()
@@ -0,0 +1,82 @@
+import random
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.config import settings
+from src.database.query_stats import QueryStats, track_queries
+from src.utils.profiling import (
+    WORKER_PROFILE_PATH,
+    SessionProfiler,
+    is_authorised,
+    profiler_lock,
+    store_report,
+)
+
+
+class ProfilingMiddleware:
+    """
+    Profiles requests carrying the profiling token or picked by sample_rate,
+    the report is stored with the SQL stats of the request and its id is
+    returned in the X-Profile-Id header. Only added when profiling is enabled
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if (
+            scope["type"] != "http"
+            or profiler_lock.locked()
+            or not self._should_profile(scope)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        async with profiler_lock:
+            with track_queries(f"{scope['method']} {scope['path']}") as stats:
+                await self._profile(scope, receive, send, stats)
+
+    async def _profile(
+        self, scope: Scope, receive: Receive, send: Send, stats: QueryStats
+    ) -> None:
+        profiler = SessionProfiler()
+        profile_id = None
+        response_start = None
+
+        async def finish() -> str:
+            profiler.stop()
+            profile_id, _, _ = await store_report(profiler, stats.label, stats)
+            return profile_id
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal profile_id, response_start
+            if message["type"] == "http.response.start":
+                # Held back until the last body chunk, so that the
+                # report id can still be added to the headers
+                response_start = message
+                return
+            if response_start is not None:
+                if not message.get("more_body", False):
+                    profile_id = await finish()
+                    headers = MutableHeaders(scope=response_start)
+                    headers.append("X-Profile-Id", profile_id)
+                await send(response_start)
+                response_start = None
+            await send(message)
+
+        profiler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if profile_id is None:
+                await finish()
+
+    @staticmethod
+    def _should_profile(scope: Scope) -> bool:
+        if scope["path"].endswith(WORKER_PROFILE_PATH):
+            return False
+        token = Headers(scope=scope).get(settings.profiling.header)
+        if is_authorised(token):
+            return True
+        return random.random() < settings.profiling.sample_rate
@@ -0,0 +1,42 @@
+import time
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.database.query_stats import QueryStats, track_queries
+
+
+class ServerTimingMiddleware:
+    """
+    Counts the SQL queries, rows and DB time of every request
+    and reports them in the Server-Timing response header
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started_at = time.perf_counter()
+        with track_queries(f"{scope['method']} {scope['path']}") as stats:
+
+            async def send_wrapper(message: Message) -> None:
+                if message["type"] == "http.response.start":
+                    headers = MutableHeaders(scope=message)
+                    headers.append("Server-Timing", server_timing(stats, started_at))
+                await send(message)
+
+            await self.app(scope, receive, send_wrapper)
+
+
+def server_timing(stats: QueryStats, started_at: float) -> str:
+    total_ms = (time.perf_counter() - started_at) * 1000
+    return (
+        f"db;dur={stats.duration * 1000:.2f}, "
+        f'db-queries;desc="{stats.count}", '
+        f'db-rows;desc="{stats.rows}", '
+        f"app;dur={total_ms:.2f}"
+    )
@@ -1,11 +1,10 @@
 from datetime import datetime
 from typing import TYPE_CHECKING
 
-from sqlalchemy import Boolean, Date, ForeignKey
+from sqlalchemy import Boolean, Date, ForeignKey, Index, Integer, text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from src.models.base_model import BaseModel
-from src.models.mixins.custom_types import integer_pk
 from src.schemas.referal_code_schema import ReferalCodeDB
 
 if TYPE_CHECKING:
@@ -14,10 +13,22 @@ if TYPE_CHECKING:
 
 class ReferalCodeModel(BaseModel):
     __tablename__ = "referal_code_table"
+    # Monthly range partitions by exp_date, the partition key has to be a part of the PK
+    __table_args__ = (
+        Index("ix_referal_code_table_user_id_is_active", "user_id", "is_active"),
+        Index(
+            "ix_referal_code_table_active_exp_date",
+            "exp_date",
+            postgresql_where=text("is_active"),
+        ),
+        {"postgresql_partition_by": "RANGE (exp_date)"},
+    )
 
-    id: Mapped[integer_pk]
-    code: Mapped[int] = mapped_column(nullable=False)
-    exp_date: Mapped[datetime.date] = mapped_column(Date, nullable=False)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    code: Mapped[int] = mapped_column(nullable=False, index=True)
+    exp_date: Mapped[datetime.date] = mapped_column(
+        Date, primary_key=True, nullable=False
+    )
     is_active: Mapped[bool] = mapped_column(Boolean, default=False)
     user_id: Mapped[int] = mapped_column(
         ForeignKey("user_table.id", ondelete="CASCADE")
@@ -25,4 +36,4 @@ class ReferalCodeModel(BaseModel):
     user: Mapped["User"] = relationship(back_populates="referal_codes")
 
     def to_pydantic_schema(self) -> ReferalCodeDB:
-        return ReferalCodeDB(**self.__dict__)
+        return ReferalCodeDB.model_validate(self.__dict__)
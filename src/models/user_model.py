@@ -1,6 +1,6 @@
 from typing import TYPE_CHECKING
 
-from sqlalchemy import String
+from sqlalchemy import Index, String
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy_utils import EmailType
 
@@ -14,6 +14,10 @@ if TYPE_CHECKING:
 
 class User(BaseModel):
     __tablename__ = "user_table"
+    __table_args__ = (
+        # Also gives the count and last updated_at of the referals of a referer
+        Index("ix_user_table_referer_by_updated_at", "referer_by", "updated_at"),
+    )
 
     id: Mapped[integer_pk]
     first_name: Mapped[str] = mapped_column(String(30))
@@ -29,4 +33,4 @@ class User(BaseModel):
     )
 
     def to_pydantic_schema(self) -> UserDB:
-        return UserDB(**self.__dict__)
+        return UserDB.model_validate(self.__dict__)
@@ -1,4 +1,6 @@
-from sqlalchemy import Result, select, update
+from datetime import date
+
+from sqlalchemy import Result, exists, select, update
 
 from src.models import ReferalCodeModel
 from src.utils.repository import SQLAlchemyRepository
@@ -8,18 +10,40 @@ class ReferalCodeRepository(SQLAlchemyRepository):
 
     model = ReferalCodeModel
 
-    async def get_one_active_code(self):
-        subq = select(self.model).where(self.model.is_active == True).exists()
-        query = select(self.model).where(subq)
+    async def get_live_by_query_one_or_none(self, **kwargs) -> type(model) | None:
+        query = (
+            select(self.model)
+            .filter_by(**kwargs)
+            .filter(self.model.exp_date >= date.today())
+        )
+        result: Result = await self.session.execute(query)
+        return result.unique().scalar_one_or_none()
+
+    async def has_active_code(self, user_id: int) -> bool:
+        """
+        Whether the user has a live active referal code, the EXISTS stops
+        at the first row found by the (user_id, is_active) index
+        """
+        query = select(
+            exists().where(
+                self.model.user_id == user_id,
+                self.model.is_active == True,
+                self.model.exp_date >= date.today(),
+            )
+        )
         result: Result = await self.session.execute(query)
-        return result.scalars().all()
+        return result.scalar_one()
 
     async def update_one_by_code(
         self, ref_code: int, _user_id: int, **kwargs
     ) -> type(model) | None:
         query = (
             update(self.model)
-            .filter(self.model.code == ref_code, self.model.user_id == _user_id)
+            .filter(
+                self.model.code == ref_code,
+                self.model.user_id == _user_id,
+                self.model.exp_date >= date.today(),
+            )
             .values(**kwargs)
             .returning(self.model)
         )
@@ -1,11 +1,14 @@
 from collections.abc import Sequence
+from datetime import date
 from typing import Any
 
 from pydantic import EmailStr
-from sqlalchemy import Result, select, update
+from sqlalchemy import Result, Row, func, literal, select, true
+from sqlalchemy.dialects.postgresql import insert
 
-from src.models import User
+from src.models import ReferalCodeModel, User
 from src.utils.repository import SQLAlchemyRepository
+from src.utils.statements import filter_params, update_statement, value_params
 
 
 class UserRepository(SQLAlchemyRepository):
@@ -18,14 +21,84 @@ class UserRepository(SQLAlchemyRepository):
         result: Result = await self.session.execute(query)
         return result.scalars().all()
 
+    async def get_referals_version(self, referer_id: int) -> Row:
+        """
+        Count and last updated_at of the referals of the referer,
+        read from the (referer_by, updated_at) index
+        """
+        query = select(
+            func.count().label("count"),
+            func.max(self.model.updated_at).label("updated_at"),
+        ).where(self.model.referer_by == referer_id)
+        result: Result = await self.session.execute(query)
+        return result.one()
+
     async def update_one_by_email(
         self, _email: EmailStr, **kwargs: Any
     ) -> type(model) | None:
+        query = update_statement(self.model, ("email",), tuple(sorted(kwargs)))
+        obj: Result | None = await self.session.execute(
+            query, {**filter_params({"email": _email}), **value_params(kwargs)}
+        )
+        return obj.scalar_one_or_none()
+
+    async def add_one_or_none(self, **kwargs: Any) -> type(model) | None:
+        """
+        Insert user, returns None when the email is already taken
+        """
         query = (
-            update(self.model)
-            .filter(self.model.email == _email)
+            insert(self.model)
             .values(**kwargs)
+            .on_conflict_do_nothing(index_elements=[self.model.email])
             .returning(self.model)
         )
-        obj: Result | None = await self.session.execute(query)
+        obj: Result = await self.session.execute(query)
         return obj.scalar_one_or_none()
+
+    async def add_one_by_referal_code(
+        self, referal_code: int, **kwargs: Any
+    ) -> Row | None:
+        """
+        Resolve live referal code and insert its referal in a single statement.
+        Returns None when the code is not found, otherwise the code columns
+        (referer_id, code_exp_date, code_is_active) and the user columns,
+        which are all None when the email is already taken
+        """
+        columns = self.model.__table__.c
+        ref_code = (
+            select(
+                ReferalCodeModel.user_id,
+                ReferalCodeModel.exp_date,
+                ReferalCodeModel.is_active,
+            )
+            .where(
+                ReferalCodeModel.code == referal_code,
+                ReferalCodeModel.exp_date >= date.today(),
+            )
+            .limit(1)
+            .cte("ref_code")
+        )
+        new_user = (
+            insert(self.model.__table__)
+            .from_select(
+                [*kwargs, "referer_by"],
+                select(
+                    *(
+                        literal(value, columns[key].type)
+                        for key, value in kwargs.items()
+                    ),
+                    ref_code.c.user_id,
+                ),
+            )
+            .on_conflict_do_nothing(index_elements=[columns.email])
+            .returning(*columns)
+            .cte("new_user")
+        )
+        query = select(
+            ref_code.c.user_id.label("referer_id"),
+            ref_code.c.exp_date.label("code_exp_date"),
+            ref_code.c.is_active.label("code_is_active"),
+            new_user,
+        ).select_from(ref_code.outerjoin(new_user, true()))
+        result: Result = await self.session.execute(query)
+        return result.one_or_none()
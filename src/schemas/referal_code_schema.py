@@ -24,6 +24,12 @@ class ReferalCodeDB(ReferalCodeId):
     exp_date: datetime.date
 
 
+class CachedReferalCode(BaseModel):
+    user_id: int
+    exp_date: datetime.date
+    is_active: bool
+
+
 class ReferalCodeResponse(BaseResponse):
     payload: ReferalCodeDB
 
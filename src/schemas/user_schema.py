@@ -1,7 +1,9 @@
 import datetime
+from enum import Enum
 
 from pydantic import BaseModel, EmailStr, Field
 
+from src.config import settings
 from src.schemas.referal_code_schema import ReferalCodeDB
 from src.schemas.response import BaseCreateResponse, BaseResponse
 
@@ -10,17 +12,23 @@ class UserId(BaseModel):
     id: int
 
 
-class CreateUserRequest(BaseModel):
+class UserProfile(BaseModel):
     email: EmailStr
     first_name: str = Field(max_length=30)
     last_name: str = Field(max_length=30)
+
+
+class CreateUserRequest(UserProfile):
     password: str
 
 
 class UpdateUserRequest(CreateUserRequest): ...
 
 
-class UserDB(UserId, CreateUserRequest):
+class UserDB(UserId, UserProfile):
+    # Addresses are validated on the way in, re-validating the ones read
+    # from the database cost more than building the rest of the response
+    email: str = Field(json_schema_extra={"format": "email"})
     registered_at: datetime.datetime
     updated_at: datetime.datetime
     referal_codes: list[ReferalCodeDB] = Field(default_factory=list)
@@ -42,6 +50,32 @@ class UserResponse(BaseResponse):
     payload: UserDB
 
 
+class InviteRequest(BaseModel):
+    referer_email: EmailStr
+    # Validated one by one, an invalid address is reported in its status
+    # instead of rejecting the whole batch
+    recipients: list[str] = Field(
+        min_length=1, max_length=settings.invites.max_recipients
+    )
+
+
+class InviteStatus(str, Enum):
+    QUEUED = "queued"
+    INVALID = "invalid"
+    DUPLICATE = "duplicate"
+    ALREADY_SENT = "already_sent"
+    QUOTA_EXCEEDED = "quota_exceeded"
+
+
+class RecipientStatus(BaseModel):
+    email: str
+    status: InviteStatus
+
+
+class InviteResponse(BaseResponse):
+    payload: list[RecipientStatus]
+
+
 class UserListResponse(BaseResponse):
     payload: list[UserDB]
 
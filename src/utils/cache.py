@@ -0,0 +1,332 @@
+"""
+Storage of the cached endpoint responses.
+
+fastapi-cache's JsonCoder keeps the JSON body of a response, but a hit
+parses it back to Python objects which FastAPI validates against the
+response model and encodes to JSON again, for a 10k-row list that costs
+more than the query the cache saves. ResponseCoder keeps the body bytes,
+compressed above a size threshold, and a hit sends them as they are.
+
+A stored value starts with one header byte, the format in the high
+nibble and the compression in the low one, so that values written
+before a change of the settings are still read back. A body compressed
+with zstd is also a zstd Content-Encoding of the response, and more
+encodings of it may be stored with compression.cached_encodings. A hit
+sends the one the client accepts as it is, compressed neither again
+nor by the CompressionMiddleware.
+"""
+
+import functools
+import hashlib
+import inspect
+import zlib
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+from fastapi_cache.coder import Coder
+from fastapi_cache.decorator import cache
+from fastapi_cache.key_builder import default_key_builder
+from loguru import logger
+from pydantic import BaseModel
+from starlette.background import BackgroundTask
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.types import Receive, Scope, Send
+
+from src.config import settings
+from src.utils.compression import ENCODINGS, INSTALLED, compress, decompress, negotiate
+from src.utils.conditional import request_etag
+from src.utils.serialization import TrustedJSONResponse
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - cache extra is not installed
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - cache extra is not installed
+    zstandard = None
+
+try:
+    import lz4.frame
+except ImportError:  # pragma: no cover - cache extra is not installed
+    lz4 = None
+
+# Formats, the JSON body of a response, a value of the serializer
+# or Content-Encodings of the JSON body of a response
+BODY = 0x00
+ORJSON = 0x10
+MSGPACK = 0x20
+VARIANTS = 0x30
+
+# Compressions
+NONE = 0x0
+ZLIB = 0x1
+ZSTD = 0x2
+LZ4 = 0x3
+
+SERIALIZERS = {"orjson": ORJSON, "msgpack": MSGPACK}
+COMPRESSIONS = {"none": NONE, "zlib": ZLIB, "zstd": ZSTD, "lz4": LZ4}
+
+# Content-Encodings from the fastest to decompress
+DECOMPRESSION_ORDER = ("zstd", "gzip", "br")
+
+
+def _codecs(level: int) -> dict[int, tuple[Callable, Callable]]:
+    """
+    Compress and decompress functions of the installed compressions
+    """
+    codecs = {ZLIB: (functools.partial(zlib.compress, level=level), zlib.decompress)}
+    if zstandard is not None:
+        codecs[ZSTD] = (
+            zstandard.ZstdCompressor(level=level).compress,
+            zstandard.ZstdDecompressor().decompress,
+        )
+    if lz4 is not None:
+        codecs[LZ4] = (
+            functools.partial(lz4.frame.compress, compression_level=level),
+            lz4.frame.decompress,
+        )
+    return codecs
+
+
+CODECS = _codecs(settings.response_cache.compression_level)
+
+
+def _configured_serializer() -> int:
+    serializer = SERIALIZERS[settings.response_cache.serializer]
+    if serializer == MSGPACK and msgpack is None:
+        logger.warning(
+            "Response cache serializer msgpack is not installed, using orjson"
+        )
+        return ORJSON
+    return serializer
+
+
+def _configured_compression() -> int:
+    compression = COMPRESSIONS[settings.response_cache.compression]
+    if compression != NONE and compression not in CODECS:
+        logger.warning(
+            f"Response cache compression {settings.response_cache.compression} "
+            f"is not installed, using zlib"
+        )
+        return ZLIB
+    return compression
+
+
+def identity_body(variants: dict[str, bytes]) -> bytes:
+    """
+    Body decompressed from the fastest of its Content-Encoding variants
+    """
+    encoding = next(name for name in DECOMPRESSION_ORDER if name in variants)
+    return decompress(encoding, variants[encoding])
+
+
+class PrecompressedJSONResponse(TrustedJSONResponse):
+    """
+    JSON response of Content-Encoding variants of its body. The variant
+    the client prefers is sent as it is, the body is only decompressed
+    for a client accepting none of them
+    """
+
+    def __init__(
+        self,
+        variants: dict[str, bytes],
+        status_code: int = 200,
+        headers: dict[str, str] | None = None,
+        background: BackgroundTask | None = None,
+        sub_response: Response | None = None,
+    ) -> None:
+        self.variants = variants
+        super().__init__(b"", status_code, headers, background, sub_response)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        encoding = negotiate(
+            Headers(scope=scope).get("accept-encoding"),
+            [name for name in ENCODINGS if name in self.variants],
+        )
+        headers = MutableHeaders(raw=self.raw_headers)
+        if encoding is None:
+            self.body = identity_body(self.variants)
+        else:
+            self.body = self.variants[encoding]
+            headers["Content-Encoding"] = encoding
+        headers["Content-Length"] = str(len(self.body))
+        headers.add_vary_header("Accept-Encoding")
+        await super().__call__(scope, receive, send)
+
+
+class ResponseCoder(Coder):
+    """
+    fastapi-cache coder keeping JSON responses and pydantic models as the
+    JSON body bytes, decoded to a response sending them without parsing.
+    Other values are stored by the configured serializer and decoded to
+    Python objects like the JsonCoder does
+    """
+
+    serializer = _configured_serializer()
+    compression = _configured_compression()
+    threshold = settings.response_cache.compression_threshold_bytes
+    cached_encodings = tuple(
+        name for name in settings.compression.cached_encodings if INSTALLED.get(name)
+    )
+
+    @classmethod
+    def encode(cls, value: Any) -> bytes:
+        if isinstance(value, JSONResponse):
+            fmt, data = BODY, bytes(value.body)
+        elif isinstance(value, BaseModel):
+            fmt, data = BODY, value.__pydantic_serializer__.to_json(value)
+        elif cls.serializer == MSGPACK:
+            fmt, data = MSGPACK, msgpack.packb(value, default=jsonable_encoder)
+        else:
+            fmt, data = ORJSON, orjson.dumps(value, default=jsonable_encoder)
+
+        if fmt == BODY and cls.cached_encodings and len(data) >= cls.threshold:
+            return cls._pack_variants(data)
+        compression = NONE
+        if cls.compression != NONE and len(data) >= cls.threshold:
+            compression = cls.compression
+            data = CODECS[compression][0](data)
+        return bytes((fmt | compression,)) + data
+
+    @classmethod
+    def decode(cls, value: bytes) -> Any:
+        return cls._load(*cls._unpack(value))
+
+    @classmethod
+    def decode_as_type(cls, value: bytes, *, type_: Any) -> Any:
+        header = value[0]
+        if header == VARIANTS:
+            return PrecompressedJSONResponse(cls._unpack_variants(value))
+        if header == BODY | ZSTD:
+            return PrecompressedJSONResponse({"zstd": value[1:]})
+        fmt, data = cls._unpack(value)
+        if fmt == BODY:
+            return TrustedJSONResponse(data)
+        return cls._load(fmt, data)
+
+    @classmethod
+    def _pack_variants(cls, body: bytes) -> bytes:
+        variants = {}
+        if cls.compression == ZSTD:
+            variants["zstd"] = CODECS[ZSTD][0](body)
+        for encoding in cls.cached_encodings:
+            if encoding not in variants:
+                variants[encoding] = compress(encoding, body)
+        # Every variant is its name length, name, data length and data
+        parts = [bytes((VARIANTS,))]
+        for encoding, data in variants.items():
+            name = encoding.encode()
+            parts += [bytes((len(name),)), name, len(data).to_bytes(4, "big"), data]
+        return b"".join(parts)
+
+    @staticmethod
+    def _unpack_variants(value: bytes) -> dict[str, bytes]:
+        variants = {}
+        view = memoryview(value)
+        offset = 1
+        while offset < len(view):
+            name_end = offset + 1 + view[offset]
+            name = bytes(view[offset + 1 : name_end]).decode()
+            data_end = (
+                name_end + 4 + int.from_bytes(view[name_end : name_end + 4], "big")
+            )
+            variants[name] = bytes(view[name_end + 4 : data_end])
+            offset = data_end
+        return variants
+
+    @classmethod
+    def _unpack(cls, value: bytes) -> tuple[int, bytes]:
+        header = value[0]
+        if header == VARIANTS:
+            return BODY, identity_body(cls._unpack_variants(value))
+        fmt, compression = header & 0xF0, header & 0x0F
+        data = memoryview(value)[1:]
+        if compression != NONE:
+            return fmt, CODECS[compression][1](data)
+        return fmt, bytes(data)
+
+    @staticmethod
+    def _load(fmt: int, data: bytes) -> Any:
+        if fmt == MSGPACK:
+            return msgpack.unpackb(data)
+        return orjson.loads(data)
+
+
+def request_key_builder(
+    func: Callable[..., Any],
+    namespace: str = "",
+    *,
+    request: Request | None = None,
+    response: Response | None = None,
+    args: tuple[Any, ...],
+    kwargs: dict[str, Any],
+) -> str:
+    """
+    Key of the endpoint, its query parameters and the ETag of the resource
+    version if any, a new version is a new key. The default key builder
+    also formats the dependencies, the repr of a service holds its address
+    so no two requests got the same key. The dependencies still run on a
+    hit, the authentication included
+    """
+    if request is None:
+        return default_key_builder(
+            func,
+            namespace,
+            request=request,
+            response=response,
+            args=args,
+            kwargs=kwargs,
+        )
+    query = sorted(request.query_params.multi_items())
+    etag = request_etag(request)
+    cache_key = hashlib.md5(
+        f"{func.__module__}:{func.__name__}:{query}:{etag}".encode()
+    ).hexdigest()
+    return f"{namespace}:{cache_key}"
+
+
+def cache_response(
+    expire: int | None = None,
+) -> Callable[[Callable[..., Awaitable]], Callable[..., Awaitable]]:
+    """
+    fastapi-cache decorator of an endpoint returning a TrustedJSONResponse,
+    the response of a hit is sent with the cache headers fastapi-cache sets
+    on the Response parameter. The ETag of a conditional_get route replaces
+    the one of fastapi-cache, a hash of the cached value
+    """
+
+    def wrapper(func: Callable[..., Awaitable]) -> Callable[..., Awaitable]:
+        cached = cache(
+            expire=expire or settings.response_cache.expire_seconds,
+            coder=ResponseCoder,
+            key_builder=request_key_builder,
+        )(func)
+        # Declared by the endpoint or injected by fastapi-cache
+        parameters = inspect.signature(cached).parameters.items()
+        request_param = next(
+            name for name, parameter in parameters if parameter.annotation is Request
+        )
+        response_param = next(
+            name for name, parameter in parameters if parameter.annotation is Response
+        )
+
+        @functools.wraps(cached)
+        async def inner(*args, **kwargs) -> Any:
+            result = await cached(*args, **kwargs)
+            response = kwargs.get(response_param)
+            etag = request_etag(kwargs[request_param])
+            if etag is not None and response is not None:
+                response.headers["ETag"] = etag
+            if isinstance(result, TrustedJSONResponse) and result.sub_response is None:
+                result.sub_response = response
+            return result
+
+        return inner
+
+    return wrapper
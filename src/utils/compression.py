@@ -0,0 +1,156 @@
+"""
+HTTP Content-Encodings of the response bodies, brotli and zstd when
+their libraries are installed, gzip always.
+"""
+
+import threading
+import zlib
+from collections.abc import Iterable
+
+from starlette.concurrency import run_in_threadpool
+
+from src.config import settings
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - compression extra is not installed
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - cache extra is not installed
+    zstandard = None
+
+GZIP_WBITS = zlib.MAX_WBITS | 16
+
+INSTALLED = {
+    "br": brotli is not None,
+    "zstd": zstandard is not None,
+    "gzip": True,
+}
+
+# Encodings served, in the order of preference
+ENCODINGS = tuple(
+    encoding for encoding in settings.compression.encodings if INSTALLED.get(encoding)
+)
+
+_zstd = threading.local()
+
+
+def _level(encoding: str) -> int:
+    return settings.compression.levels[encoding]
+
+
+def _zstd_compressor() -> "zstandard.ZstdCompressor":
+    # A compressor is not safe to share between the threads of the pool
+    compressor = getattr(_zstd, "compressor", None)
+    if compressor is None:
+        compressor = _zstd.compressor = zstandard.ZstdCompressor(level=_level("zstd"))
+    return compressor
+
+
+def compress(encoding: str, data: bytes) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=_level("br"))
+    if encoding == "zstd":
+        return _zstd_compressor().compress(data)
+    if encoding == "gzip":
+        compressor = zlib.compressobj(_level("gzip"), zlib.DEFLATED, GZIP_WBITS)
+        return compressor.compress(data) + compressor.flush()
+    raise ValueError(f"Unknown content encoding {encoding}")
+
+
+def decompress(encoding: str, data: bytes) -> bytes:
+    if encoding == "br":
+        return brotli.decompress(data)
+    if encoding == "zstd":
+        # Streamed frames have no content size in their header
+        return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+    if encoding == "gzip":
+        return zlib.decompress(data, GZIP_WBITS)
+    raise ValueError(f"Unknown content encoding {encoding}")
+
+
+async def compress_body(encoding: str, data: bytes) -> bytes:
+    """
+    Compress a body, in the thread pool from offload_size_bytes up
+    """
+    if len(data) >= settings.compression.offload_size_bytes:
+        return await run_in_threadpool(compress, encoding, data)
+    return compress(encoding, data)
+
+
+class StreamCompressor:
+    """
+    Compresses a body chunk by chunk. Every chunk is flushed, the client
+    gets what was sent so far without waiting for the next chunk
+    """
+
+    def __init__(self, encoding: str) -> None:
+        self.encoding = encoding
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=_level("br"))
+        elif encoding == "zstd":
+            self._compressor = zstandard.ZstdCompressor(
+                level=_level("zstd")
+            ).compressobj()
+        elif encoding == "gzip":
+            self._compressor = zlib.compressobj(
+                _level("gzip"), zlib.DEFLATED, GZIP_WBITS
+            )
+        else:
+            raise ValueError(f"Unknown content encoding {encoding}")
+
+    def compress(self, chunk: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._compressor.process(chunk) + self._compressor.flush()
+        if self.encoding == "zstd":
+            return self._compressor.compress(chunk) + self._compressor.flush(
+                zstandard.COMPRESSOBJ_FLUSH_BLOCK
+            )
+        return self._compressor.compress(chunk) + self._compressor.flush(
+            zlib.Z_SYNC_FLUSH
+        )
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self._compressor.finish()
+        return self._compressor.flush()
+
+    async def compress_chunk(self, chunk: bytes) -> bytes:
+        # The chunks of one body are compressed one after the other,
+        # the compressor is never used by two threads at once
+        if len(chunk) >= settings.compression.offload_size_bytes:
+            return await run_in_threadpool(self.compress, chunk)
+        return self.compress(chunk)
+
+
+def negotiate(
+    accept_encoding: str | None, available: Iterable[str] = ENCODINGS
+) -> str | None:
+    """
+    Content-Encoding of the available ones the Accept-Encoding header
+    prefers, ties are broken by the order of the available encodings.
+    None is the identity, the body is sent uncompressed
+    """
+    if not accept_encoding or not settings.compression.enabled:
+        return None
+    weights: dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.partition(";")
+        weight = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[coding.strip().lower()] = weight
+
+    best, best_weight = None, 0.0
+    for encoding in available:
+        weight = weights.get(encoding, weights.get("*", 0.0))
+        if weight > best_weight:
+            best, best_weight = encoding, weight
+    return best
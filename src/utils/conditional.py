@@ -0,0 +1,63 @@
+"""
+Conditional GET of resources with a cheap version query.
+
+The version of a resource, such as the updated_at of a row, is read
+before the resource itself. Its weak ETag is compared to the If-None-Match
+header and a match is answered 304 Not Modified without a body, neither
+the resource nor its cached response is read. The ETag is the same on
+every worker, it only depends on the version.
+"""
+
+import hashlib
+from collections.abc import Callable
+from typing import Any
+
+from fastapi import Depends, HTTPException, Request, status
+
+
+def weak_etag(*version: Any) -> str:
+    digest = hashlib.blake2b(repr(version).encode(), digest_size=8).hexdigest()
+    return f'W/"{digest}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """
+    Weak comparison of the If-None-Match header with the ETag, RFC 9110 13.1.2
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque_tag = etag.removeprefix("W/")
+    return any(
+        tag.strip().removeprefix("W/") == opaque_tag for tag in if_none_match.split(",")
+    )
+
+
+def request_etag(request: Request) -> str | None:
+    """
+    ETag conditional_get found for the request
+    """
+    return getattr(request.state, "etag", None)
+
+
+def conditional_get(version: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    Route dependency answering 304 when If-None-Match has the ETag returned
+    by the version dependency, None is a resource without a version. Put in
+    the route dependencies it runs before the endpoint and its cache, the
+    ETag is kept on the request for the cache key and the response headers
+    """
+
+    async def check_not_modified(
+        request: Request, etag: str | None = Depends(version)
+    ) -> None:
+        if etag is None:
+            return
+        request.state.etag = etag
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            raise HTTPException(
+                status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag}
+            )
+
+    return check_not_modified
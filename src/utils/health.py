@@ -0,0 +1,140 @@
+import asyncio
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+
+from loguru import logger
+from sqlalchemy import text
+
+from src.config import settings
+from src.database.db import async_engine
+from src.database.pool import pool_limits
+from src.database.redis import redis_client
+from src.metadata import ERROR_MAPS
+
+
+@dataclass
+class DependencyCheck:
+    healthy: bool
+    latency_ms: float
+    error: str | None = None
+
+
+@dataclass
+class HealthReport:
+    checked_at: datetime | None = None
+    dependencies: dict[str, DependencyCheck] = field(default_factory=dict)
+
+    @property
+    def healthy(self) -> bool:
+        """
+        Probed at least once and every critical dependency is healthy
+        """
+        return self.checked_at is not None and all(
+            check.healthy
+            for name, check in self.dependencies.items()
+            if name in settings.health.critical
+        )
+
+    @property
+    def errors(self) -> dict[str, str]:
+        return {
+            name: check.error
+            for name, check in self.dependencies.items()
+            if not check.healthy
+        }
+
+    def to_dict(self) -> dict:
+        return {
+            "checked_at": self.checked_at and self.checked_at.isoformat(),
+            "dependencies": {
+                name: asdict(check) for name, check in self.dependencies.items()
+            },
+        }
+
+
+async def check_postgres() -> None:
+    async with async_engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
+
+
+async def check_redis() -> None:
+    await redis_client.ping()
+
+
+async def check_smtp() -> None:
+    # Reachability only, the TLS handshake and login are left to the sends
+    _, writer = await asyncio.open_connection(
+        settings.SMTP_HOST, int(settings.SMTP_PORT)
+    )
+    writer.close()
+    await writer.wait_closed()
+
+
+async def check_pool() -> None:
+    capacity = sum(pool_limits())
+    in_use = async_engine.pool.checkedout()
+    if in_use >= capacity * settings.health.pool_saturation_threshold:
+        raise RuntimeError(f"{in_use} of {capacity} connections in use")
+
+
+CHECKS: dict[str, Callable[[], Awaitable[None]]] = {
+    "postgres": check_postgres,
+    "redis": check_redis,
+    "smtp": check_smtp,
+    "pool": check_pool,
+}
+
+
+async def run_check(name: str, check: Callable[[], Awaitable[None]]) -> DependencyCheck:
+    started_at = time.perf_counter()
+    try:
+        await asyncio.wait_for(check(), settings.health.timeout_seconds)
+    except Exception as ex:
+        error = ERROR_MAPS.get(name, "Check failed")
+        return DependencyCheck(
+            healthy=False,
+            latency_ms=round((time.perf_counter() - started_at) * 1000, 3),
+            error=f"{error}: {ex!r}",
+        )
+    return DependencyCheck(
+        healthy=True, latency_ms=round((time.perf_counter() - started_at) * 1000, 3)
+    )
+
+
+class HealthProber:
+    """
+    Probes the dependencies concurrently on an interval and keeps the last
+    report, so that the health endpoints never do I/O themselves however
+    often they are polled
+    """
+
+    def __init__(self) -> None:
+        self.report = HealthReport()
+
+    async def probe(self) -> HealthReport:
+        results = await asyncio.gather(
+            *(run_check(name, check) for name, check in CHECKS.items())
+        )
+        report = HealthReport(
+            checked_at=datetime.now(timezone.utc),
+            dependencies=dict(zip(CHECKS, results)),
+        )
+        # Only the changes are logged, not every failing probe
+        for name, check in report.dependencies.items():
+            previous = self.report.dependencies.get(name)
+            if not check.healthy and (previous is None or previous.healthy):
+                logger.warning(f"Health check of {name} failed: {check.error}")
+            elif check.healthy and previous is not None and not previous.healthy:
+                logger.info(f"Health check of {name} recovered")
+        self.report = report
+        return report
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(settings.health.interval_seconds)
+            await self.probe()
+
+
+health_prober = HealthProber()
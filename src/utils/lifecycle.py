@@ -0,0 +1,72 @@
+import asyncio
+import functools
+import threading
+from collections.abc import Callable
+from dataclasses import dataclass, field
+
+from loguru import logger
+from starlette.concurrency import run_in_threadpool
+
+
+@dataclass
+class LifecycleState:
+    """
+    Readiness of the worker: it starts serving traffic once the lifespan
+    startup has warmed it up and stops as soon as the shutdown begins.
+    Liveness only needs the event loop to respond
+    """
+
+    started: bool = False
+    shutting_down: bool = False
+
+    @property
+    def ready(self) -> bool:
+        return self.started and not self.shutting_down
+
+
+@dataclass
+class BackgroundWork:
+    """
+    Work started by a request that has to outlive it, such as email sends.
+    The lifespan shutdown waits for it instead of dropping it, work still
+    running after the drain timeout is asked to stop at its next step with
+    the stopping event, such as a batch before its next email
+    """
+
+    tasks: set[asyncio.Task] = field(default_factory=set)
+    stopping: threading.Event = field(default_factory=threading.Event)
+
+    def tracked(self, func: Callable) -> Callable:
+        """
+        Wrap a blocking function for BackgroundTasks.add_task: it runs in the
+        thread pool as a task of its own, so it is neither cancelled with the
+        request nor forgotten on shutdown
+        """
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs) -> None:
+            task = asyncio.create_task(run_in_threadpool(func, *args, **kwargs))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+            await asyncio.shield(task)
+
+        return wrapper
+
+    async def drain(self, timeout: float, stop_timeout: float) -> None:
+        if not self.tasks:
+            return
+        logger.info(f"Waiting for {len(self.tasks)} background tasks")
+        _, pending = await asyncio.wait(self.tasks, timeout=timeout)
+        if not pending:
+            return
+        logger.warning(f"Stopping {len(pending)} background tasks not finished in time")
+        self.stopping.set()
+        _, pending = await asyncio.wait(pending, timeout=stop_timeout)
+        if pending:
+            logger.warning(f"{len(pending)} background tasks did not stop in time")
+            for task in pending:
+                task.cancel()
+
+
+lifecycle_state = LifecycleState()
+background_work = BackgroundWork()
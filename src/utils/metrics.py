@@ -0,0 +1,129 @@
+import os
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ["method", "route"],
+    buckets=LATENCY_BUCKETS,
+)
+HTTP_RESPONSES = Counter(
+    "http_responses_total",
+    "HTTP responses by route template and status code",
+    ["method", "route", "status"],
+)
+CACHE_REQUESTS = Counter(
+    "fastapi_cache_requests_total",
+    "fastapi-cache lookups of cached routes",
+    ["route", "result"],
+)
+
+ADMISSION_IN_FLIGHT = Gauge(
+    "admission_in_flight_requests",
+    "Requests admitted and currently processed",
+    ["priority"],
+    multiprocess_mode="livesum",
+)
+ADMISSION_QUEUE_DEPTH = Gauge(
+    "admission_queue_depth",
+    "Requests waiting for admission",
+    ["priority"],
+    multiprocess_mode="livesum",
+)
+ADMISSION_SHED = Counter(
+    "admission_shed_requests_total",
+    "Requests rejected with 503 by the admission control",
+    ["priority"],
+)
+ADMISSION_LIMIT = Gauge(
+    "admission_concurrency_limit",
+    "Current adaptive concurrency limit",
+    multiprocess_mode="liveall",
+)
+
+DB_POOL_CHECKOUT_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time spent waiting for a connection from the DB pool",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+DB_POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out_connections",
+    "DB connections currently checked out of the pool",
+    multiprocess_mode="livesum",
+)
+DB_POOL_OVERFLOW = Gauge(
+    "db_pool_overflow_connections",
+    "DB connections opened above the pool size",
+    multiprocess_mode="livesum",
+)
+DB_POOL_SIZE = Gauge(
+    "db_pool_size",
+    "Configured DB pool size of the worker",
+    multiprocess_mode="livesum",
+)
+DB_PREPARED_STATEMENT_LOOKUPS = Counter(
+    "db_prepared_statement_lookups_total",
+    "Prepared statement cache lookups of the DB connections",
+    ["result"],
+)
+DB_PREPARED_STATEMENTS = Gauge(
+    "db_prepared_statements",
+    "Statements prepared and cached on the open DB connections",
+    multiprocess_mode="livesum",
+)
+REPOSITORY_QUERY_DURATION = Histogram(
+    "repository_query_duration_seconds",
+    "Latency of repository methods",
+    ["repository", "method"],
+    buckets=LATENCY_BUCKETS,
+)
+
+PASSWORD_HASH_DURATION = Histogram(
+    "password_hash_duration_seconds",
+    "bcrypt hash and check duration",
+    ["operation"],
+    buckets=(0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1, 2),
+)
+JWT_DURATION = Histogram(
+    "jwt_duration_seconds",
+    "JWT sign and verify duration",
+    ["operation"],
+    buckets=(0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05),
+)
+SMTP_SEND_DURATION = Histogram(
+    "smtp_send_duration_seconds",
+    "Time to connect, login and send one email",
+    buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+SMTP_SEND_FAILURES = Counter(
+    "smtp_send_failures_total",
+    "Emails that could not be sent",
+)
+EMAIL_DEDUP_CLAIMS = Counter(
+    "email_dedup_claims_total",
+    "Email sends checked for a recent identical send, by where it was decided",
+    ["result"],
+)
+
+
+def render_metrics() -> tuple[bytes, str]:
+    """
+    Gunicorn workers write their samples to PROMETHEUS_MULTIPROC_DIR,
+    so they have to be collected from there for the whole server
+    """
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
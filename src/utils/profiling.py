@@ -0,0 +1,118 @@
+import asyncio
+import cProfile
+import hmac
+import marshal
+import uuid
+from pathlib import Path
+
+import orjson
+
+from src.config import settings
+from src.database.query_stats import QueryStats
+
+try:
+    from pyinstrument import Profiler
+    from pyinstrument.renderers import HTMLRenderer, SpeedscopeRenderer
+except ImportError:  # pragma: no cover - profiling extra is not installed
+    Profiler = None
+
+WORKER_PROFILE_PATH = "/admin/profile"
+
+# sys.setprofile based profilers can not be nested,
+# so a worker runs at most one of them at a time
+profiler_lock = asyncio.Lock()
+
+
+def is_authorised(token: str | None) -> bool:
+    if not settings.profiling.token or token is None:
+        return False
+    return hmac.compare_digest(token.encode(), settings.profiling.token.encode())
+
+
+class SessionProfiler:
+    """
+    pyinstrument sampling profiler when it is installed, cProfile otherwise.
+    With async_mode pyinstrument only records the profiled task, cProfile
+    records every callback run by the event loop meanwhile
+    """
+
+    def __init__(self, async_mode: bool = True) -> None:
+        if Profiler is not None:
+            self.profiler = Profiler(async_mode="enabled" if async_mode else "disabled")
+        else:
+            self.profiler = cProfile.Profile()
+
+    def start(self) -> None:
+        if Profiler is not None:
+            self.profiler.start()
+        else:
+            self.profiler.enable()
+
+    def stop(self) -> None:
+        if Profiler is not None:
+            self.profiler.stop()
+        else:
+            self.profiler.disable()
+
+    def render(self) -> tuple[bytes, str, str]:
+        """
+        Returns the report, its file extension and media type
+        """
+        if Profiler is None:
+            self.profiler.create_stats()
+            report = marshal.dumps(self.profiler.stats)
+            return report, "prof", "application/octet-stream"
+        if settings.profiling.report_format == "speedscope":
+            report = self.profiler.output(SpeedscopeRenderer())
+            return report.encode(), "speedscope.json", "application/json"
+        report = self.profiler.output(HTMLRenderer())
+        return report.encode(), "html", "text/html"
+
+
+async def store_report(
+    profiler: SessionProfiler, label: str, stats: QueryStats | None = None
+) -> tuple[str, bytes, str]:
+    """
+    Write the report and the SQL stats of the profiled code to reports_dir,
+    returns the profile id, the report and its media type
+    """
+    profile_id = uuid.uuid4().hex
+    report, extension, media_type = profiler.render()
+    summary = {"id": profile_id, "label": label}
+    if stats is not None:
+        summary["sql"] = {
+            "count": stats.count,
+            "rows": stats.rows,
+            "duration_ms": round(stats.duration * 1000, 3),
+            "statements": dict(stats.statements),
+        }
+    await asyncio.to_thread(
+        _write_files,
+        settings.profiling.reports_dir,
+        profile_id,
+        extension,
+        report,
+        orjson.dumps(summary, option=orjson.OPT_INDENT_2),
+    )
+    return profile_id, report, media_type
+
+
+async def profile_worker(seconds: int) -> tuple[str, bytes, str]:
+    """
+    Profile everything the worker does for the given number of seconds
+    """
+    profiler = SessionProfiler(async_mode=False)
+    profiler.start()
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        profiler.stop()
+    return await store_report(profiler, f"worker {seconds}s")
+
+
+def _write_files(
+    reports_dir: Path, profile_id: str, extension: str, report: bytes, summary: bytes
+) -> None:
+    reports_dir.mkdir(parents=True, exist_ok=True)
+    (reports_dir / f"{profile_id}.{extension}").write_bytes(report)
+    (reports_dir / f"{profile_id}.json").write_bytes(summary)
@@ -0,0 +1,48 @@
+from datetime import datetime, timezone
+
+from loguru import logger
+from redis.exceptions import RedisError
+
+from src.database.redis import redis_client
+
+# Grants as much of the requested amount as the quota has left and counts
+# it in one step, so that concurrent batches can't overspend it together
+TAKE_QUOTA_SCRIPT = """
+local used = tonumber(redis.call('GET', KEYS[1]) or '0')
+local granted = math.min(tonumber(ARGV[1]), math.max(tonumber(ARGV[2]) - used, 0))
+if granted > 0 then
+    redis.call('INCRBY', KEYS[1], granted)
+    redis.call('EXPIRE', KEYS[1], ARGV[3])
+end
+return granted
+"""
+
+take_quota = redis_client.register_script(TAKE_QUOTA_SCRIPT)
+
+
+class DailyQuota:
+    """
+    Amount each identity may spend per UTC day, shared by every worker
+    """
+
+    def __init__(self, prefix: str, limit: int) -> None:
+        self.prefix = prefix
+        self.limit = limit
+
+    async def take(self, identity: str | int, amount: int) -> int:
+        """
+        Returns how much of the amount was granted, anything between 0 and amount
+        """
+        if amount <= 0:
+            return 0
+        day = datetime.now(timezone.utc).strftime("%Y%m%d")
+        try:
+            granted = await take_quota(
+                keys=[f"{self.prefix}:quota:{identity}:{day}"],
+                # Kept a day longer than needed, the key of a day is never reused
+                args=[amount, self.limit, 2 * 24 * 60 * 60],
+            )
+        except RedisError as ex:
+            logger.warning(f"Quota storage failed with error: {ex}")
+            return amount
+        return int(granted)
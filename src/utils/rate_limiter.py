@@ -0,0 +1,118 @@
+import math
+import time
+import uuid
+from collections.abc import Callable
+from typing import Any
+
+from fastapi import Depends, HTTPException, Request, status
+from loguru import logger
+from redis.exceptions import RedisError
+
+from src.config import RateLimit, settings
+from src.database.redis import redis_client
+
+# Sliding window log kept in a sorted set, the Redis clock is used so that
+# every worker agrees on the window. Returns 0 when the hit is allowed,
+# otherwise the number of milliseconds until the oldest hit leaves the window
+SLIDING_WINDOW_SCRIPT = """
+local key = KEYS[1]
+local window = tonumber(ARGV[1])
+local limit = tonumber(ARGV[2])
+local member = ARGV[3]
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) * 1000 + math.floor(tonumber(clock[2]) / 1000)
+redis.call('ZREMRANGEBYSCORE', key, '-inf', now - window)
+if redis.call('ZCARD', key) < limit then
+    redis.call('ZADD', key, now, member)
+    redis.call('PEXPIRE', key, window)
+    return 0
+end
+local oldest = redis.call('ZRANGE', key, 0, 0, 'WITHSCORES')
+return math.max(tonumber(oldest[2]) + window - now, 1)
+"""
+
+sliding_window = redis_client.register_script(SLIDING_WINDOW_SCRIPT)
+
+
+class TokenBucket:
+    """
+    In-process token bucket with the same budget as the shared window.
+    When a single worker has already spent the whole budget, the shared
+    window is exhausted as well and Redis doesn't need to be asked
+    """
+
+    def __init__(self, limit: RateLimit) -> None:
+        self.capacity = limit.times
+        self.rate = limit.times / limit.seconds
+        self.buckets: dict[str, tuple[float, float]] = {}
+
+    def take(self, identity: str) -> float:
+        """
+        Returns 0 when a token was taken, otherwise seconds until the next token
+        """
+        now = time.monotonic()
+        tokens, updated_at = self.buckets.get(identity, (self.capacity, now))
+        tokens = min(self.capacity, tokens + (now - updated_at) * self.rate)
+        if tokens < 1:
+            self.buckets[identity] = (tokens, now)
+            return (1 - tokens) / self.rate
+        if len(self.buckets) >= settings.rate_limits.local_max_keys:
+            self._evict_full(now)
+        self.buckets[identity] = (tokens - 1, now)
+        return 0
+
+    def _evict_full(self, now: float) -> None:
+        self.buckets = {
+            identity: (tokens, updated_at)
+            for identity, (tokens, updated_at) in self.buckets.items()
+            if tokens + (now - updated_at) * self.rate < self.capacity
+        }
+
+
+class RateLimiter:
+    def __init__(self, scope: str, limit: RateLimit) -> None:
+        self.scope = scope
+        self.limit = limit
+        self.local = TokenBucket(limit)
+
+    async def hit(self, identity: str) -> None:
+        retry_after = self.local.take(identity)
+        if not retry_after:
+            retry_after = await self._shared_hit(identity)
+        if retry_after:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many requests",
+                headers={"Retry-After": str(math.ceil(retry_after))},
+            )
+
+    async def _shared_hit(self, identity: str) -> float:
+        try:
+            retry_after_ms = await sliding_window(
+                keys=[f"{settings.rate_limits.prefix}:{self.scope}:{identity}"],
+                args=[self.limit.seconds * 1000, self.limit.times, uuid.uuid4().hex],
+            )
+        except RedisError as ex:
+            logger.warning(f"Rate limiter storage failed with error: {ex}")
+            return 0
+        return int(retry_after_ms) / 1000
+
+
+def rate_limit(
+    scope: str, limit: RateLimit, identity: Callable[..., Any]
+) -> Callable[..., Any]:
+    """
+    Route dependency limiting the requests of every identity
+    returned by the identity dependency
+    """
+    limiter = RateLimiter(scope=scope, limit=limit)
+
+    async def check_rate_limit(key: str = Depends(identity)) -> None:
+        await limiter.hit(str(key).lower())
+
+    return check_rate_limit
+
+
+def client_ip(request: Request) -> str:
+    """Client address as seen by the app, put uvicorn behind --proxy-headers"""
+    return request.client.host if request.client else "unknown"
@@ -1,11 +1,66 @@
+import functools
+import inspect
+import time
 from abc import ABC, abstractmethod
-from collections.abc import Sequence
+from collections.abc import Awaitable, Callable, Iterable, Sequence
 from typing import Any
 
-from sqlalchemy import delete, insert, select, update
+from pydantic import BaseModel
+from sqlalchemy import ColumnElement, Row
 from sqlalchemy.engine import Result
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from src.utils.metrics import REPOSITORY_QUERY_DURATION
+from src.utils.serialization import schema_columns
+from src.utils.statements import (
+    delete_statement,
+    filter_params,
+    insert_statement,
+    select_statement,
+    shape,
+    update_statement,
+    value_params,
+)
+from src.utils.tracing import span
+
+AsyncFunc = Callable[..., Awaitable[Any]]
+Projection = type[BaseModel] | Iterable[ColumnElement]
+
+
+def instrumented_repository_method(method: AsyncFunc) -> AsyncFunc:
+    """
+    Decorator observing the latency of a repository method and tracing it,
+    labelled with the concrete repository class
+    """
+
+    @functools.wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        repository = type(self).__name__
+        started_at = time.perf_counter()
+        try:
+            with span(f"{repository}.{method.__name__}"):
+                return await method(self, *args, **kwargs)
+        finally:
+            REPOSITORY_QUERY_DURATION.labels(repository, method.__name__).observe(
+                time.perf_counter() - started_at
+            )
+
+    wrapper.__instrumented__ = True
+    return wrapper
+
+
+def instrument_repository(cls: type) -> None:
+    """
+    Wrap public async methods defined on the class with instrumented_repository_method
+    """
+    for name, attr in list(vars(cls).items()):
+        if (
+            not name.startswith("_")
+            and inspect.iscoroutinefunction(attr)
+            and not getattr(attr, "__instrumented__", False)
+        ):
+            setattr(cls, name, instrumented_repository_method(attr))
+
 
 class AbstractRepository(ABC):
     @abstractmethod
@@ -28,6 +83,14 @@ class AbstractRepository(ABC):
     async def get_by_query_all(self, *args, **kwargs):
         raise NotImplementedError
 
+    @abstractmethod
+    async def get_columns_by_query_one_or_none(self, *args, **kwargs):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def get_columns_by_query_all(self, *args, **kwargs):
+        raise NotImplementedError
+
     @abstractmethod
     async def update_one_by_id(self, *args: Any, **kwargs: Any):
         raise NotImplementedError
@@ -47,44 +110,71 @@ class SQLAlchemyRepository(AbstractRepository):
     def __init__(self, session: AsyncSession):
         self.session = session
 
+    def __init_subclass__(cls, **kwargs: Any) -> None:
+        super().__init_subclass__(**kwargs)
+        instrument_repository(cls)
+
     async def add_one(self, **kwargs) -> None:
-        query = insert(self.model).values(**kwargs)
-        await self.session.execute(query)
+        query = insert_statement(self.model, tuple(sorted(kwargs)))
+        await self.session.execute(query, value_params(kwargs))
 
     async def add_one_and_get_id(self, **kwargs) -> int:
-        query = insert(self.model).values(**kwargs).returning(self.id)
-        _id: Result = await self.session.execute(query)
+        query = insert_statement(self.model, tuple(sorted(kwargs)), self.model.id)
+        _id: Result = await self.session.execute(query, value_params(kwargs))
         return _id.scalar_one()
 
     async def add_one_and_get_obj(self, **kwargs) -> type(model):
-        query = insert(self.model).values(**kwargs).returning(self.model)
-        _object: Result = await self.session.execute(query)
+        query = insert_statement(self.model, tuple(sorted(kwargs)), self.model)
+        _object: Result = await self.session.execute(query, value_params(kwargs))
         return _object.scalar_one()
 
     async def get_by_query_one_or_none(self, **kwargs) -> type(model) | None:
-        query = select(self.model).filter_by(**kwargs)
-        result: Result = await self.session.execute(query)
+        query = select_statement(self.model, *shape(kwargs))
+        result: Result = await self.session.execute(query, filter_params(kwargs))
         return result.unique().scalar_one_or_none()
 
     async def get_by_query_all(self, **kwargs) -> Sequence[type(model)]:
-        query = select(self.model).filter_by(**kwargs)
-        result: Result = await self.session.execute(query)
+        query = select_statement(self.model, *shape(kwargs))
+        result: Result = await self.session.execute(query, filter_params(kwargs))
         return result.scalars().all()
 
+    async def get_columns_by_query_one_or_none(
+        self, columns: Projection, **kwargs
+    ) -> Row | None:
+        """
+        Only the given columns, or the ones the schema has fields for,
+        as a Core row: nothing is hydrated nor added to the identity map
+        """
+        query = select_statement(self.model, *shape(kwargs), self._projection(columns))
+        result: Result = await self.session.execute(query, filter_params(kwargs))
+        return result.one_or_none()
+
+    async def get_columns_by_query_all(
+        self, columns: Projection, **kwargs
+    ) -> Sequence[Row]:
+        query = select_statement(self.model, *shape(kwargs), self._projection(columns))
+        result: Result = await self.session.execute(query, filter_params(kwargs))
+        return result.all()
+
+    def _projection(self, columns: Projection) -> tuple[ColumnElement, ...]:
+        if isinstance(columns, type) and issubclass(columns, BaseModel):
+            return schema_columns(self.model, columns)
+        return tuple(columns)
+
     async def update_one_by_id(self, obj_id: int, **kwargs: Any) -> type(model) | None:
-        query = (
-            update(self.model)
-            .filter(self.model.id == obj_id)
-            .values(**kwargs)
-            .returning(self.model)
+        query = update_statement(self.model, ("id",), tuple(sorted(kwargs)))
+        obj: Result | None = await self.session.execute(
+            query, {**filter_params({"id": obj_id}), **value_params(kwargs)}
         )
-        obj: Result | None = await self.session.execute(query)
         return obj.scalar_one_or_none()
 
     async def delete_by_query(self, **kwargs) -> None:
-        query = delete(self.model).filter_by(**kwargs)
-        await self.session.execute(query)
+        query = delete_statement(self.model, *shape(kwargs))
+        await self.session.execute(query, filter_params(kwargs))
 
     async def delete_all(self) -> None:
-        query = delete(self.model)
+        query = delete_statement(self.model, (), ())
         await self.session.execute(query)
+
+
+instrument_repository(SQLAlchemyRepository)
@@ -0,0 +1,78 @@
+import functools
+from collections.abc import Iterable
+from typing import Any
+
+import orjson
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, TypeAdapter
+from sqlalchemy import Column
+from starlette.background import BackgroundTask
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+
+@functools.cache
+def type_adapter(type_: Any) -> TypeAdapter:
+    """
+    TypeAdapter built once per type, building one compiles its validator
+    and serializer
+    """
+    return TypeAdapter(type_)
+
+
+@functools.cache
+def schema_columns(model: type, schema: type[BaseModel]) -> tuple[Column, ...]:
+    """
+    Columns of the model table the schema has fields for,
+    the projection a schema needs instead of the whole entity
+    """
+    columns = model.__table__.c
+    return tuple(columns[name] for name in schema.model_fields if name in columns)
+
+
+def validate_row(schema: type[BaseModel], row: Any) -> BaseModel:
+    """
+    Validate a Core row, or any object exposing the fields as attributes
+    """
+    return schema.model_validate(row, from_attributes=True)
+
+
+def validate_rows(schema: type[BaseModel], rows: Iterable[Any]) -> list[BaseModel]:
+    return type_adapter(list[schema]).validate_python(rows, from_attributes=True)
+
+
+class TrustedJSONResponse(ORJSONResponse):
+    """
+    JSON response of content already valid for its schema. Returned by an
+    endpoint it is sent as it is: FastAPI neither validates the content
+    against the response model again nor re-encodes it, a pydantic model
+    is serialized to JSON bytes in one pass by its compiled serializer.
+    Bytes are a body rendered before, a cached one, and are sent as they are.
+
+    Headers set on the sub_response, the Response parameter of the endpoint
+    which fastapi-cache also updates after the endpoint has returned,
+    are added when the response is sent
+    """
+
+    def __init__(
+        self,
+        content: Any,
+        status_code: int = 200,
+        headers: dict[str, str] | None = None,
+        background: BackgroundTask | None = None,
+        sub_response: Response | None = None,
+    ) -> None:
+        super().__init__(content, status_code, headers, background=background)
+        self.sub_response = sub_response
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        if isinstance(content, BaseModel):
+            return content.__pydantic_serializer__.to_json(content)
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if self.sub_response is not None:
+            self.raw_headers.extend(self.sub_response.headers.raw)
+        await super().__call__(scope, receive, send)
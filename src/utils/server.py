@@ -0,0 +1,26 @@
+from uvicorn.workers import UvicornWorker
+
+from src.config import settings
+
+
+class ServerWorker(UvicornWorker):
+    """
+    Uvicorn worker for gunicorn with the event loop and HTTP parser of the
+    server settings (uvloop and httptools by default) instead of "auto",
+    which silently falls back to asyncio and h11 when they are missing
+    """
+
+    CONFIG_KWARGS = {
+        "loop": settings.server.loop,
+        "http": settings.server.http,
+        "lifespan": "on",
+        # Gunicorn kills the worker graceful_timeout after asking it to stop,
+        # uvicorn cancels the remaining requests early enough for the lifespan
+        # shutdown to drain the background tasks and close the pools
+        "timeout_graceful_shutdown": max(
+            1,
+            settings.server.graceful_timeout_seconds
+            - settings.lifecycle.drain_timeout_seconds
+            - 1,
+        ),
+    }
@@ -0,0 +1,134 @@
+"""
+Statements of the generic repository methods, built once per shape.
+
+A shape is the model, the operation and the sorted keys of the filters
+and values, every value is a bound parameter. The same statement object
+is reused for every call of a shape, so neither the construct nor its
+compiled cache key is built again, and the SQL text asyncpg prepares
+does not change with the order of the keyword arguments.
+"""
+
+import functools
+from typing import Any
+
+from sqlalchemy import (
+    BindParameter,
+    ColumnElement,
+    Delete,
+    Insert,
+    Select,
+    Update,
+    bindparam,
+    delete,
+    insert,
+    select,
+    update,
+)
+
+from src.config import settings
+
+FILTER_PREFIX = "filter_"
+VALUE_PREFIX = "value_"
+
+shape_cache = functools.lru_cache(maxsize=settings.db_pool.statement_shape_cache_size)
+
+
+def shape(kwargs: dict[str, Any]) -> tuple[tuple[str, ...], tuple[str, ...]]:
+    """
+    Keys filtered by a value and keys filtered by None, which filter_by
+    turns into IS NULL instead of a comparison
+    """
+    keys = sorted(kwargs)
+    return (
+        tuple(key for key in keys if kwargs[key] is not None),
+        tuple(key for key in keys if kwargs[key] is None),
+    )
+
+
+def filter_params(kwargs: dict[str, Any]) -> dict[str, Any]:
+    return {
+        f"{FILTER_PREFIX}{key}": value
+        for key, value in kwargs.items()
+        if value is not None
+    }
+
+
+def value_params(kwargs: dict[str, Any]) -> dict[str, Any]:
+    return {f"{VALUE_PREFIX}{key}": value for key, value in kwargs.items()}
+
+
+def _bind(model: type, key: str, prefix: str) -> BindParameter:
+    # The type is given explicitly, a bare bindparam compared to a column
+    # of a TypeDecorator such as EmailType would skip its bind processing
+    return bindparam(f"{prefix}{key}", type_=model.__table__.c[key].type)
+
+
+def _where(
+    model: type, filters: tuple[str, ...], nulls: tuple[str, ...]
+) -> list[ColumnElement]:
+    return [
+        *(getattr(model, key) == _bind(model, key, FILTER_PREFIX) for key in filters),
+        *(getattr(model, key).is_(None) for key in nulls),
+    ]
+
+
+def _values(model: type, keys: tuple[str, ...]) -> dict[str, BindParameter]:
+    return {key: _bind(model, key, VALUE_PREFIX) for key in keys}
+
+
+@shape_cache
+def select_statement(
+    model: type,
+    filters: tuple[str, ...],
+    nulls: tuple[str, ...],
+    columns: tuple[ColumnElement, ...] | None = None,
+) -> Select:
+    """
+    Select of the entities, or of the columns when given
+    """
+    return select(*(columns or (model,))).where(*_where(model, filters, nulls))
+
+
+@shape_cache
+def insert_statement(
+    model: type, keys: tuple[str, ...], returning: ColumnElement | type | None = None
+) -> Insert:
+    query = insert(model).values(_values(model, keys))
+    if returning is not None:
+        query = query.returning(returning)
+    return query
+
+
+@shape_cache
+def update_statement(
+    model: type, filters: tuple[str, ...], keys: tuple[str, ...]
+) -> Update:
+    # The values are bound parameters, synchronizing the session would copy
+    # their missing values into the entities already loaded, the RETURNING
+    # row overwrites these entities instead
+    return (
+        update(model)
+        .where(*_where(model, filters, ()))
+        .values(_values(model, keys))
+        .returning(model)
+        .execution_options(synchronize_session=False, populate_existing=True)
+    )
+
+
+@shape_cache
+def delete_statement(
+    model: type, filters: tuple[str, ...], nulls: tuple[str, ...]
+) -> Delete:
+    return delete(model).where(*_where(model, filters, nulls))
+
+
+def shape_cache_info() -> dict[str, functools._CacheInfo]:
+    return {
+        builder.__name__: builder.cache_info()
+        for builder in (
+            select_statement,
+            insert_statement,
+            update_statement,
+            delete_statement,
+        )
+    }
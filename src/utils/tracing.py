@@ -0,0 +1,245 @@
+import functools
+import inspect
+import random
+import threading
+import time
+from collections.abc import Callable, Iterator, Sequence
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any
+
+from loguru import logger
+
+from src.config import settings
+
+try:
+    from opentelemetry import context as otel_context
+    from opentelemetry import propagate, trace
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import ReadableSpan, SpanProcessor, TracerProvider
+    from opentelemetry.sdk.trace.export import (
+        BatchSpanProcessor,
+        SpanExporter,
+        SpanExportResult,
+    )
+    from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+    from opentelemetry.trace import SpanKind, StatusCode
+except ImportError:  # pragma: no cover - tracing extra is not installed
+    trace = None
+
+tracer = None
+
+
+def setup_tracing() -> None:
+    """
+    Install the tracer provider when tracing is enabled in the settings
+    and the tracing extra is installed, otherwise spans are no-ops
+    """
+    global tracer
+    if not settings.tracing.enabled:
+        return
+    if trace is None:
+        logger.warning("Tracing is enabled but opentelemetry-sdk is not installed")
+        return
+
+    provider = TracerProvider(
+        resource=Resource.create({"service.name": settings.tracing.service_name}),
+        sampler=ParentBased(TraceIdRatioBased(settings.tracing.head_sample_ratio)),
+    )
+    processor = BatchSpanProcessor(_create_exporter())
+    if settings.tracing.tail_sampling:
+        processor = TailSamplingProcessor(processor)
+    provider.add_span_processor(processor)
+    trace.set_tracer_provider(provider)
+    tracer = trace.get_tracer("src")
+
+
+def shutdown_tracing() -> None:
+    if tracer is not None:
+        trace.get_tracer_provider().shutdown()
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Any]:
+    if tracer is None:
+        yield None
+        return
+    with tracer.start_as_current_span(name, attributes=attributes) as current:
+        yield current
+
+
+@contextmanager
+def server_span(name: str, headers: dict[str, str]) -> Iterator[Any]:
+    """
+    Root span of a request continuing the trace of the incoming traceparent
+    """
+    if tracer is None:
+        yield None
+        return
+    parent = propagate.extract(headers)
+    with tracer.start_as_current_span(
+        name, context=parent, kind=SpanKind.SERVER
+    ) as current:
+        yield current
+
+
+def traced(name: str) -> Callable:
+    """
+    Decorator running a sync or async function inside a span
+    """
+
+    def decorator(func: Callable) -> Callable:
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(name):
+                    return await func(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def bind_trace_context(func: Callable) -> Callable:
+    """
+    Capture the current trace context so that a background task started
+    after the response is still reported under the request trace
+    """
+    if tracer is None:
+        return func
+    captured = otel_context.get_current()
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        token = otel_context.attach(captured)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            otel_context.detach(token)
+
+    return wrapper
+
+
+if trace is not None:
+
+    class FileSpanExporter(SpanExporter):
+        """
+        Writes finished spans as JSON lines, used by tests and local runs
+        """
+
+        def __init__(self, path: Path) -> None:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self.file = open(path, "a", encoding="utf-8")
+            self.lock = threading.Lock()
+
+        def export(self, spans: Sequence[ReadableSpan]) -> SpanExportResult:
+            with self.lock:
+                for finished in spans:
+                    self.file.write(finished.to_json(indent=None) + "\n")
+                self.file.flush()
+            return SpanExportResult.SUCCESS
+
+        def shutdown(self) -> None:
+            self.file.close()
+
+    class TailSamplingProcessor(SpanProcessor):
+        """
+        Buffers the spans of a trace until its local root span ends and
+        forwards the whole trace only when it failed, was slow or falls
+        into tail_sample_ratio. Head sampling decides first, so keep
+        head_sample_ratio at 1.0 to let every trace reach this processor.
+
+        The decision is remembered for tail_decision_ttl_seconds, a span
+        ending after its root, such as the one of a background task, is
+        forwarded or dropped with the rest of its trace. Spans buffered
+        that long without their root ending are decided without it
+        """
+
+        def __init__(self, delegate: SpanProcessor) -> None:
+            self.delegate = delegate
+            # Both in the order the traces were first seen, the oldest
+            # entries are evicted from the front
+            self.traces: dict[int, tuple[float, list[ReadableSpan]]] = {}
+            self.decisions: dict[int, tuple[float, bool]] = {}
+            self.lock = threading.Lock()
+
+        def on_start(self, span, parent_context=None) -> None:
+            self.delegate.on_start(span, parent_context=parent_context)
+
+        def on_end(self, span: ReadableSpan) -> None:
+            trace_id = span.context.trace_id
+            now = time.monotonic()
+            with self.lock:
+                expired = self._evict(now)
+                kept: list[ReadableSpan] = []
+                if trace_id in self.decisions:
+                    if self.decisions[trace_id][1]:
+                        kept = [span]
+                else:
+                    self.traces.setdefault(trace_id, (now, []))[1].append(span)
+                    if span.parent is None or span.parent.is_remote:
+                        spans = self.traces.pop(trace_id)[1]
+                        keep = self._keep(spans, root=span)
+                        self.decisions[trace_id] = (now, keep)
+                        if keep:
+                            kept = spans
+            for orphans in expired:
+                if self._keep(orphans, root=None):
+                    self._forward(orphans)
+            self._forward(kept)
+
+        def shutdown(self) -> None:
+            self.delegate.shutdown()
+
+        def force_flush(self, timeout_millis: int = 30000) -> bool:
+            return self.delegate.force_flush(timeout_millis)
+
+        def _forward(self, spans: list[ReadableSpan]) -> None:
+            for finished in spans:
+                self.delegate.on_end(finished)
+
+        def _evict(self, now: float) -> list[list[ReadableSpan]]:
+            """
+            Drop the expired decisions, returns the expired buffered traces
+            """
+            deadline = now - settings.tracing.tail_decision_ttl_seconds
+            while self.decisions:
+                trace_id, (decided_at, _) = next(iter(self.decisions.items()))
+                if decided_at > deadline:
+                    break
+                del self.decisions[trace_id]
+            expired = []
+            while self.traces:
+                trace_id, (first_seen_at, spans) = next(iter(self.traces.items()))
+                if first_seen_at > deadline:
+                    break
+                del self.traces[trace_id]
+                expired.append(spans)
+            return expired
+
+        @staticmethod
+        def _keep(spans: list[ReadableSpan], root: ReadableSpan | None) -> bool:
+            if any(s.status.status_code is StatusCode.ERROR for s in spans):
+                return True
+            if root is not None:
+                duration_ms = (root.end_time - root.start_time) / 1_000_000
+                if duration_ms >= settings.tracing.tail_latency_threshold_ms:
+                    return True
+            return random.random() < settings.tracing.tail_sample_ratio
+
+    def _create_exporter() -> SpanExporter:
+        if settings.tracing.exporter == "file":
+            return FileSpanExporter(settings.tracing.file_path)
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import (
+            OTLPSpanExporter,
+        )
+
+        return OTLPSpanExporter(endpoint=settings.tracing.otlp_endpoint)
@@ -6,6 +6,7 @@ from typing import Any
 
 from src.database.db import async_session_maker
 from src.repositories import ReferalCodeRepository, UserRepository
+from src.utils.tracing import span
 
 AsyncFunc = Callable[..., Awaitable[Any]]
 
@@ -72,7 +73,8 @@ class UnitOfWork(AbstractUnitOfWork):
 def transaction_mode(func: AsyncFunc) -> AsyncFunc:
     @functools.wraps(func)
     async def wrapper(self: Any, *args: Any, **kwargs: Any) -> Any:
-        async with self.uow:
-            return await func(self, *args, **kwargs)
+        with span(f"transaction {func.__qualname__}"):
+            async with self.uow:
+                return await func(self, *args, **kwargs)
 
     return wrapper
@@ -0,0 +1,156 @@
+import hashlib
+import math
+import time
+from collections.abc import Iterable, Sequence
+from typing import NamedTuple
+
+from loguru import logger
+from redis.exceptions import RedisError
+
+from src.config import settings
+from src.database.redis import delete_many, set_many
+from src.utils.metrics import EMAIL_DEDUP_CLAIMS
+
+
+class SendKey(NamedTuple):
+    recipient: str
+    referer_id: int
+    referal_code: int
+
+    def __str__(self) -> str:
+        return f"{self.referer_id}:{self.referal_code}:{self.recipient.lower()}"
+
+
+class BloomFilter:
+    """
+    Set membership with no false negatives and error_rate false positives
+    once capacity items were added, in a fixed amount of memory
+    """
+
+    def __init__(self, capacity: int, error_rate: float) -> None:
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def add(self, item: str) -> None:
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(
+            self.bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(item)
+        )
+
+    def _positions(self, item: str) -> list[int]:
+        # Double hashing, the k positions are derived from two 64 bit hashes
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+
+class SendDeduplicator:
+    """
+    Claims a send of a referal code to a recipient for the cooldown, the
+    claim is an atomic SET NX EX in Redis so only one of the workers sends.
+
+    The emails this worker sent are also kept in two generations of
+    Bloom filters rotated every half cooldown, a filter hit is answered
+    without Redis. An entry lives between half and a whole cooldown,
+    so the filter never suppresses a send the cooldown would allow,
+    apart from its false positives
+    """
+
+    def __init__(self) -> None:
+        self.cooldown = settings.email_dedup.cooldown_seconds
+        self._current = self._new_filter()
+        self._previous = self._new_filter()
+        self._generation = self._generation_at(time.monotonic())
+
+    async def claim(self, keys: Sequence[SendKey]) -> list[bool]:
+        """
+        Returns for every key whether it was claimed, False when the
+        same email was sent within the cooldown. The claims are settled
+        once it is known which of the emails were sent
+        """
+        self._rotate()
+        names = [str(key) for key in keys]
+        claimed = [False] * len(keys)
+        remote = [
+            index
+            for index, name in enumerate(names)
+            if name not in self._current and name not in self._previous
+        ]
+        EMAIL_DEDUP_CLAIMS.labels("local_duplicate").inc(len(keys) - len(remote))
+        if not remote:
+            return claimed
+
+        try:
+            replies = await set_many(
+                {
+                    f"{settings.email_dedup.prefix}:{names[index]}": 1
+                    for index in remote
+                },
+                ex=self.cooldown,
+                nx=True,
+            )
+        except RedisError as ex:
+            # Sending twice is better than not sending at all
+            logger.warning(f"Email dedup storage failed with error: {ex}")
+            EMAIL_DEDUP_CLAIMS.labels("error").inc(len(remote))
+            replies = [True] * len(remote)
+        else:
+            duplicates = replies.count(False)
+            EMAIL_DEDUP_CLAIMS.labels("duplicate").inc(duplicates)
+            EMAIL_DEDUP_CLAIMS.labels("claimed").inc(len(remote) - duplicates)
+
+        for index, reply in zip(remote, replies):
+            claimed[index] = bool(reply)
+        return claimed
+
+    async def settle(self, sent: Iterable[SendKey], unsent: Sequence[SendKey]) -> None:
+        """
+        Keep the claims of the emails sent, also in the local filter, and
+        give up those of the emails that failed or were not sent, the
+        recipient may get them again without waiting for the cooldown
+        """
+        for key in sent:
+            self._current.add(str(key))
+        await self.release(unsent)
+
+    async def release(self, keys: Sequence[SendKey]) -> None:
+        """
+        Give up claims of emails that will not be sent after all
+        """
+        if not keys:
+            return
+        try:
+            await delete_many(f"{settings.email_dedup.prefix}:{key}" for key in keys)
+        except RedisError as ex:
+            logger.warning(f"Email dedup storage failed with error: {ex}")
+
+    def _rotate(self) -> None:
+        # Generations are aligned on half cooldowns: an entry added during
+        # one is kept in the filters until the end of the next one
+        generation = self._generation_at(time.monotonic())
+        if generation == self._generation:
+            return
+        if generation == self._generation + 1:
+            self._previous = self._current
+        else:
+            self._previous = self._new_filter()
+        self._current = self._new_filter()
+        self._generation = generation
+
+    def _generation_at(self, now: float) -> int:
+        return int(now // (self.cooldown / 2))
+
+    @staticmethod
+    def _new_filter() -> BloomFilter:
+        return BloomFilter(
+            settings.email_dedup.local_capacity, settings.email_dedup.local_error_rate
+        )
+
+
+send_deduplicator = SendDeduplicator()
@@ -1,10 +1,16 @@
-import smtplib
+from collections.abc import Sequence
 from email.message import EmailMessage
 
+from anyio import from_thread
 from fastapi import BackgroundTasks
+from loguru import logger
 from pydantic import EmailStr
 
 from src.config import settings
+from src.utils.lifecycle import background_work
+from src.utils.tracing import bind_trace_context, traced
+from src.workers.dedup import SendKey, send_deduplicator
+from src.workers.smtp import smtp_batch_session, smtp_session
 
 
 def get_email_template_referal_code(
@@ -31,12 +37,37 @@ def get_email_template_referal_code(
     return email
 
 
+def warm_up_email_template() -> None:
+    """
+    The email package imports and caches its header and charset helpers
+    on first use, build one message before the first real send
+    """
+    get_email_template_referal_code(
+        "warm-up", "warm-up@example.com", 0, "", ""
+    ).as_bytes()
+
+
+def settle_sends(send_keys: Sequence[SendKey], unsent: Sequence[int]) -> None:
+    """
+    Settle the dedup claims of the sends from the thread pool, the claims
+    of the emails not sent are given up
+    """
+    failed = set(unsent)
+    from_thread.run(
+        send_deduplicator.settle,
+        [key for position, key in enumerate(send_keys) if position not in failed],
+        [send_keys[position] for position in unsent],
+    )
+
+
+@traced("smtp.send")
 def send_email_report_referal_code(
     username: str,
     email_to: EmailStr,
     invite_code: int,
     href: str,
     href_name: str,
+    send_key: SendKey,
 ) -> None:
     email = get_email_template_referal_code(
         username,
@@ -45,9 +76,32 @@ def send_email_report_referal_code(
         href,
         href_name,
     )
-    with smtplib.SMTP_SSL(settings.SMTP_HOST, settings.SMTP_PORT) as server:
-        server.login(settings.SMTP_USER, settings.SMTP_PASSWORD)
-        server.send_message(email)
+    unsent = smtp_session.send([email], stop=background_work.stopping)
+    settle_sends([send_key], unsent)
+
+
+@traced("smtp.send_batch")
+def send_email_reports_referal_code(
+    send_keys: Sequence[SendKey],
+    invite_code: int,
+    href: str,
+    href_name: str,
+) -> None:
+    unsent = smtp_batch_session.send(
+        (
+            get_email_template_referal_code(
+                key.recipient, key.recipient, invite_code, href, href_name
+            )
+            for key in send_keys
+        ),
+        stop=background_work.stopping,
+    )
+    settle_sends(send_keys, unsent)
+    if background_work.stopping.is_set():
+        logger.warning(
+            f"Email batch stopped on shutdown, {len(send_keys) - len(unsent)} "
+            f"of {len(send_keys)} emails sent"
+        )
 
 
 def get_referal_code_report(
@@ -55,14 +109,36 @@ def get_referal_code_report(
     email_to: EmailStr,
     username: str,
     referal_code: int,
+    send_key: SendKey,
     href: str = "",
     href_name: str = "",
 ):
     background_tasks.add_task(
-        send_email_report_referal_code,
+        background_work.tracked(bind_trace_context(send_email_report_referal_code)),
         username=username,
         email_to=email_to,
         invite_code=referal_code,
         href=href,
         href_name=href_name,
+        send_key=send_key,
+    )
+
+
+def get_referal_code_reports(
+    background_tasks: BackgroundTasks,
+    send_keys: Sequence[SendKey],
+    referal_code: int,
+    href: str = "",
+    href_name: str = "",
+):
+    """
+    Queue the emails of a batch, one to the recipient of every send key,
+    as a single task sending them all on the batch SMTP session
+    """
+    background_tasks.add_task(
+        background_work.tracked(bind_trace_context(send_email_reports_referal_code)),
+        send_keys=list(send_keys),
+        invite_code=referal_code,
+        href=href,
+        href_name=href_name,
     )
@@ -0,0 +1,116 @@
+import smtplib
+import threading
+import time
+from collections.abc import Iterable
+from email.message import EmailMessage
+
+from loguru import logger
+
+from src.config import settings
+from src.utils.metrics import SMTP_SEND_DURATION, SMTP_SEND_FAILURES
+
+
+class SMTPSession:
+    """
+    SMTP connection kept open between sends, the TCP and TLS handshakes and
+    the login are paid once per session instead of once per email. A session
+    idle for longer than smtp_idle_timeout_seconds is closed before it is
+    reused, servers drop idle clients. The sends run in the thread pool,
+    a lock keeps their messages from interleaving on the connection
+    """
+
+    def __init__(self) -> None:
+        self._server: smtplib.SMTP | None = None
+        self._used_at = 0.0
+        self._lock = threading.Lock()
+
+    def send(
+        self,
+        messages: Iterable[EmailMessage],
+        stop: threading.Event | None = None,
+    ) -> list[int]:
+        """
+        Send the messages one after the other on the session, a failed
+        message is counted and logged without stopping the others. The
+        lock is taken for every message, the batches sharing a session take
+        turns message by message. Once stop is set the messages left
+        are not sent. Returns the positions of the messages not sent
+        """
+        unsent = []
+        for position, message in enumerate(messages):
+            if stop is not None and stop.is_set():
+                unsent.append(position)
+                continue
+            with self._lock, SMTP_SEND_DURATION.time():
+                try:
+                    self._send_one(message)
+                except (smtplib.SMTPException, OSError) as ex:
+                    SMTP_SEND_FAILURES.inc()
+                    logger.warning(f"Email to {message['To']} failed: {ex!r}")
+                    unsent.append(position)
+        return unsent
+
+    def close(self) -> None:
+        # A send still running after the shutdown drain keeps its session
+        if not self._lock.acquire(timeout=settings.emails.smtp_timeout_seconds):
+            return
+        try:
+            self._disconnect()
+        finally:
+            self._lock.release()
+
+    def _send_one(self, message: EmailMessage) -> None:
+        for attempt in range(2):
+            reused = self._server is not None
+            try:
+                self._connection().send_message(message)
+            except smtplib.SMTPServerDisconnected:
+                self._disconnect()
+                # The server may have closed a reused session since its last send
+                if reused and not attempt:
+                    continue
+                raise
+            except smtplib.SMTPRecipientsRefused:
+                # The session is still usable, only this message is refused
+                raise
+            except (smtplib.SMTPException, OSError):
+                self._disconnect()
+                raise
+            self._used_at = time.monotonic()
+            return
+
+    def _connection(self) -> smtplib.SMTP:
+        idle = time.monotonic() - self._used_at
+        if (
+            self._server is not None
+            and idle > settings.emails.smtp_idle_timeout_seconds
+        ):
+            self._disconnect()
+        if self._server is None:
+            smtp_class = smtplib.SMTP_SSL if settings.SMTP_SSL else smtplib.SMTP
+            server = smtp_class(
+                settings.SMTP_HOST,
+                int(settings.SMTP_PORT),
+                timeout=settings.emails.smtp_timeout_seconds,
+            )
+            try:
+                server.login(settings.SMTP_USER, settings.SMTP_PASSWORD)
+            except BaseException:
+                server.close()
+                raise
+            self._server = server
+        return self._server
+
+    def _disconnect(self) -> None:
+        if self._server is None:
+            return
+        server, self._server = self._server, None
+        try:
+            server.quit()
+        except (smtplib.SMTPException, OSError):
+            server.close()
+
+
+# Batches have a session of their own, a single email never waits for one
+smtp_session = SMTPSession()
+smtp_batch_session = SMTPSession()
@@ -0,0 +1,168 @@
+import os
+import smtplib
+import threading
+from email.message import EmailMessage
+
+# Settings are read when src is first imported, the environment of CI or of
+# a .env file takes precedence over these defaults of a local run
+for name, value in {
+    "MODE": "TEST",
+    "DB_HOST": "localhost",
+    "DB_PORT": "5432",
+    "DB_USER": "postgres",
+    "DB_PASS": "postgres",
+    "DB_NAME": "postgres",
+    "REDIS_HOST": "localhost",
+    "REDIS_PORT": "6379",
+    "SMTP_USER": "test",
+    "SMTP_PASSWORD": "test",
+    "SMTP_HOST": "localhost",
+    "SMTP_PORT": "1025",
+    "EMAIL_HUNTER_API_KEY": "test",
+    "CLEARBIT_API_KEY": "test",
+}.items():
+    os.environ.setdefault(name, value)
+
+import pytest  # noqa: E402
+from fakeredis import FakeServer, aioredis  # noqa: E402
+from sqlalchemy import text  # noqa: E402
+from sqlalchemy.exc import SQLAlchemyError  # noqa: E402
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker  # noqa: E402
+
+from src.api.referal_codes.v1 import referal_cache  # noqa: E402
+from src.api.users.v1.service import user_service  # noqa: E402
+from src.database import redis  # noqa: E402
+from src.database.db import async_engine  # noqa: E402
+from src.utils import quota, unit_of_work  # noqa: E402
+from src.workers.dedup import SendDeduplicator  # noqa: E402
+from src.workers.smtp import smtp_batch_session, smtp_session  # noqa: E402
+
+
+@pytest.fixture
+def anyio_backend() -> str:
+    return "asyncio"
+
+
+@pytest.fixture
+async def fake_redis():
+    # A server of its own, no state is shared between the tests
+    client = aioredis.FakeRedis(server=FakeServer())
+    yield client
+    await client.close()
+
+
+@pytest.fixture
+async def db_connection():
+    """
+    Connection to the database of the DB_* settings in a transaction rolled
+    back after the test, the test is skipped when it is not migrated
+    """
+    try:
+        conn = await async_engine.connect()
+    except (OSError, SQLAlchemyError) as error:
+        pytest.skip(f"Postgres is not available: {error}")
+    try:
+        transaction = await conn.begin()
+        migrated = await conn.scalar(text("SELECT to_regclass('alembic_version')"))
+        if migrated is None:
+            pytest.skip("Postgres is not migrated, run alembic upgrade head")
+        yield conn
+        await transaction.rollback()
+    finally:
+        await conn.close()
+        # The pooled connections belong to the event loop of this test
+        await async_engine.dispose()
+
+
+@pytest.fixture
+async def db_session(db_connection):
+    """
+    Session whose commits only release a savepoint of the test transaction
+    """
+    async with AsyncSession(
+        bind=db_connection,
+        autoflush=False,
+        expire_on_commit=False,
+        join_transaction_mode="create_savepoint",
+    ) as session:
+        yield session
+
+
+@pytest.fixture
+def services(db_connection, fake_redis, monkeypatch) -> None:
+    """
+    The services run their transactions in the test transaction, their
+    commits do not commit it, and use fakeredis
+    """
+    monkeypatch.setattr(
+        unit_of_work,
+        "async_session_maker",
+        async_sessionmaker(
+            bind=db_connection,
+            class_=AsyncSession,
+            autoflush=False,
+            expire_on_commit=False,
+            join_transaction_mode="rollback_only",
+        ),
+    )
+    monkeypatch.setattr(redis, "redis_client", fake_redis)
+    monkeypatch.setattr(referal_cache, "redis_client", fake_redis)
+    monkeypatch.setattr(
+        quota, "take_quota", fake_redis.register_script(quota.TAKE_QUOTA_SCRIPT)
+    )
+    monkeypatch.setattr(user_service, "send_deduplicator", SendDeduplicator())
+
+
+class FakeSMTP:
+    """
+    SMTP server connection refusing the recipients in refused and holding
+    the sends to the recipients in held until release is set
+    """
+
+    sent: list[str]
+    refused: set[str]
+    held: set[str]
+    holding: threading.Event
+    release: threading.Event
+
+    def __init__(self, host: str, port: int, timeout: float) -> None:
+        pass
+
+    def login(self, user: str, password: str) -> None:
+        pass
+
+    def send_message(self, message: EmailMessage) -> None:
+        recipient = message["To"]
+        if recipient in self.refused:
+            raise smtplib.SMTPRecipientsRefused({recipient: (550, b"Refused")})
+        if recipient in self.held:
+            self.holding.set()
+            assert self.release.wait(timeout=5)
+        self.sent.append(recipient)
+
+    def quit(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+@pytest.fixture
+def smtp_server(monkeypatch):
+    fake = type(
+        "Server",
+        (FakeSMTP,),
+        {
+            "sent": [],
+            "refused": set(),
+            "held": set(),
+            "holding": threading.Event(),
+            "release": threading.Event(),
+        },
+    )
+    monkeypatch.setattr(smtplib, "SMTP", fake)
+    monkeypatch.setattr(smtplib, "SMTP_SSL", fake)
+    yield fake
+    # The sessions of the worker keep their connection to this server
+    smtp_session.close()
+    smtp_batch_session.close()
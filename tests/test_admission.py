@@ -0,0 +1,126 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import event
+
+from src.config import settings
+from src.database.db import async_engine
+from src.middlewares.admission import (
+    AUTH,
+    BULK,
+    READS,
+    AdmissionController,
+    AdmissionControlMiddleware,
+)
+
+pytestmark = pytest.mark.anyio
+
+CAPPED_ROUTE = "/api/users/email_exists"
+
+
+@pytest.fixture
+def middleware():
+    middleware = AdmissionControlMiddleware(app=None)
+    yield middleware
+    event.remove(
+        async_engine.sync_engine, "after_cursor_execute", middleware._observe_query
+    )
+
+
+async def queued(controller: AdmissionController, priority: str, route: str):
+    task = asyncio.create_task(controller.acquire(priority, route))
+    await asyncio.sleep(0)
+    assert not task.done()
+    return task
+
+
+async def test_route_capped_waiter_does_not_block_other_routes():
+    controller = AdmissionController()
+    controller.limit.value = 20
+    route_limit = settings.admission.route_limits[CAPPED_ROUTE]
+    for _ in range(route_limit):
+        assert await controller.acquire(READS, CAPPED_ROUTE)
+    capped = await queued(controller, READS, CAPPED_ROUTE)
+
+    admitted = await asyncio.wait_for(
+        controller.acquire(READS, "/api/users/user_info"), timeout=0.1
+    )
+    assert admitted
+    assert not capped.done()
+
+    controller.release(READS, CAPPED_ROUTE)
+    assert await asyncio.wait_for(capped, timeout=0.1)
+    assert controller.route_in_flight[CAPPED_ROUTE] == route_limit
+
+
+async def test_waiters_are_admitted_by_priority():
+    controller = AdmissionController()
+    controller.limit.value = 2
+    assert await controller.acquire(AUTH, "/api/auth/jwt/login")
+    assert await controller.acquire(AUTH, "/api/auth/jwt/login")
+    bulk = await queued(controller, BULK, "/api/users/invite")
+    auth = await queued(controller, AUTH, "/api/auth/jwt/login")
+
+    controller.release(AUTH, "/api/auth/jwt/login")
+    assert await asyncio.wait_for(auth, timeout=0.1)
+    assert not bulk.done()
+    bulk.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await bulk
+    assert not controller.waiters
+
+
+async def test_registration_is_admitted_ahead_of_reads(middleware):
+    register = {"type": "http", "method": "POST", "path": "/api/users/register"}
+    invite = {"type": "http", "method": "POST", "path": "/api/users/invite"}
+    update = {"type": "http", "method": "PUT", "path": "/api/users/update_user_info"}
+    assert middleware._classify(register) == AUTH
+    assert middleware._classify(invite) == BULK
+    assert middleware._classify(update) == READS
+
+    controller = middleware.controller
+    controller.limit.value = 10
+    for _ in range(8):
+        assert await controller.acquire(READS, "/api/users/user_info")
+    # Over the share of the reads, the registration is still admitted
+    read = await queued(controller, READS, "/api/users/user_info")
+    assert await asyncio.wait_for(
+        controller.acquire(AUTH, register["path"]), timeout=0.1
+    )
+    assert not read.done()
+    read.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await read
+
+
+def test_limit_is_capped_at_the_pool_connections(monkeypatch):
+    monkeypatch.setattr(settings, "WEB_CONCURRENCY", 1)
+    monkeypatch.setattr(settings.db_pool, "replicas", 1)
+    monkeypatch.setattr(settings.db_pool, "connection_budget", 12)
+    monkeypatch.setattr(settings.admission, "adjust_interval_seconds", 0.0)
+    controller = AdmissionController()
+    assert int(controller.limit) == 12
+
+    for _ in range(5):
+        controller.observe_db_latency(0.001)
+    assert int(controller.limit) == 12
+
+
+def test_pool_checkout_wait_counts_in_the_latency(middleware, monkeypatch):
+    monkeypatch.setattr(settings.admission, "adjust_interval_seconds", 60.0)
+    conn = SimpleNamespace(info={"query_started_at": [], "checkout_wait": 0.5})
+
+    for _ in range(2):
+        conn.info["query_started_at"].append(time.perf_counter())
+        middleware._observe_query(conn, None, "SELECT 1", (), None, False)
+
+    # Only the first query of the checkout waited for the connection
+    assert "checkout_wait" not in conn.info
+    assert middleware.controller.limit.samples == 2
+    assert 0.5 <= middleware.controller.limit.total_latency < 1.0
+
+
+async def test_pool_records_the_checkout_wait(db_connection):
+    assert db_connection.sync_connection.info["checkout_wait"] >= 0
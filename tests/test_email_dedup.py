@@ -0,0 +1,69 @@
+import pytest
+
+from src.config import settings
+from src.database import redis
+from src.utils.lifecycle import BackgroundWork
+from src.workers import email_task
+from src.workers.dedup import SendDeduplicator, SendKey
+from src.workers.email_task import (
+    send_email_report_referal_code,
+    send_email_reports_referal_code,
+)
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def deduplicator(fake_redis, monkeypatch) -> SendDeduplicator:
+    monkeypatch.setattr(redis, "redis_client", fake_redis)
+    deduplicator = SendDeduplicator()
+    monkeypatch.setattr(email_task, "send_deduplicator", deduplicator)
+    return deduplicator
+
+
+def claim_name(key: SendKey) -> str:
+    return f"{settings.email_dedup.prefix}:{key}"
+
+
+async def test_sent_email_keeps_its_claim(deduplicator, fake_redis, smtp_server):
+    key = SendKey("friend@example.com", 1, 123456)
+    assert await deduplicator.claim([key]) == [True]
+
+    await BackgroundWork().tracked(send_email_report_referal_code)(
+        "friend@example.com", "friend@example.com", 123456, "", "", send_key=key
+    )
+
+    assert smtp_server.sent == ["friend@example.com"]
+    assert await fake_redis.exists(claim_name(key))
+    assert await deduplicator.claim([key]) == [False]
+
+
+async def test_failed_email_releases_its_claim(deduplicator, fake_redis, smtp_server):
+    smtp_server.refused = {"friend@example.com"}
+    key = SendKey("friend@example.com", 1, 123456)
+    assert await deduplicator.claim([key]) == [True]
+
+    await BackgroundWork().tracked(send_email_report_referal_code)(
+        "friend@example.com", "friend@example.com", 123456, "", "", send_key=key
+    )
+
+    assert not await fake_redis.exists(claim_name(key))
+    assert await deduplicator.claim([key]) == [True]
+
+
+async def test_batch_releases_the_claims_of_failed_emails(
+    deduplicator, fake_redis, smtp_server
+):
+    smtp_server.refused = {"second@example.com"}
+    keys = [
+        SendKey(recipient, 1, 123456)
+        for recipient in ("first@example.com", "second@example.com")
+    ]
+    assert await deduplicator.claim(keys) == [True, True]
+
+    await BackgroundWork().tracked(send_email_reports_referal_code)(
+        keys, 123456, "", ""
+    )
+
+    assert smtp_server.sent == ["first@example.com"]
+    assert await deduplicator.claim(keys) == [False, True]
@@ -0,0 +1,46 @@
+import random
+
+import bcrypt
+
+from src.generate_data import generate_codes, generate_users, parse_args, seeded_salt
+
+ARGS = ["--users", "500", "--codes", "300", "--active-share", "0.5"]
+
+
+def generate(argv: list[str]) -> tuple[bytes, list[tuple], list[tuple]]:
+    args = parse_args(argv)
+    rng = random.Random(args.seed)
+    password = bcrypt.hashpw(args.password.encode(), seeded_salt(rng))
+    users = list(generate_users(args, 1, password, rng))
+    codes = list(generate_codes(args, 1, 1, rng))
+    return password, users, codes
+
+
+def test_same_seed_and_reference_date_generate_the_same_rows():
+    argv = ARGS + ["--seed", "7", "--reference-date", "2026-01-15"]
+    password, users, codes = generate(argv)
+
+    assert generate(argv) == (password, users, codes)
+    assert bcrypt.checkpw(b"password", password)
+    assert any(referer for *_, referer in users)
+    assert any(is_active for _, _, _, is_active, _ in codes)
+
+
+def test_seed_and_reference_date_change_the_rows():
+    generated = generate(ARGS + ["--reference-date", "2026-01-15"])
+    reseeded = generate(ARGS + ["--seed", "8", "--reference-date", "2026-01-15"])
+    _, _, later_codes = generate(ARGS + ["--reference-date", "2026-02-15"])
+
+    assert reseeded != generated
+    assert [row[2] for row in later_codes] != [row[2] for row in generated[2]]
+
+
+def test_users_have_at_most_one_active_code():
+    # More codes than users, every user has several live codes
+    _, _, codes = generate(
+        ["--users", "20", "--codes", "400", "--active-share", "1"]
+        + ["--months-back", "0", "--reference-date", "2026-01-15"]
+    )
+
+    active_owners = [user_id for _, _, _, is_active, user_id in codes if is_active]
+    assert len(active_owners) == len(set(active_owners)) == 20
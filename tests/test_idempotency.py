@@ -0,0 +1,158 @@
+import asyncio
+
+import pytest
+from fakeredis import aioredis as fakeredis
+from fastapi import FastAPI, Request, status
+from fastapi.responses import JSONResponse
+from httpx import ASGITransport, AsyncClient
+
+from src.config import settings
+from src.middlewares import idempotency
+from src.middlewares.idempotency import IdempotencyMiddleware
+
+pytestmark = pytest.mark.anyio
+
+PATH = "/api/users/register"
+
+
+class Endpoint:
+    """
+    Counts its calls and answers with status, or raises error when it is
+    set. Waits for the gate when there is one
+    """
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.status = status.HTTP_201_CREATED
+        self.error: Exception | None = None
+        self.entered = asyncio.Event()
+        self.gate: asyncio.Event | None = None
+
+    async def __call__(self, request: Request) -> JSONResponse:
+        self.calls += 1
+        self.entered.set()
+        if self.gate is not None:
+            await self.gate.wait()
+        if self.error is not None:
+            raise self.error
+        return JSONResponse(
+            {"call": self.calls, **await request.json()}, status_code=self.status
+        )
+
+
+@pytest.fixture
+def endpoint() -> Endpoint:
+    return Endpoint()
+
+
+@pytest.fixture
+async def client(endpoint, fake_redis, monkeypatch):
+    monkeypatch.setattr(idempotency, "redis_client", fake_redis)
+    app = FastAPI()
+
+    @app.post(PATH)
+    async def register(request: Request) -> JSONResponse:
+        return await endpoint(request)
+
+    app.add_middleware(IdempotencyMiddleware)
+    # Exceptions of the endpoint are answered with a 500 as in production
+    transport = ASGITransport(app=app, raise_app_exceptions=False)
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        yield client
+
+
+def post(client: AsyncClient, body: dict, key: str = "key-1"):
+    return client.post(PATH, json=body, headers={settings.idempotency.header: key})
+
+
+async def test_stored_response_is_replayed(client, endpoint):
+    first = await post(client, {"email": "a@example.com"})
+    replayed = await post(client, {"email": "a@example.com"})
+
+    assert endpoint.calls == 1
+    assert first.status_code == replayed.status_code == status.HTTP_201_CREATED
+    assert replayed.json() == first.json() == {"call": 1, "email": "a@example.com"}
+    assert replayed.headers["Idempotent-Replayed"] == "true"
+    assert "Idempotent-Replayed" not in first.headers
+
+
+async def test_requests_without_a_key_are_not_deduplicated(client, endpoint):
+    await client.post(PATH, json={"email": "a@example.com"})
+    await client.post(PATH, json={"email": "a@example.com"})
+
+    assert endpoint.calls == 2
+
+
+async def test_concurrent_duplicate_waits_for_the_first_response(client, endpoint):
+    endpoint.gate = asyncio.Event()
+    first = asyncio.create_task(post(client, {"email": "a@example.com"}))
+    await endpoint.entered.wait()
+    duplicate = asyncio.create_task(post(client, {"email": "a@example.com"}))
+    await asyncio.sleep(0.05)
+    assert not duplicate.done()
+
+    endpoint.gate.set()
+    first, duplicate = await first, await duplicate
+
+    assert endpoint.calls == 1
+    assert duplicate.json() == first.json()
+    assert duplicate.headers["Idempotent-Replayed"] == "true"
+
+
+async def test_key_reused_with_another_body_is_rejected(client, endpoint):
+    await post(client, {"email": "a@example.com"})
+    response = await post(client, {"email": "b@example.com"})
+
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+    assert endpoint.calls == 1
+
+
+async def test_duplicate_gets_409_after_the_wait_timeout(client, endpoint, monkeypatch):
+    monkeypatch.setattr(settings.idempotency, "wait_timeout_seconds", 0.1)
+    endpoint.gate = asyncio.Event()
+    first = asyncio.create_task(post(client, {"email": "a@example.com"}))
+    await endpoint.entered.wait()
+
+    response = await post(client, {"email": "a@example.com"})
+    endpoint.gate.set()
+    await first
+
+    assert response.status_code == status.HTTP_409_CONFLICT
+    assert response.headers["Retry-After"] == "1"
+    assert endpoint.calls == 1
+
+
+async def test_server_error_releases_the_key(client, endpoint):
+    endpoint.status = status.HTTP_503_SERVICE_UNAVAILABLE
+    failed = await post(client, {"email": "a@example.com"})
+    endpoint.status = status.HTTP_201_CREATED
+    retried = await post(client, {"email": "a@example.com"})
+
+    assert failed.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert retried.status_code == status.HTTP_201_CREATED
+    assert "Idempotent-Replayed" not in retried.headers
+    assert endpoint.calls == 2
+
+
+async def test_exception_releases_the_key(client, endpoint, fake_redis):
+    endpoint.error = RuntimeError("boom")
+    failed = await post(client, {"email": "a@example.com"})
+    assert await fake_redis.keys(f"{settings.idempotency.prefix}:*") == []
+
+    endpoint.error = None
+    retried = await post(client, {"email": "a@example.com"})
+
+    assert failed.status_code == status.HTTP_500_INTERNAL_SERVER_ERROR
+    assert retried.status_code == status.HTTP_201_CREATED
+    assert endpoint.calls == 2
+
+
+async def test_redis_error_falls_back_to_processing(client, endpoint, monkeypatch):
+    monkeypatch.setattr(
+        idempotency, "redis_client", fakeredis.FakeRedis(connected=False)
+    )
+    first = await post(client, {"email": "a@example.com"})
+    second = await post(client, {"email": "a@example.com"})
+
+    assert first.status_code == second.status_code == status.HTTP_201_CREATED
+    assert endpoint.calls == 2
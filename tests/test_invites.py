@@ -0,0 +1,110 @@
+from datetime import date, timedelta
+
+import pytest
+from fastapi import BackgroundTasks
+from sqlalchemy import insert
+
+from src.api.users.v1.service import user_service
+from src.api.users.v1.service.user_service import UserService
+from src.config import settings
+from src.models import ReferalCodeModel
+from src.schemas.user_schema import InviteStatus, UserDB
+from src.utils import quota
+from src.utils.quota import DailyQuota
+from src.workers.dedup import SendKey
+
+pytestmark = pytest.mark.anyio
+
+REFERAL_CODE = 4321
+
+
+@pytest.fixture
+async def referer(services, db_connection, monkeypatch) -> UserDB:
+    monkeypatch.setattr(user_service.invite_quota, "limit", 2)
+    referer = await UserService().register_user(
+        {
+            "email": "referer@example.com",
+            "first_name": "Invite",
+            "last_name": "Referer",
+            "password": "password",
+        }
+    )
+    await db_connection.execute(
+        insert(ReferalCodeModel).values(
+            code=REFERAL_CODE,
+            exp_date=date.today() + timedelta(days=30),
+            is_active=True,
+            user_id=referer.id,
+        )
+    )
+    return referer
+
+
+async def invite(referer: UserDB, recipients: list[str]):
+    background_tasks = BackgroundTasks()
+    statuses = await UserService().invite_by_email(
+        referer_email=referer.email,
+        recipients=recipients,
+        background_tasks=background_tasks,
+    )
+    return [recipient.status for recipient in statuses], background_tasks.tasks
+
+
+def send_key(referer: UserDB, recipient: str) -> SendKey:
+    return SendKey(recipient, referer.id, REFERAL_CODE)
+
+
+async def test_every_recipient_gets_its_status(referer, fake_redis):
+    # Sent within the cooldown by an earlier request
+    await user_service.send_deduplicator.claim([send_key(referer, "sent@example.com")])
+
+    statuses, tasks = await invite(
+        referer,
+        [
+            "first@example.com",
+            "not-an-email",
+            "FIRST@example.com",
+            "sent@example.com",
+            "second@example.com",
+            "third@example.com",
+        ],
+    )
+
+    assert statuses == [
+        InviteStatus.QUEUED,
+        InviteStatus.INVALID,
+        InviteStatus.DUPLICATE,
+        InviteStatus.ALREADY_SENT,
+        InviteStatus.QUEUED,
+        InviteStatus.QUOTA_EXCEEDED,
+    ]
+    [task] = tasks
+    assert task.kwargs["send_keys"] == [
+        send_key(referer, "first@example.com"),
+        send_key(referer, "second@example.com"),
+    ]
+    # The recipient over the quota was not claimed, it may be invited tomorrow
+    claim = f"{settings.email_dedup.prefix}:{send_key(referer, 'third@example.com')}"
+    assert not await fake_redis.exists(claim)
+
+
+async def test_spent_quota_queues_nothing(referer):
+    await invite(referer, ["first@example.com", "second@example.com"])
+
+    statuses, tasks = await invite(referer, ["first@example.com", "third@example.com"])
+
+    assert statuses == [InviteStatus.ALREADY_SENT, InviteStatus.QUOTA_EXCEEDED]
+    assert tasks == []
+
+
+async def test_quota_grants_what_is_left(fake_redis, monkeypatch):
+    monkeypatch.setattr(
+        quota, "take_quota", fake_redis.register_script(quota.TAKE_QUOTA_SCRIPT)
+    )
+    daily_quota = DailyQuota("invites", 5)
+
+    assert await daily_quota.take(1, 3) == 3
+    assert await daily_quota.take(1, 3) == 2
+    assert await daily_quota.take(1, 3) == 0
+    assert await daily_quota.take(2, 3) == 3
+    assert await daily_quota.take(2, 0) == 0
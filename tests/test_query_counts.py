@@ -0,0 +1,165 @@
+"""
+Number of queries of every UserService/ReferalCodeService flow, a flow
+going over its limit, e.g. after a lazy load or an N+1 sneaked in,
+fails with the statements it executed.
+"""
+
+from datetime import date, timedelta
+
+import pytest
+from fastapi import BackgroundTasks
+from sqlalchemy import insert
+
+from src.api.referal_codes.v1 import referal_cache
+from src.api.referal_codes.v1.service.referal_code_service import ReferalCodeService
+from src.api.users.v1.service.user_service import UserService
+from src.database.query_stats import assert_max_queries
+from src.models import ReferalCodeModel
+from src.schemas.referal_code_schema import CachedReferalCode
+from src.schemas.user_schema import InviteStatus, UserDB
+
+pytestmark = pytest.mark.anyio
+
+# Codes of the end registration are 4 digits, the others are out of the
+# range of the codes a seeded database has
+REFERAL_CODE = 4321
+NEW_CODE = 987654321
+
+
+def user_data(name: str) -> dict:
+    return {
+        "email": f"{name}@example.com",
+        "first_name": "Query",
+        "last_name": "Count",
+        "password": "password",
+    }
+
+
+@pytest.fixture
+async def referer(services) -> UserDB:
+    return await UserService().register_user(user_data("referer"))
+
+
+@pytest.fixture
+async def referal_code(referer, db_connection) -> int:
+    await db_connection.execute(
+        insert(ReferalCodeModel).values(
+            code=REFERAL_CODE,
+            exp_date=date.today() + timedelta(days=30),
+            is_active=True,
+            user_id=referer.id,
+        )
+    )
+    return REFERAL_CODE
+
+
+@pytest.fixture
+async def cached_code(referer) -> int:
+    await referal_cache.cache_referal_code(
+        code=REFERAL_CODE,
+        referal_code=CachedReferalCode(
+            user_id=referer.id,
+            exp_date=date.today() + timedelta(days=30),
+            is_active=True,
+        ),
+    )
+    return REFERAL_CODE
+
+
+async def test_register_user(services):
+    with assert_max_queries(2):
+        await UserService().register_user(user_data("new"))
+
+
+async def test_user_info(referer):
+    with assert_max_queries(1):
+        await UserService().get_user_info(email=referer.email)
+    with assert_max_queries(1):
+        await UserService().get_user_version(email=referer.email)
+
+
+async def test_update_user_info(referer):
+    with assert_max_queries(2):
+        await UserService().update_user_info(
+            email=referer.email,
+            user_data={"first_name": "Updated", "password": "password"},
+        )
+
+
+async def test_referals_info(referer, cached_code):
+    for name in ("first", "second", "third"):
+        await UserService().end_registration_by_referal_code(
+            referal_code=cached_code, user_data=user_data(name)
+        )
+
+    with assert_max_queries(2):
+        referals = await UserService().get_referals_info(referer_id=referer.id)
+    with assert_max_queries(1):
+        await UserService().get_referals_version(referer_id=referer.id)
+    assert len(referals) == 3
+
+
+async def test_end_registration(referal_code):
+    with assert_max_queries(1):
+        await UserService().end_registration_by_referal_code(
+            referal_code=referal_code, user_data=user_data("uncached")
+        )
+    # The code has been cached, the referal is added without resolving it
+    with assert_max_queries(1):
+        await UserService().end_registration_by_referal_code(
+            referal_code=referal_code, user_data=user_data("cached")
+        )
+
+
+async def test_end_registration_by_cached_code(cached_code):
+    with assert_max_queries(1):
+        referal = await UserService().end_registration_by_referal_code(
+            referal_code=cached_code, user_data=user_data("cached")
+        )
+    assert referal.email == "cached@example.com"
+
+
+async def test_referal_code_by_email(referer, referal_code):
+    background_tasks = BackgroundTasks()
+
+    with assert_max_queries(2):
+        sent = await UserService().get_referal_code_by_email(
+            referer_email=referer.email,
+            user_email="friend@example.com",
+            background_tasks=background_tasks,
+        )
+    assert sent == InviteStatus.QUEUED
+    assert len(background_tasks.tasks) == 1
+
+
+async def test_invite_by_email(referer, referal_code):
+    background_tasks = BackgroundTasks()
+    recipients = [f"friend-{index}@example.com" for index in range(10)]
+
+    with assert_max_queries(2):
+        statuses = await UserService().invite_by_email(
+            referer_email=referer.email,
+            recipients=recipients,
+            background_tasks=background_tasks,
+        )
+    assert {recipient.status for recipient in statuses} == {InviteStatus.QUEUED}
+    assert len(background_tasks.tasks) == 1
+
+
+async def test_referal_code_lifecycle(referer):
+    service = ReferalCodeService()
+
+    with assert_max_queries(2):
+        await service.create_referal_code_by_referer(
+            user_id=referer.id,
+            referal_code_data={"code": NEW_CODE, "days": 30, "is_active": False},
+        )
+    with assert_max_queries(3):
+        await service.activate_referal_code(referal_code=NEW_CODE, user_id=referer.id)
+    with assert_max_queries(2):
+        await service.delete_referal_code(referal_code=NEW_CODE, user_id=referer.id)
+    with assert_max_queries(3):
+        await service.create_referal_code_by_referer(
+            user_id=referer.id,
+            referal_code_data={"code": NEW_CODE, "days": 30, "is_active": True},
+        )
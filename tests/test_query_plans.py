@@ -0,0 +1,233 @@
+"""
+EXPLAIN plan regression tests of every repository query the services run.
+
+Each case calls a UserRepository/ReferalCodeRepository method, including
+the generic SQLAlchemyRepository filters the services use, captures the
+SQL it sends and checks its EXPLAIN (FORMAT JSON) plan. Sequential scans
+are disabled for the planner, so a Seq Scan left in a plan means that no
+index can serve the query whatever the size of the table, and the check
+does not depend on the database being seeded.
+"""
+
+import json
+from collections.abc import Awaitable, Callable, Iterator
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Any
+
+import pytest
+from sqlalchemy import event
+
+from src.database.db import async_engine
+from src.models import ReferalCodeModel, User
+from src.repositories import ReferalCodeRepository, UserRepository
+from src.schemas.user_schema import UserDB
+
+pytestmark = pytest.mark.anyio
+
+DEFAULT_MAX_COST = 100.0
+
+
+@dataclass
+class Sample:
+    """
+    Existing rows the cases look up
+    """
+
+    user_id: int
+    email: str
+    referer_id: int
+    code: int
+    code_user_id: int
+
+
+@dataclass
+class Repositories:
+    user: UserRepository
+    referal_code: ReferalCodeRepository
+
+
+@dataclass
+class PlanCase:
+    name: str
+    call: Callable[[Repositories, Sample], Awaitable[Any]]
+    max_cost: float = DEFAULT_MAX_COST
+
+
+def new_user(suffix: str) -> dict:
+    return {
+        "email": f"explain-{suffix}@example.com",
+        "first_name": "Explain",
+        "last_name": "Plan",
+        "password": b"password",
+    }
+
+
+CASES = [
+    PlanCase(
+        "user.get_by_query_one_or_none(email)",
+        lambda repo, s: repo.user.get_by_query_one_or_none(email=s.email),
+    ),
+    PlanCase(
+        "user.get_by_query_one_or_none(id)",
+        lambda repo, s: repo.user.get_by_query_one_or_none(id=s.user_id),
+    ),
+    PlanCase(
+        "user.get_all_referals_by_referer",
+        lambda repo, s: repo.user.get_all_referals_by_referer(referer_id=s.referer_id),
+    ),
+    PlanCase(
+        "user.get_columns_by_query_one_or_none(email)",
+        lambda repo, s: repo.user.get_columns_by_query_one_or_none(
+            UserDB, email=s.email
+        ),
+    ),
+    PlanCase(
+        "user.get_columns_by_query_all(referer_by)",
+        lambda repo, s: repo.user.get_columns_by_query_all(
+            UserDB, referer_by=s.referer_id
+        ),
+    ),
+    PlanCase(
+        "user.get_referals_version",
+        lambda repo, s: repo.user.get_referals_version(referer_id=s.referer_id),
+    ),
+    PlanCase(
+        "user.update_one_by_email",
+        lambda repo, s: repo.user.update_one_by_email(
+            _email=s.email, first_name="Plan"
+        ),
+    ),
+    PlanCase(
+        "user.add_one_and_get_obj",
+        lambda repo, s: repo.user.add_one_and_get_obj(**new_user("register")),
+    ),
+    PlanCase(
+        "user.add_one_or_none",
+        lambda repo, s: repo.user.add_one_or_none(
+            referer_by=s.code_user_id, **new_user("referal")
+        ),
+    ),
+    PlanCase(
+        "user.add_one_by_referal_code",
+        lambda repo, s: repo.user.add_one_by_referal_code(
+            referal_code=s.code, **new_user("by-code")
+        ),
+    ),
+    # Lookups by code alone have no exp_date to prune partitions with,
+    # so every partition index is probed
+    PlanCase(
+        "referal_code.get_by_query_one_or_none(code)",
+        lambda repo, s: repo.referal_code.get_by_query_one_or_none(code=s.code),
+        max_cost=500,
+    ),
+    PlanCase(
+        "referal_code.get_live_by_query_one_or_none",
+        lambda repo, s: repo.referal_code.get_live_by_query_one_or_none(
+            is_active=True, user_id=s.code_user_id
+        ),
+    ),
+    PlanCase(
+        "referal_code.has_active_code",
+        lambda repo, s: repo.referal_code.has_active_code(user_id=s.code_user_id),
+    ),
+    PlanCase(
+        "referal_code.add_one_and_get_obj",
+        lambda repo, s: repo.referal_code.add_one_and_get_obj(
+            code=s.code,
+            exp_date=date.today() + timedelta(days=30),
+            is_active=False,
+            user_id=s.code_user_id,
+        ),
+    ),
+    PlanCase(
+        "referal_code.update_one_by_code",
+        lambda repo, s: repo.referal_code.update_one_by_code(
+            ref_code=s.code, _user_id=s.code_user_id, is_active=True
+        ),
+    ),
+    PlanCase(
+        "referal_code.delete_by_query",
+        lambda repo, s: repo.referal_code.delete_by_query(
+            code=s.code, user_id=s.code_user_id
+        ),
+        max_cost=500,
+    ),
+]
+
+
+class StatementRecorder:
+    """
+    Collects the SQL and parameters sent by the engine while recording
+    """
+
+    def __init__(self) -> None:
+        self.recording = False
+        self.statements: list[tuple[str, Any]] = []
+
+    def record(self, conn, cursor, statement, parameters, context, executemany):
+        # Savepoints of the session joining the test transaction are not
+        # queries of the repository
+        if self.recording and "SAVEPOINT" not in statement:
+            self.statements.append((statement, parameters))
+
+
+@pytest.fixture
+def recorder():
+    recorder = StatementRecorder()
+    event.listen(async_engine.sync_engine, "before_cursor_execute", recorder.record)
+    yield recorder
+    event.remove(async_engine.sync_engine, "before_cursor_execute", recorder.record)
+
+
+@pytest.fixture
+async def sample(db_session) -> Sample:
+    referer = User(**new_user("referer"))
+    db_session.add(referer)
+    await db_session.flush()
+    referal = User(referer_by=referer.id, **new_user("sample"))
+    referal_code = ReferalCodeModel(
+        code=987654321,
+        exp_date=date.today() + timedelta(days=30),
+        is_active=True,
+        user_id=referer.id,
+    )
+    db_session.add_all([referal, referal_code])
+    await db_session.flush()
+    return Sample(referal.id, referal.email, referer.id, 987654321, referer.id)
+
+
+def walk_plan(node: dict) -> Iterator[dict]:
+    yield node
+    for child in node.get("Plans", []):
+        yield from walk_plan(child)
+
+
+@pytest.mark.parametrize("case", CASES, ids=lambda case: case.name)
+async def test_repository_query_plan(
+    case: PlanCase, sample, db_session, db_connection, recorder
+):
+    recorder.recording = True
+    await case.call(
+        Repositories(UserRepository(db_session), ReferalCodeRepository(db_session)),
+        sample,
+    )
+    recorder.recording = False
+    assert recorder.statements
+
+    await db_connection.exec_driver_sql("SET LOCAL enable_seqscan = off")
+    for statement, parameters in recorder.statements:
+        result = await db_connection.exec_driver_sql(
+            f"EXPLAIN (FORMAT JSON) {statement}", parameters
+        )
+        plan = result.scalar_one()[0]["Plan"]
+        explained = f"{statement}\n{json.dumps(plan, indent=2)}"
+        seq_scans = [
+            node["Relation Name"]
+            for node in walk_plan(plan)
+            if node["Node Type"] == "Seq Scan"
+        ]
+        assert not seq_scans, f"seq scan on {', '.join(seq_scans)}:\n{explained}"
+        assert (
+            plan["Total Cost"] <= case.max_cost
+        ), f"cost {plan['Total Cost']:.1f} is over {case.max_cost:g}:\n{explained}"
@@ -0,0 +1,116 @@
+import pytest
+from fakeredis import aioredis as fakeredis
+from fastapi import Depends, FastAPI, HTTPException
+from httpx import ASGITransport, AsyncClient
+
+from src.config import RateLimit
+from src.utils import rate_limiter
+from src.utils.rate_limiter import RateLimiter, client_ip, rate_limit
+
+pytestmark = pytest.mark.anyio
+
+
+class CountingScript:
+    """
+    The sliding window script of a fake Redis, counting the round trips
+    """
+
+    def __init__(self, client) -> None:
+        self.script = client.register_script(rate_limiter.SLIDING_WINDOW_SCRIPT)
+        self.calls = 0
+
+    async def __call__(self, keys, args):
+        self.calls += 1
+        return await self.script(keys=keys, args=args)
+
+
+@pytest.fixture
+def sliding_window(fake_redis, monkeypatch) -> CountingScript:
+    script = CountingScript(fake_redis)
+    monkeypatch.setattr(rate_limiter, "sliding_window", script)
+    return script
+
+
+async def test_sliding_window_is_shared_between_workers(sliding_window, fake_redis):
+    limit = RateLimit(times=3, seconds=60)
+    # Two workers, each with its own token bucket
+    first, second = RateLimiter("login", limit), RateLimiter("login", limit)
+    await first.hit("10.0.0.1")
+    await first.hit("10.0.0.1")
+    await second.hit("10.0.0.1")
+
+    with pytest.raises(HTTPException) as exc_info:
+        await second.hit("10.0.0.1")
+    assert exc_info.value.status_code == 429
+    assert 1 <= int(exc_info.value.headers["Retry-After"]) <= 60
+    assert await fake_redis.zcard("rate_limit:login:10.0.0.1") == 3
+    assert 0 < await fake_redis.pttl("rate_limit:login:10.0.0.1") <= 60_000
+
+
+async def test_sliding_window_keeps_identities_apart(sliding_window):
+    limiter = RateLimiter("login", RateLimit(times=1, seconds=60))
+    await limiter.hit("first@example.com")
+    await limiter.hit("second@example.com")
+
+    with pytest.raises(HTTPException):
+        await limiter.hit("first@example.com")
+
+
+async def test_sliding_window_retry_after_is_the_oldest_hit_leaving(sliding_window):
+    limit = RateLimit(times=2, seconds=30)
+    window_ms = limit.seconds * 1000
+    key = "rate_limit:login:10.0.0.1"
+    for member in ("a", "b"):
+        assert await sliding_window(keys=[key], args=[window_ms, 2, member]) == 0
+
+    retry_after_ms = await sliding_window(keys=[key], args=[window_ms, 2, "c"])
+    assert 0 < retry_after_ms <= window_ms
+
+
+async def test_token_bucket_rejects_without_redis(sliding_window):
+    limiter = RateLimiter("login", RateLimit(times=2, seconds=60))
+    await limiter.hit("10.0.0.1")
+    await limiter.hit("10.0.0.1")
+    assert sliding_window.calls == 2
+
+    with pytest.raises(HTTPException) as exc_info:
+        await limiter.hit("10.0.0.1")
+    assert sliding_window.calls == 2
+    assert exc_info.value.headers["Retry-After"] == "30"
+
+
+async def test_rate_limit_dependency_sends_retry_after(sliding_window):
+    app = FastAPI()
+
+    @app.get(
+        "/limited",
+        dependencies=[
+            Depends(rate_limit("limited", RateLimit(times=1, seconds=10), client_ip))
+        ],
+    )
+    async def limited() -> dict:
+        return {}
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        assert (await client.get("/limited")).status_code == 200
+        response = await client.get("/limited")
+
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "10"
+
+
+async def test_redis_unavailable_fails_open(monkeypatch):
+    disconnected = fakeredis.FakeRedis(connected=False)
+    monkeypatch.setattr(
+        rate_limiter,
+        "sliding_window",
+        disconnected.register_script(rate_limiter.SLIDING_WINDOW_SCRIPT),
+    )
+    limiter = RateLimiter("login", RateLimit(times=1, seconds=60))
+    await limiter.hit("10.0.0.1")
+
+    # The token bucket of the worker still applies
+    with pytest.raises(HTTPException):
+        await limiter.hit("10.0.0.1")
+    await limiter.hit("10.0.0.2")
@@ -0,0 +1,94 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from email.message import EmailMessage
+
+import pytest
+
+from src.utils.lifecycle import BackgroundWork
+from src.workers import smtp
+from src.workers.smtp import SMTPSession
+
+
+def message(recipient: str) -> EmailMessage:
+    email = EmailMessage()
+    email["To"] = recipient
+    email.set_content("Referal code")
+    return email
+
+
+def test_failed_messages_do_not_stop_the_others(smtp_server):
+    smtp_server.refused = {"b@example.com"}
+    session = SMTPSession()
+    recipients = ["a@example.com", "b@example.com", "c@example.com"]
+
+    unsent = session.send(message(recipient) for recipient in recipients)
+
+    assert unsent == [1]
+    assert smtp_server.sent == ["a@example.com", "c@example.com"]
+
+
+def test_batches_stop_before_their_next_message(smtp_server):
+    smtp_server.held = {"a@example.com"}
+    session = SMTPSession()
+    stop = threading.Event()
+    recipients = ["a@example.com", "b@example.com", "c@example.com"]
+
+    with ThreadPoolExecutor() as pool:
+        batch = pool.submit(
+            session.send, (message(recipient) for recipient in recipients), stop
+        )
+        assert smtp_server.holding.wait(timeout=5)
+        stop.set()
+        smtp_server.release.set()
+        unsent = batch.result(timeout=5)
+
+    assert unsent == [1, 2]
+    assert smtp_server.sent == ["a@example.com"]
+
+
+def test_single_email_does_not_wait_for_a_batch(smtp_server):
+    smtp_server.held = {"batch-1@example.com"}
+    recipients = [f"batch-{index}@example.com" for index in range(1, 4)]
+
+    with ThreadPoolExecutor() as pool:
+        batch = pool.submit(
+            smtp.smtp_batch_session.send,
+            [message(recipient) for recipient in recipients],
+        )
+        assert smtp_server.holding.wait(timeout=5)
+        single = pool.submit(smtp.smtp_session.send, [message("single@example.com")])
+        assert single.result(timeout=5) == []
+        assert not batch.done()
+        smtp_server.release.set()
+        assert batch.result(timeout=5) == []
+
+    assert smtp_server.sent[0] == "single@example.com"
+
+
+@pytest.mark.anyio
+async def test_drain_stops_background_work_still_running(smtp_server):
+    smtp_server.held = {"a@example.com"}
+    work = BackgroundWork()
+    session = SMTPSession()
+    results = []
+
+    def send_batch() -> None:
+        recipients = ["a@example.com", "b@example.com"]
+        messages = (message(recipient) for recipient in recipients)
+        results.append(session.send(messages, stop=work.stopping))
+
+    def release_when_stopping() -> None:
+        work.stopping.wait(timeout=5)
+        smtp_server.release.set()
+
+    releaser = threading.Thread(target=release_when_stopping)
+    releaser.start()
+    sending = asyncio.create_task(work.tracked(send_batch)())
+    await asyncio.sleep(0)
+    await work.drain(timeout=0.05, stop_timeout=5)
+    await sending
+    releaser.join()
+
+    assert results == [[1]]
+    assert smtp_server.sent == ["a@example.com"]
@@ -0,0 +1,86 @@
+import pytest
+
+pytest.importorskip("opentelemetry.sdk")
+
+from opentelemetry import context as otel_context  # noqa: E402
+from opentelemetry import trace  # noqa: E402
+from opentelemetry.sdk.trace import TracerProvider  # noqa: E402
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor  # noqa: E402
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import (  # noqa: E402
+    InMemorySpanExporter,
+)
+from opentelemetry.trace import StatusCode  # noqa: E402
+
+from src.config import settings  # noqa: E402
+from src.utils.tracing import TailSamplingProcessor  # noqa: E402
+
+
+@pytest.fixture
+def sampled(monkeypatch):
+    exporter = InMemorySpanExporter()
+    processor = TailSamplingProcessor(SimpleSpanProcessor(exporter))
+    provider = TracerProvider()
+    provider.add_span_processor(processor)
+    monkeypatch.setattr(settings.tracing, "tail_latency_threshold_ms", 100_000.0)
+    monkeypatch.setattr(settings.tracing, "tail_decision_ttl_seconds", 60.0)
+    yield provider.get_tracer("test"), processor, exporter
+    provider.shutdown()
+
+
+def names(exporter: InMemorySpanExporter) -> list[str]:
+    return [finished.name for finished in exporter.get_finished_spans()]
+
+
+def run_request(tracer, fail: bool = False):
+    """
+    A request trace whose background task is started under its context
+    """
+    with tracer.start_as_current_span("request") as root:
+        with tracer.start_as_current_span("query"):
+            pass
+        captured = otel_context.get_current()
+        if fail:
+            root.set_status(StatusCode.ERROR)
+    token = otel_context.attach(captured)
+    try:
+        with tracer.start_as_current_span("smtp.send"):
+            pass
+    finally:
+        otel_context.detach(token)
+    return root
+
+
+def test_late_child_follows_kept_trace(sampled):
+    tracer, processor, exporter = sampled
+    run_request(tracer, fail=True)
+
+    assert names(exporter) == ["query", "request", "smtp.send"]
+    assert not processor.traces
+
+
+def test_late_child_of_dropped_trace_is_not_buffered(sampled, monkeypatch):
+    tracer, processor, exporter = sampled
+    monkeypatch.setattr(settings.tracing, "tail_sample_ratio", 0.0)
+    run_request(tracer)
+
+    assert names(exporter) == []
+    assert not processor.traces
+
+
+def test_expired_traces_are_evicted(sampled, monkeypatch):
+    tracer, processor, exporter = sampled
+    monkeypatch.setattr(settings.tracing, "tail_sample_ratio", 0.0)
+    root = tracer.start_span("request")
+    with trace.use_span(root):
+        with tracer.start_as_current_span("query") as orphan:
+            orphan.set_status(StatusCode.ERROR)
+    assert processor.traces
+
+    monkeypatch.setattr(settings.tracing, "tail_decision_ttl_seconds", 0.0)
+    with tracer.start_as_current_span("next request"):
+        pass
+
+    # The failed span waiting for a root that never ended is still exported
+    assert names(exporter) == ["query"]
+    assert not processor.traces
+    assert len(processor.decisions) == 1